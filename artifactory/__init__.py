@@ -2,7 +2,9 @@
 # Copyright (c) SAS Institute Inc
 #
 
-from urlparse import urljoin
+from multiprocessing.pool import ThreadPool
+from urlparse import urljoin, urlparse
+import threading
 import hashlib
 import json
 import logging
@@ -10,10 +12,13 @@ import os
 
 from conary.lib import util
 
+from pymaven import Artifact
 from pymaven.client import MavenClient
 import requests
 
 from .errors import MissingArtifactError
+from .pomcache import CachedContents, PomCache
+from .pomcache import isVolatileCoordinate, isVolatilePath
 from .pompackage import PomPackage
 
 
@@ -77,6 +82,41 @@ class Client(MavenClient):
             self._url = self._url + '/'
         super(Client, self).__init__(
             *[urljoin(self._url, repo) for repo in cfg.repositoryPaths])
+        self._workers = getattr(cfg, 'artifactoryWorkers', 8)
+        self._hostLimit = getattr(cfg, 'artifactoryHostConnections', 4)
+        self._hostSemaphores = {}
+        self._hostLock = threading.Lock()
+        self._pool = None
+
+        self._pomCache = None
+        if getattr(cfg, 'pomCacheDir', None):
+            self._pomCache = PomCache(cfg.pomCacheDir,
+                                      ttl=getattr(cfg, 'pomCacheTTL', 3600))
+
+    def _getPool(self):
+        """Get the thread pool used for making concurrent requests"""
+        if self._pool is None:
+            self._pool = ThreadPool(self._workers)
+        return self._pool
+
+    def close(self):
+        """Shut down the thread pool used for making concurrent requests
+
+        The pool is created again if the client is used after it is closed.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def _getHostSemaphore(self, url):
+        """Get the semaphore limiting concurrent requests to a host"""
+        host = urlparse(url).netloc
+        with self._hostLock:
+            if host not in self._hostSemaphores:
+                self._hostSemaphores[host] = threading.BoundedSemaphore(
+                    self._hostLimit)
+            return self._hostSemaphores[host]
 
     def _search(self, path, **kwargs):
         log.debug("search(%s, kwargs=%s)", path, kwargs)
@@ -89,8 +129,12 @@ class Client(MavenClient):
         res = repo._get(urljoin(self._url, uri), **kwargs)
         urls = [r['uri'] for r in res.json.get('results', [])]
 
-        for url in urls:
-            res = repo._get(url)
+        def fetch(url):
+            with self._getHostSemaphore(url):
+                return url, repo._get(url)
+
+        # Fetch result details concurrently, yielding them as they arrive.
+        for url, res in self._getPool().imap_unordered(fetch, urls):
             if res.status_code == requests.codes.not_found:
                 log.warn('error fetching %s', url)
                 continue
@@ -134,7 +178,55 @@ class Client(MavenClient):
             )
         return path
 
+    def find_artifacts(self, coordinate):
+        if self._pomCache is None:
+            return super(Client, self).find_artifacts(coordinate)
+
+        try:
+            coordinates = self._pomCache.get('versions', coordinate)
+        except KeyError:
+            artifacts = super(Client, self).find_artifacts(coordinate)
+            # the list of versions grows as new versions are released
+            self._pomCache.set('versions', coordinate,
+                               [a.coordinate for a in artifacts],
+                               volatile=True)
+            return artifacts
+        return [Artifact(c) for c in coordinates]
+
+    def get_artifact(self, coordinate):
+        query = Artifact(coordinate)
+        if self._pomCache is None or query.type != 'pom':
+            return super(Client, self).get_artifact(coordinate)
+
+        try:
+            body = self._pomCache.get('pom', coordinate)
+        except KeyError:
+            artifact = super(Client, self).get_artifact(coordinate)
+            with artifact.contents as fh:
+                body = fh.read()
+            if not isinstance(body, unicode):
+                body = body.decode('utf-8')
+            self._pomCache.set('pom', coordinate, body,
+                               volatile=isVolatileCoordinate(coordinate))
+
+        query.contents = CachedContents(body)
+        return query
+
     def checkPath(self, path, relative=False):
+        if self._pomCache is None:
+            return self._checkPath(path, relative=relative)
+
+        key = '%s:%s' % (int(relative), path)
+        try:
+            return self._pomCache.get('path', key)
+        except KeyError:
+            uri = self._checkPath(path, relative=relative)
+            # missing artifacts may be published later
+            self._pomCache.set('path', key, uri,
+                               volatile=uri is None or isVolatilePath(path))
+            return uri
+
+    def _checkPath(self, path, relative=False):
         client = self._repos[0]
         for repo in self._cfg.repositoryPaths:
             if relative:
@@ -267,7 +359,24 @@ class Client(MavenClient):
     def repositories(self):
         return self._get('repositories/')
 
-    def walk(self, repo, top=None, topdown=True, ignorehidden=True):
+    def walk(self, repo, top=None, topdown=True, ignorehidden=True,
+             stat=False):
+        """Walk a repository tree, like os.walk
+
+        Yields a (parent, folders, artifacts) tuple for each folder. The tree
+        is walked breadth first, fetching all of the children of a level
+        concurrently. When walking top down, folders may be removed from the
+        folders list to skip walking them.
+
+        :param str repo: repository to walk
+        :param str top: (None) path to start walking from
+        :param bool topdown: (True) yield parents before their children
+        :param bool ignorehidden: (True) skip paths starting with a '.'
+        :param bool stat: (False) fetch the storage info of every folder and
+            artifact. By default a single file list request is made and
+            entries from the listing are yielded instead, with the repo, path,
+            downloadUri and checksums keys of the storage info filled in.
+        """
         base_uri = 'storage/' + repo
 
         # normalize path argument
@@ -276,29 +385,108 @@ class Client(MavenClient):
         elif not top.startswith('/'):
             top = '/' + top
 
-        parent = self._get(base_uri + top)
-        folders, artifacts = [], []
-        for child in parent['children']:
-            if child['uri'].startswith('/.') and ignorehidden:
-                continue
+        if stat:
+            levels = self._walkStat(base_uri, top, ignorehidden)
+        else:
+            levels = self._walkList(base_uri, repo, top, ignorehidden)
 
-            if top == '/':
-                uri = child['uri']
+        if topdown:
+            for level in levels:
+                for x in level:
+                    yield x
+        else:
+            for level in reversed(list(levels)):
+                for x in level:
+                    yield x
+
+    def _walkStat(self, base_uri, top, ignorehidden):
+        """Yield lists of (parent, folders, artifacts) for each tree level"""
+        pool = self._getPool()
+
+        parents = [self._get(base_uri + top)]
+        while parents:
+            uris = []
+            for parent in parents:
+                for child in parent['children']:
+                    if child['uri'].startswith('/.') and ignorehidden:
+                        continue
+
+                    if parent['path'] == '/':
+                        uri = child['uri']
+                    else:
+                        uri = parent['path'] + child['uri']
+                    uris.append((parent['path'], child['folder'],
+                                 base_uri + uri))
+
+            # Fetch every child on this level at once.
+            children = pool.map(self._get, [x[2] for x in uris])
+
+            level = [(x, [], []) for x in parents]
+            index = dict((x['path'], y) for x, y in zip(parents, level))
+            for (path, folder, uri), child_obj in zip(uris, children):
+                if folder:
+                    index[path][1].append(child_obj)
+                else:
+                    index[path][2].append(child_obj)
+
+            yield level
+
+            # Folder info includes the children of the folder, so there is no
+            # need to fetch folders again when descending.
+            parents = [y for x in level for y in x[1]]
+
+    def _walkList(self, base_uri, repo, top, ignorehidden):
+        """Yield lists of (parent, folders, artifacts) for each tree level
+        using the file list api"""
+        res = self._get(base_uri + top + '?list&deep=1&listFolders=1')
+
+        def path_join(a, b):
+            if a == '/':
+                return b
+            return a + b
+
+        def make_folder(path):
+            return {'repo': repo, 'path': path, 'folder': True,
+                    'children': []}
+
+        folders = {top: make_folder(top)}
+        artifacts = {top: []}
+        subfolders = {top: []}
+        for entry in sorted(res['files'], key=lambda x: x['uri']):
+            parts = entry['uri'].rsplit('/', 1)
+            if parts[0]:
+                parent_path = path_join(top, parts[0])
             else:
-                uri = parent['path'] + child['uri']
+                parent_path = top
+            if parent_path not in folders:
+                # Parent was hidden.
+                continue
+            if parts[1].startswith('.') and ignorehidden:
+                continue
 
-            child_obj = self._get(base_uri + uri)
-            if child['folder']:
-                folders.append(child_obj)
+            path = path_join(top, entry['uri'])
+            child = dict(entry)
+            child['repo'] = repo
+            child['path'] = path
+            if not entry['folder']:
+                child['downloadUri'] = urljoin(self._url, repo + path)
+                child['checksums'] = dict((x, entry[x])
+                                          for x in ('sha1', 'md5', 'sha2')
+                                          if entry.get(x))
+            folders[parent_path]['children'].append(
+                {'uri': '/' + parts[1], 'folder': entry['folder']})
+            if entry['folder']:
+                child['children'] = []
+                folders[path] = child
+                artifacts[path] = []
+                subfolders[path] = []
+                subfolders[parent_path].append(child)
             else:
-                artifacts.append(child_obj)
-
-        if topdown:
-            yield parent, folders, artifacts
-
-        for folder in folders:
-            for x in self.walk(repo, folder['path'], topdown):
-                yield x
-
-        if not topdown:
-            yield parent, folders, artifacts
+                artifacts[parent_path].append(child)
+
+        parents = [folders[top]]
+        while parents:
+            level = [(x, subfolders[x['path']], artifacts[x['path']])
+                     for x in parents]
+            yield level
+            parents = [y for x in level for y in x[1]]
@@ -0,0 +1,150 @@
+#
+# Copyright (c) SAS Institute Inc
+#
+
+from StringIO import StringIO
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+
+
+log = logging.getLogger(__name__)
+
+# versions that may point at different content over time: dynamic versions,
+# snapshots and version ranges
+VOLATILE_VERSION_RE = re.compile(
+    r'^(?:LATEST|RELEASE|.*-SNAPSHOT|[\[(].*[\])])$')
+
+
+def isVolatileVersion(version):
+    """Return whether a version refers to content that may change
+
+    :param str version: maven version
+    :rtype: bool
+    """
+    return bool(version) and VOLATILE_VERSION_RE.match(version) is not None
+
+
+def isVolatileCoordinate(coordinate):
+    """Return whether the version of a maven coordinate refers to content that
+    may change
+
+    :param str coordinate: maven coordinate, ending with the version
+    :rtype: bool
+    """
+    return isVolatileVersion(coordinate.rsplit(':', 1)[-1])
+
+
+def isVolatilePath(path):
+    """Return whether a maven 2 repository path refers to content that may
+    change, either because its version does or because it is repository
+    metadata
+
+    :param str path: path of a file in the repository
+    :rtype: bool
+    """
+    parts = path.rstrip('/').split('/')
+    if parts[-1].startswith('maven-metadata'):
+        return True
+    return len(parts) > 1 and isVolatileVersion(parts[-2])
+
+
+class CachedContents(object):
+    """File-like context manager around cached artifact contents, mimics the
+    response objects returned by the maven repositories
+    """
+    def __init__(self, body):
+        if isinstance(body, unicode):
+            body = body.encode('utf-8')
+        self._body = body
+
+    def __enter__(self):
+        return StringIO(self._body)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class PomCache(object):
+    """On disk cache of maven lookups
+
+    Released maven artifacts never change, so lookups about them are cached
+    indefinitely. Lookups about snapshots and dynamic versions, and lookups
+    that found nothing, expire after `ttl` seconds.
+
+    Entries are json files stored under a digest of their kind and key, and are
+    written atomically so the cache may be shared between processes.
+    """
+    def __init__(self, path, ttl=3600):
+        """
+        :param str path: directory to store the cache in
+        :param int ttl: seconds to keep volatile entries for
+        """
+        self._path = path
+        self._ttl = ttl
+
+        if not os.path.exists(self._path):
+            try:
+                os.makedirs(self._path)
+            except OSError:
+                if not os.path.isdir(self._path):
+                    raise
+
+    def _entryPath(self, kind, key):
+        digest = hashlib.sha1('%s %s' % (kind, key)).hexdigest()
+        return os.path.join(self._path, kind, digest[:2], digest)
+
+    def get(self, kind, key):
+        """Get a cached value
+
+        :param str kind: type of lookup
+        :param str key: lookup key
+        :raises: KeyError if there is no valid entry
+        """
+        path = self._entryPath(kind, key)
+        try:
+            with open(path) as fh:
+                entry = json.load(fh)
+        except (IOError, ValueError):
+            raise KeyError(key)
+
+        if entry['key'] != key:
+            raise KeyError(key)
+
+        if entry['volatile'] and entry['time'] + self._ttl < time.time():
+            log.debug('expired %s %s', kind, key)
+            raise KeyError(key)
+
+        return entry['value']
+
+    def set(self, kind, key, value, volatile=False):
+        """Store a value
+
+        :param str kind: type of lookup
+        :param str key: lookup key
+        :param value: json serializable value
+        :param bool volatile: expire the entry after the ttl
+        """
+        path = self._entryPath(kind, key)
+        dirname = os.path.dirname(path)
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                if not os.path.isdir(dirname):
+                    raise
+
+        fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(dict(key=key, time=time.time(), volatile=volatile,
+                               value=value), fh)
+            os.rename(tmp, path)
+        except:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
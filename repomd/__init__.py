@@ -46,12 +46,12 @@ class Client(object):
     Client object for extracting information from repository metadata.
     """
 
-    def __init__(self, repoUrl):
+    def __init__(self, repoUrl, cacheDir=None):
         self._repoUrl = repoUrl
 
         #self._baseMdPath = '/repodata/repomd.xml'
         self._baseMdPath = 'repodata/repomd.xml'
-        self._repo = Repository(self._repoUrl)
+        self._repo = Repository(self._repoUrl, cacheDir=cacheDir)
         self._repomd = RepoMdXml(self._repo, self._baseMdPath).parse()
 
     def getRepos(self):
@@ -62,18 +62,42 @@ class Client(object):
 
         return self._repo
 
+    def getChecksum(self, name):
+        """
+        Get the checksum of a metadata file listed in repomd.xml, this changes
+        whenever the contents of the file change.
+        @param name: type of metadata, ie. primary
+        @type name: string
+        @return checksum or None if the repository does not include the
+                metadata.
+        """
+
+        node = self._repomd.getRepoData(name)
+        if node is None:
+            return None
+        return node.checksum
+
     def getPatchDetail(self):
         """
         Get a list instances representing all patch data in the repository.
         @return [repomd.patchxml._Patch, ...]
         """
 
+        return [ x.parseChildren() for x in self.getPatchElements() ]
+
+    def getPatchElements(self):
+        """
+        Get a list of the patches listed in patches.xml without parsing the
+        patch files, call parseChildren on each element to parse its patch.
+        @return [repomd.patchesxml._PatchElement, ...]
+        """
+
         node = self._repomd.getRepoData('patches')
 
         if node is None:
             return []
 
-        return [ x.parseChildren() for x in node.parseChildren().getPatches() ]
+        return node.parseChildren().getPatches()
 
     def getPackageDetail(self):
         """
@@ -19,9 +19,10 @@
 Module for parsing package sections of xml files from the repository metadata.
 """
 
-__all__ = ('PackageXmlMixIn', 'PackageCompare', )
+__all__ = ('PackageXmlMixIn', 'PackageCompare', 'PackageRecord', )
 
 import os
+from collections import namedtuple
 
 from rpath_xmllib import api1 as xmllib
 
@@ -50,7 +51,73 @@ class PackageCompare(object):
         return util.packageCompareByName(self, other)
 
 
-class _Package(SlotNode, PackageCompare):
+class PackageMixIn(PackageCompare):
+    """
+    Comparison and naming methods shared by all package representations.
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return os.path.basename(self.location)
+
+    def __cmp__(self, other):
+        pkgcmp = PackageCompare.__cmp__(self, other)
+        if pkgcmp != 0:
+            return pkgcmp
+
+        # Compare arch before checksum to catch cases of multiple
+        # arch-specific packages that happen to have same content
+        # (e.g. SLES xorg-x11-fonts packages).
+        archcmp = cmp(self.arch, other.arch)
+        if archcmp != 0:
+            return archcmp
+        
+        # Compare checksum only for equality, otherwise sorting will result in
+        # checksum ordering.
+        if (self.checksum and other.checksum and
+            self.checksumType == other.checksumType and
+            self.checksum == other.checksum):
+            return 0
+
+        # Compare on archiveSize for equality only. This is needed for rpms
+        # that have identical contents, but may have been rebuilt. Idealy we
+        # would use file checksums for this, but we don't have the payload
+        # contents available at this time.
+        if (self.archiveSize and other.archiveSize and
+            self.archiveSize == other.archiveSize):
+            return 0
+
+        return cmp(self.location, other.location)
+
+    def getNevra(self):
+        """
+        Return the name, epoch, version, release, and arch of the package.
+        """
+
+        return (self.name, self.epoch, self.version, self.release, self.arch)
+
+    def getConaryVersion(self):
+        """
+        Get the conary version of a source package.
+        """
+
+        assert self.arch == 'src'
+        filename = os.path.basename(self.location)
+        nameVerRelease = ".".join(filename.split(".")[:-2])
+        ver = "_".join(nameVerRelease.split("-")[-2:])
+        return ver
+
+    def getFileName(self):
+        """
+        Returns the expected package file name.
+        """
+
+        return '%s-%s-%s.%s.rpm' % (self.name, self.version,
+                                    self.release, self.arch)
+
+
+class _Package(SlotNode, PackageMixIn):
     """
     Python representation of package section of xml files from the repository
     metadata.
@@ -155,63 +222,130 @@ class _Package(SlotNode, PackageCompare):
         else:
             raise UnknownElementError(child)
 
-    def __repr__(self):
-        return os.path.basename(self.location)
 
-    def __cmp__(self, other):
-        pkgcmp = PackageCompare.__cmp__(self, other)
-        if pkgcmp != 0:
-            return pkgcmp
+def _intern(strings, value):
+    """
+    Get the shared copy of a value from a table of shared values. Values are
+    keyed by type as well so that, for instance, '1' and u'1' stay distinct.
+    """
 
-        # Compare arch before checksum to catch cases of multiple
-        # arch-specific packages that happen to have same content
-        # (e.g. SLES xorg-x11-fonts packages).
-        archcmp = cmp(self.arch, other.arch)
-        if archcmp != 0:
-            return archcmp
-        
-        # Compare checksum only for equality, otherwise sorting will result in
-        # checksum ordering.
-        if (self.checksum and other.checksum and
-            self.checksumType == other.checksumType and
-            self.checksum == other.checksum):
-            return 0
+    if value is None or strings is None:
+        return value
+    return strings.setdefault((type(value), value), value)
 
-        # Compare on archiveSize for equality only. This is needed for rpms
-        # that have identical contents, but may have been rebuilt. Idealy we
-        # would use file checksums for this, but we don't have the payload
-        # contents available at this time.
-        if (self.archiveSize and other.archiveSize and
-            self.archiveSize == other.archiveSize):
-            return 0
 
-        return cmp(self.location, other.location)
+RpmEntryRecord = namedtuple('RpmEntryRecord',
+    'kind name epoch version release flags pre')
 
-    def getNevra(self):
+
+class FormatRecord(object):
+    """
+    Compact, read only representation of a dependency list, for instance
+    rpm:requires, that supports the node methods used by consumers of
+    package.format.
+    """
+
+    __slots__ = ('_name', '_entries', )
+
+    def __init__(self, name, entries):
+        self._name = name
+        self._entries = entries
+
+    def getName(self):
         """
-        Return the name, epoch, version, release, and arch of the package.
+        Get the element name of this dependency list.
         """
 
-        return (self.name, self.epoch, self.version, self.release, self.arch)
+        return self._name
 
-    def getConaryVersion(self):
+    def iterChildren(self):
         """
-        Get the conary version of a source package.
+        Iterate over the entries of this dependency list.
         """
 
-        assert self.arch == 'src'
-        filename = os.path.basename(self.location)
-        nameVerRelease = ".".join(filename.split(".")[:-2])
-        ver = "_".join(nameVerRelease.split("-")[-2:])
-        return ver
+        return iter(self._entries)
 
-    def getFileName(self):
+    def getChildren(self, name=None):
         """
-        Returns the expected package file name.
+        Get the entries of this dependency list.
         """
 
-        return '%s-%s-%s.%s.rpm' % (self.name, self.version,
-                                    self.release, self.arch)
+        return list(self._entries)
+
+
+class PackageRecord(PackageMixIn):
+    """
+    Compact representation of a package from the repository metadata. Names,
+    architectures and versions can be shared between records, and dependency
+    lists are stored as tuples, which are only turned into objects when
+    format is accessed.
+    """
+
+    # Attributes with few distinct values that are shared between records.
+    _sharedAttrs = ('name', 'arch', 'epoch', 'version', 'release', )
+    # Fields of dependency entries that are shared between records.
+    _sharedEntryFields = ('kind', 'name', 'flags', )
+
+    __slots__ = ('name', 'arch', 'epoch', 'version', 'release',
+                 'checksum', 'checksumType', 'summary', 'description',
+                 'fileTimestamp', 'buildTimestamp', 'packageSize',
+                 'installedSize', 'archiveSize', 'location',
+                 'license', 'vendor', 'group', 'buildhost',
+                 'sourcerpm', 'headerStart', 'headerEnd',
+                 'licenseToConfirm', 'files', 'type', '_format')
+
+    def __init__(self, **kwargs):
+        for attr in self.__slots__:
+            setattr(self, attr, kwargs.get(attr))
+
+    @classmethod
+    def fromPackage(cls, pkg, strings=None):
+        """
+        Create a record from a parsed package.
+        @param pkg: package parsed from the repository metadata
+        @type pkg: repomd.packagexml._Package
+        @param strings: optional table of shared values, owned by the caller,
+                        used to share names, architectures, versions and
+                        dependency names between the records created with it.
+        @type strings: dict
+        @return PackageRecord
+        """
+
+        kwargs = {}
+        for attr in cls.__slots__:
+            if attr.startswith('_'):
+                continue
+            kwargs[attr] = getattr(pkg, attr, None)
+
+        for attr in cls._sharedAttrs:
+            kwargs[attr] = _intern(strings, kwargs[attr])
+
+        if kwargs['files'] is not None:
+            kwargs['files'] = tuple(kwargs['files'])
+
+        if pkg.format is not None:
+            fmt = []
+            for node in pkg.format:
+                entries = []
+                for child in node.iterChildren():
+                    if hasattr(child, 'isspace') and child.isspace():
+                        continue
+                    entry = dict((x, getattr(child, x, None))
+                                 for x in RpmEntryRecord._fields)
+                    for x in cls._sharedEntryFields:
+                        entry[x] = _intern(strings, entry[x])
+                    entries.append(RpmEntryRecord(**entry))
+                fmt.append((_intern(strings, node.getName()),
+                            tuple(entries)))
+            kwargs['_format'] = tuple(fmt)
+
+        return cls(**kwargs)
+
+    @property
+    def format(self):
+        if self._format is None:
+            return None
+        return [ FormatRecord(x, y) for x, y in self._format ]
 
 
 class _RpmEntry(SlotNode):
@@ -45,7 +45,8 @@ class _Patches(SlotNode):
 
         if child.getName() == 'patch':
             child.id = child.getAttribute('id')
-            child._parser = PatchXml(None, child.location)
+            child._parser = PatchXml(None, child.location,
+                checksum=child.checksum, checksumType=child.checksumType)
             child.parseChildren = child._parser.parse
             SlotNode.addChild(self, child)
         else:
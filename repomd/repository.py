@@ -24,25 +24,44 @@ __all__ = ('Repository', )
 import os
 import gzip
 import shutil
+import hashlib
 import tempfile
 import urllib2
 
+# Map of repository metadata checksum types to hashlib names.
+_checksumTypes = {
+    'sha': 'sha1',
+    'sha1': 'sha1',
+    'sha256': 'sha256',
+    'md5': 'md5',
+}
+
 class Repository(object):
     """
     Access files from the repository.
     """
 
-    def __init__(self, repoUrl):
+    def __init__(self, repoUrl, cacheDir=None):
         self._repoUrl = repoUrl
+        self._cacheDir = cacheDir
 
-    def get(self, fileName):
+    def get(self, fileName, checksum=None, checksumType=None):
         """
         Download a file from the repository.
         @param fileName: relative path to file
         @type fileName: string
+        @param checksum: expected checksum of the file, files with checksums
+                         are cached if a cache directory was given.
+        @type checksum: string
+        @param checksumType: type of checksum, as used in repository metadata
+        @type checksumType: string
         @return open file instance
         """
 
+        if (self._cacheDir and checksum and
+            checksumType in _checksumTypes):
+            return self._getCached(fileName, checksum, checksumType)
+
         fn = self._getTempFile()
         realUrl = self._getRealUrl(fileName)
 
@@ -50,13 +69,71 @@ class Repository(object):
         outf = open(fn, 'w')
         shutil.copyfileobj(inf, outf)
 
+        return self._open(fileName, fn, unlink=True)
+
+    @staticmethod
+    def _open(fileName, fn, unlink=False):
+        """
+        Open a downloaded file, decompressing it if needed.
+        """
+
         if os.path.basename(fileName).endswith('.gz'):
             fh = gzip.open(fn)
         else:
             fh = open(fn)
-        os.unlink(fn)
+        if unlink:
+            os.unlink(fn)
         return fh
 
+    def _getCached(self, fileName, checksum, checksumType):
+        """
+        Get a file from the cache, downloading it into the cache if it is not
+        already there. Files are stored by checksum, so a cached file is
+        never out of date.
+        """
+
+        cacheDir = os.path.join(self._cacheDir, checksumType, checksum[:2])
+        cachePath = os.path.join(cacheDir,
+            '%s-%s' % (checksum, os.path.basename(fileName)))
+
+        if os.path.exists(cachePath):
+            return self._open(fileName, cachePath)
+
+        if not os.path.exists(cacheDir):
+            try:
+                os.makedirs(cacheDir)
+            except OSError:
+                if not os.path.isdir(cacheDir):
+                    raise
+
+        digest = hashlib.new(_checksumTypes[checksumType])
+        fd, fn = tempfile.mkstemp(dir=cacheDir, prefix='.tmp-')
+        try:
+            inf = urllib2.urlopen(self._getRealUrl(fileName))
+            outf = os.fdopen(fd, 'w')
+            try:
+                while True:
+                    buf = inf.read(1024 * 64)
+                    if not buf:
+                        break
+                    digest.update(buf)
+                    outf.write(buf)
+            finally:
+                outf.close()
+                inf.close()
+
+            # Don't cache files that do not match the metadata.
+            if digest.hexdigest() != checksum:
+                return self._open(fileName, fn, unlink=True)
+
+            os.rename(fn, cachePath)
+        except:
+            if os.path.exists(fn):
+                os.unlink(fn)
+            raise
+
+        return self._open(fileName, cachePath)
+
     @classmethod
     def _getTempFile(cls):
         """
@@ -28,9 +28,11 @@ class XmlFileParser(object):
     Base class for handling databinder setup.
     """
 
-    def __init__(self, repository, path):
+    def __init__(self, repository, path, checksum=None, checksumType=None):
         self._repository = repository
         self._path = path
+        self._checksum = checksum
+        self._checksumType = checksumType
 
         self._databinder = xmllib.DataBinder()
         self._registerTypes()
@@ -51,7 +53,8 @@ class XmlFileParser(object):
         # W0212 - Access to a protected member _parser of a client class
         # pylint: disable=W0212
 
-        fn = self._repository.get(self._path)
+        fn = self._repository.get(self._path, checksum=self._checksum,
+                                  checksumType=self._checksumType)
         data = self._databinder.parseFile(fn)
 
         for child in data.iterChildren():
@@ -19,8 +19,10 @@
 Module that provides common utility functions for interacting with rpms.
 """
 
-__ALL__ = ('rpmvercmp', 'readHeader', 'NEVRA')
+__ALL__ = ('rpmvercmp', 'vercmpKey', 'evrKey', 'readHeader', 'NEVRA')
 
 from rpmutils.vercmp import rpmvercmp
+from rpmutils.vercmp import vercmpKey
+from rpmutils.vercmp import evrKey
 from rpmutils.header import readHeader
 from rpmutils.nevra import NEVRA
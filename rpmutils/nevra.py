@@ -21,7 +21,7 @@ Module for defining NEVRA datastructure.
 
 from collections import namedtuple
 
-from rpmutils import rpmvercmp
+from rpmutils.vercmp import evrKey
 
 class EVR(namedtuple('evr', 'epoch version release')):
     """
@@ -41,27 +41,7 @@ class NEVRA(namedtuple('nevra', 'name epoch version release arch')):
         if isinstance(other, tuple):
             other = self.__class__(*other)
 
-        nameCmp = cmp(self.name, other.name)
-        if nameCmp != 0:
-            return nameCmp
-
-        epochCmp = rpmvercmp(self.epoch, other.epoch)
-        if epochCmp != 0:
-            return epochCmp
-
-        versionCmp = rpmvercmp(self.version, other.version)
-        if versionCmp != 0:
-            return versionCmp
-
-        releaseCmp = rpmvercmp(self.release, other.release)
-        if releaseCmp != 0:
-            return releaseCmp
-
-        archCmp = cmp(self.arch, other.arch)
-        if archCmp != 0:
-            return archCmp
-
-        return 0
+        return cmp(self.key, other.key)
 
     def __lt__(self, other):
         c = self.__cmp__(other)
@@ -72,3 +52,12 @@ class NEVRA(namedtuple('nevra', 'name epoch version release arch')):
     @property
     def evr(self):
         return EVR(self.epoch, self.version, self.release)
+
+    @property
+    def key(self):
+        """
+        Sort key that orders the same way as comparing NEVRAs.
+        """
+
+        return ((self.name, ) + evrKey(self.epoch, self.version, self.release)
+                + (self.arch, ))
@@ -17,13 +17,136 @@
 
 """
 Module that implements rpm version comparison.
+
+Versions are parsed once into sort keys that order the same way as
+rpmlib.rpmvercmp, so comparisons and sorts do not need to call into rpmlib.
+The segments of a version are compared left to right:
+    - "~" sorts before anything, including the end of the version
+    - the end of the version sorts before "^" and any other segment
+    - "^" sorts before any other segment
+    - alphabetic segments sort before numeric segments
+    - numeric segments are compared as integers
+    - all other characters only separate segments
 """
 
+import re
+import random
 import ctypes
-rpmlib = ctypes.cdll.LoadLibrary('librpm.so')
 
-def rpmvercmp(a, b):
+try:
+    rpmlib = ctypes.cdll.LoadLibrary('librpm.so')
+except OSError:
+    rpmlib = None
+
+# Order of segment types in version keys.
+_TILDE = (0, )
+_END = (1, )
+_CARET = (2, )
+_ALPHA = 3
+_NUMERIC = 4
+
+_segmentRE = re.compile(r'([0-9]+)|([a-zA-Z]+)|(~)|(\^)')
+
+def _librpmvercmp(a, b):
+    """
+    Compare two versions with rpmlib.
+    """
+
     # rpmlib.rpmvercmp does not handle unicode strings, so convert
     a = str(a)
     b = str(b)
     return rpmlib.rpmvercmp(a, b)
+
+# Older versions of rpm treat "~" and "^" as separators.
+if rpmlib is not None:
+    _tildeSupport = _librpmvercmp('1~', '1') != 0
+    _caretSupport = _librpmvercmp('1^', '1') != 0
+else:
+    _tildeSupport = True
+    _caretSupport = True
+
+# Map of version string to sort key.
+_keyCache = {}
+_keyCacheSize = 100000
+
+def vercmpKey(version):
+    """
+    Get a sort key for a version, epoch or release string.
+    @param version: version string
+    @type version: str
+    @return sort key that orders the same way as rpmlib.rpmvercmp.
+    @rtype tuple
+    """
+
+    try:
+        return _keyCache[version]
+    except KeyError:
+        pass
+
+    key = []
+    for num, alpha, tilde, caret in _segmentRE.findall(str(version)):
+        if num:
+            num = num.lstrip('0')
+            key.append((_NUMERIC, len(num), num))
+        elif alpha:
+            key.append((_ALPHA, alpha))
+        elif tilde and _tildeSupport:
+            key.append(_TILDE)
+        elif caret and _caretSupport:
+            key.append(_CARET)
+    key.append(_END)
+    key = tuple(key)
+
+    if len(_keyCache) >= _keyCacheSize:
+        _keyCache.clear()
+    _keyCache[version] = key
+
+    return key
+
+def evrKey(epoch, version, release):
+    """
+    Get a sort key for an epoch, version, release triple.
+    """
+
+    return (vercmpKey(epoch), vercmpKey(version), vercmpKey(release))
+
+def rpmvercmp(a, b):
+    """
+    Compare two version strings.
+    @return -1, 0, or 1 like rpmlib.rpmvercmp
+    """
+
+    if a == b:
+        return 0
+    return cmp(vercmpKey(a), vercmpKey(b))
+
+def verify(versions, samples=100000):
+    """
+    Check that rpmvercmp agrees with rpmlib. Versions are sorted with
+    vercmpKey and every adjacent pair is compared with rpmlib, along with a
+    random sample of other pairs.
+    @param versions: version strings to compare
+    @type versions: iterable of str
+    @param samples: number of random pairs to compare
+    @type samples: int
+    @return list of (a, b, rpmvercmp result, rpmlib result) for pairs that
+            differ.
+    """
+
+    assert rpmlib is not None, 'librpm is required to verify comparisons'
+
+    versions = sorted(set(versions), key=vercmpKey)
+    pairs = zip(versions, versions[1:])
+    if len(versions) > 1:
+        for i in xrange(samples):
+            pairs.append(tuple(random.sample(versions, 2)))
+
+    mismatches = []
+    for a, b in pairs:
+        for x, y in ((a, b), (b, a)):
+            res = rpmvercmp(x, y)
+            expected = _librpmvercmp(x, y)
+            expected = expected and expected / abs(expected)
+            if res != expected:
+                mismatches.append((x, y, res, expected))
+    return mismatches
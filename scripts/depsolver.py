@@ -34,6 +34,7 @@ log = logging.getLogger('test')
 from updatebot import config
 from updatebot import cmdline
 from updatebot import pkgsource
+from updatebot.pkgsource.depsolver import DependencySolver
 
 cfg = config.UpdateBotConfig()
 cfg.read(mirrorballDir + '/config/%s/updatebotrc' % sys.argv[1] )
@@ -43,63 +44,40 @@ ui = cmdline.UserInterface()
 pkgSource = pkgsource.PackageSource(cfg, ui)
 pkgSource.load()
 
-reqSrcPkgs = set()
-for pkgName in cfg.package:
-    bins = sorted(pkgSource.binNameMap.get(pkgName, []))
-    if not bins:
-        continue
-    reqSrcPkgs.add(pkgSource.binPkgMap[bins[-1]])
+# Architectures that may be selected, most preferred first.
+arches = ('x86_64', 'noarch', 'i686', 'i586', 'i486', 'i386', )
 
-reqBinPkgs = set()
-for srcPkg in reqSrcPkgs:
-    reqBinPkgs.update(set([ x for x in pkgSource.srcPkgMap[srcPkg]
-                            if x.arch not in ('nosrc', 'src') ]))
-
-requires = {}
-provides = {}
-log.info('loading package requires/provides')
-for bin, src in pkgSource.binPkgMap.iteritems():
-    if bin.arch in ('nosrc', 'src'):
-        continue
-    for format in bin.format:
-        if format.getName() == 'rpm:provides':
-            bins = set([ x.name for x in pkgSource.srcPkgMap[src]
-                         if x.arch not in ('nosrc', 'src') ])
-            for child in format.iterChildren():
-                provides.setdefault(child.name, set()).update(bins)
-        if format.getName() == 'rpm:requires':
-            for child in format.iterChildren():
-                requires.setdefault(bin.name, set()).add(child.name)
+solver = DependencySolver(pkgSource, arches=arches)
 
+def binaries(binPkg):
+    srcPkg = pkgSource.binPkgMap.get(binPkg)
+    if srcPkg is None:
+        return [ binPkg, ]
+    return [ x for x in pkgSource.srcPkgMap[srcPkg]
+             if x.arch in arches ]
 
-solved = set()
-working = set([ x.name for x in reqBinPkgs ])
+reqSrcPkgs = set()
+reqBinPkgs = set()
+for pkgName in cfg.package:
+    binPkg = solver.getLatest(pkgName)
+    if binPkg is None:
+        continue
+    reqSrcPkgs.add(pkgSource.binPkgMap.get(binPkg))
+    reqBinPkgs.update(binaries(binPkg))
+reqSrcPkgs.discard(None)
 
 log.info('resolving deps')
-while working:
-    pkg = working.pop()
-    log.info('resolving %s' % pkg)
-    for req in requires[pkg]:
-        if req.startswith('rpmlib'):
-            continue
-        if req not in provides:
-            log.warn('requirement not found: %s' % req)
-            continue
-        for provPkg in provides[req]:
-            if provPkg not in solved and provPkg != pkg:
-                working.add(provPkg)
-
-    solved.add(pkg)
-    log.info('solved: %s, working set: %s' % (len(solved), len(working)))
+solved, unresolved = solver.resolve(reqBinPkgs)
+
+for pkg, reqs in sorted(unresolved.iteritems()):
+    for req in sorted(reqs):
+        log.warn('requirement of %s not found: %s' % (pkg, req))
 
 needed = set()
-for pkgName in solved:
-    bins = sorted(pkgSource.binNameMap[pkgName])
-    src = pkgSource.binPkgMap[bins[-1]]
+for binPkg in solved:
+    src = pkgSource.binPkgMap.get(binPkg)
     if src in reqSrcPkgs:
         continue
-    pkgs = sorted([ x for x in pkgSource.srcPkgMap[src]
-                    if x.arch not in ('nosrc', 'src') ])
-    needed.add(pkgs[0])
+    needed.add(src or binPkg)
 
 import epdb; epdb.st()
@@ -20,6 +20,8 @@ from updatebot import groupmgr
 
 from updatebot import cmdline
 
+from updatebot.pkgsource.depsolver import DependencySolver
+
 logfile = '%s_%s.log' % (sys.argv[0], time.strftime('%Y-%m-%d_%H%M%S'))
 log.addRootLogger(logfile)
 
@@ -290,6 +292,9 @@ class CompsReader(object):
         'group-critical-path-base' : '1',
         }
 
+    # Architectures the dependency closure may use, most preferred first.
+    solverArches = ('x86_64', 'noarch', 'i686', 'i586', 'i486', 'i386', )
+
     def __init__(self, cfg, compsfile=None):
         self.compsfile = compsfile
         self.cfg = config.UpdateBotConfig()
@@ -307,6 +312,7 @@ class CompsReader(object):
         self.troves = self.mgr._helper._getLatestTroves()
         self.allTroves = self.mgr._helper._repos.getTroveLeavesByLabel({None: {self.label: None}})
         self.group_everything = self.groupEverything(self.troves, self.allTroves)
+        self.solver = None
 
 
     def groupEverything(self, trvs, alltrvs):
@@ -356,13 +362,34 @@ class CompsReader(object):
             nvfs.add((pkg, None, None))
         return nvfs
 
+    def getDepClosure(self, names):
+        '''
+        Get the binary and source package names of the dependency closure
+        of the named binary packages, so that dep checked groups are
+        complete.
+        '''
+        if self.solver is None:
+            self.solver = DependencySolver(self.bot._pkgSource,
+                arches=self.solverArches)
+        pkgs = [ x for x in map(self.solver.getLatest, names) if x ]
+        closure, unresolved = self.solver.resolve(pkgs)
+        for pkg, reqs in unresolved.iteritems():
+            print "[WARNING] unresolved requirements of %s: %s" % (pkg,
+                ', '.join(sorted(reqs)))
+        closureNames = set()
+        for pkg in closure:
+            closureNames.add(pkg.name)
+            closureNames.add(self.bot._pkgSource.binPkgMap[pkg].name)
+        return closureNames
+
     def getStandardPackageMap(self):
         pkgMap = {}
         pkgList = []
         if not self.group_everything:
             self.group_everything = self.groupEverything(self.troves, self.allTroves)
+        standard = self.getDepClosure(GROUP_STANDARD)
         for name, nvfs in self.group_everything.iteritems():
-            if nvfs and name in GROUP_STANDARD:
+            if nvfs and name in standard:
                 pkgList.append((name, self.byDefault.get('default')))
         if pkgList:
             pkgMap['group-standard'] = pkgList
@@ -16,11 +16,15 @@
 #
 
 
+import Queue
 import getopt
+import hashlib
+import json
 import os
 import re
 import stat
 import sys
+import threading
 import time
 
 from optparse import OptionParser
@@ -33,7 +37,13 @@ def hash_size_time(size, time):
 def hash_size(size):
     return (size) & (MAX_HASHES - 1);
 
-def hash_value(size, time, notimestamp):
+def hash_value(size, time, notimestamp, exact=False):
+    if exact:
+        # Digests make comparisons cheap, so group files by exact size and
+        # time rather than sharing buckets between different sizes.
+        if notimestamp:
+            return size
+        return (size, time)
     if notimestamp:
         return hash_size(size)
     else:
@@ -116,6 +126,169 @@ def areFileContentsEqual(filename1, filename2, options):
         gStats.didComparison()
     return result
 
+# Number of bytes read for first block digests.
+FIRST_BLOCK_SIZE = 64 * 1024
+
+def file_digest(filename, limit=None):
+    """Return the sha256 hex digest of the contents of a file, or of only the
+    first limit bytes if limit is given."""
+    digest = hashlib.sha256()
+    fh = open(filename, 'rb')
+    try:
+        buffer_size = 1024*1024
+        remaining = limit
+        while 1:
+            if remaining is not None:
+                if remaining <= 0:
+                    break
+                buffer = fh.read(min(buffer_size, remaining))
+                remaining -= len(buffer)
+            else:
+                buffer = fh.read(buffer_size)
+            if not buffer:
+                break
+            digest.update(buffer)
+    finally:
+        fh.close()
+    return digest.hexdigest()
+
+
+class DigestIndex:
+    """Persistent map of (device, inode, size, mtime, ctime) to the first
+    block and full digests of a file, so that files which have not changed
+    since the last run are not read again. Times are kept in microseconds.
+    The change time can not be set by users, so a file that is rewritten with
+    the same size and its modification time restored still gets a new key.
+
+    The index is stored as a text file with one file per line. Only entries
+    for files seen during this run are written back, which drops files that
+    have since been removed or replaced."""
+
+    # Number of fields in a key.
+    KEY_FIELDS = 5
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.seen = {}
+        self.prefetched = set()
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        fh = open(self.path)
+        try:
+            for line in fh:
+                fields = line.split()
+                if len(fields) != self.KEY_FIELDS + 2:
+                    continue
+                key = tuple([ long(x) for x in fields[:self.KEY_FIELDS] ])
+                first, full = [ x != '-' and x or None
+                                for x in fields[self.KEY_FIELDS:] ]
+                self.entries[key] = [first, full]
+        finally:
+            fh.close()
+
+    def save(self):
+        if not self.path:
+            return
+        temp_name = '%s.%s.tmp' % (self.path, os.getpid())
+        fh = open(temp_name, 'w')
+        try:
+            for key, (first, full) in self.seen.iteritems():
+                fh.write(' '.join([ str(x) for x in key ] +
+                                  [ first or '-', full or '-' ]) + '\n')
+        finally:
+            fh.close()
+        os.rename(temp_name, self.path)
+
+    def _key(self, stat_info):
+        return (stat_info[stat.ST_DEV], stat_info[stat.ST_INO],
+                stat_info[stat.ST_SIZE],
+                long(stat_info.st_mtime * 1000000),
+                long(stat_info.st_ctime * 1000000))
+
+    def touch(self, stat_info):
+        """Keep the entry for a file that still exists."""
+        key = self._key(stat_info)
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.seen[key] = entry
+
+    def _entry(self, stat_info):
+        key = self._key(stat_info)
+        entry = self.seen.get(key)
+        if entry is None:
+            entry = self.entries.pop(key, None) or [None, None]
+            self.seen[key] = entry
+        return entry
+
+    def peek(self, stat_info, slot):
+        """Return a digest if it is known, without counting it."""
+        key = self._key(stat_info)
+        entry = self.seen.get(key) or self.entries.get(key)
+        return entry and entry[slot]
+
+    def prefetch(self, stat_info, slot, digest):
+        """Store a digest computed ahead of time by a worker. It is counted as
+        computed when it is first used, so that statistics match a serial
+        run."""
+        key = self._key(stat_info)
+        entry = self.seen.get(key)
+        if entry is None:
+            entry = self.entries.setdefault(key, [None, None])
+        entry[slot] = digest
+        self.prefetched.add((key, slot))
+
+    def _count(self, stat_info, slot):
+        key = (self._key(stat_info), slot)
+        if key in self.prefetched:
+            self.prefetched.remove(key)
+            gStats.didDigest()
+        else:
+            gStats.reusedDigest()
+
+    def firstBlockDigest(self, filename, stat_info):
+        entry = self._entry(stat_info)
+        if entry[0] is None:
+            if stat_info[stat.ST_SIZE] <= FIRST_BLOCK_SIZE:
+                # the first block is the whole file
+                entry[0] = entry[1] = self.fullDigest(filename, stat_info)
+            else:
+                entry[0] = file_digest(filename, FIRST_BLOCK_SIZE)
+                gStats.didDigest()
+        else:
+            self._count(stat_info, 0)
+        return entry[0]
+
+    def fullDigest(self, filename, stat_info):
+        entry = self._entry(stat_info)
+        if entry[1] is None:
+            entry[1] = file_digest(filename)
+            gStats.didDigest()
+        else:
+            self._count(stat_info, 1)
+        return entry[1]
+
+
+def areDigestsEqual(file_info_1, file_info_2, options):
+    """Determine if the contents of two files are equal by comparing their
+    digests, checking the first block digests first if requested.
+    **!! This function assumes that the file sizes of the two files are
+    equal."""
+    filename1, stat_info_1 = file_info_1
+    filename2, stat_info_2 = file_info_2
+    if options.verbose >= 1:
+        print "Comparing: %s" % filename1
+        print "     to  : %s" % filename2
+    gStats.didComparison()
+    if options.firstblock:
+        if (digest_index.firstBlockDigest(filename1, stat_info_1) !=
+            digest_index.firstBlockDigest(filename2, stat_info_2)):
+            return False
+    return (digest_index.fullDigest(filename1, stat_info_1) ==
+            digest_index.fullDigest(filename2, stat_info_2))
+
 # Determines if two files should be hard linked together.
 def areFilesHardlinkable(file_info_1, file_info_2, options):
     filename1 = file_info_1[0]
@@ -126,15 +299,21 @@ def areFilesHardlinkable(file_info_1, file_info_2, options):
     if eligibleForHardlink(stat_info_1, stat_info_2, options):
         # Now see if the contents of the file are the same.  If they are then
         # these two files should be hardlinked.
+        if options.digest:
+            compare = lambda: areDigestsEqual(file_info_1, file_info_2,
+                                              options)
+        else:
+            compare = lambda: areFileContentsEqual(filename1, filename2,
+                                                   options)
         if not options.samename:
             # By default we don't care if the filenames are equal
-            result = areFileContentsEqual(filename1, filename2, options)
+            result = compare()
         else:
             # Make sure the filenames are the same, if so then compare content
             basename1 = os.path.basename(filename1)
             basename2 = os.path.basename(filename2)
             if basename1 == basename2:
-                result = areFileContentsEqual(filename1, filename2, options)
+                result = compare()
             else:
                 result = False
     else:
@@ -220,7 +399,11 @@ def hardlink_identical_files(directories, filename, options):
     if not stat_info:
         # We didn't get the file status info :(
         return
+    hardlink_file(directories, filename, stat_info, options)
 
+def hardlink_file(directories, filename, stat_info, options):
+    """Hardlink a file that has already been stat'ed to any identical file
+    seen so far, see hardlink_identical_files."""
     # Is it a directory?
     if stat.S_ISDIR(stat_info[stat.ST_MODE]):
         # If it is a directory then add it to the list of directories.
@@ -229,9 +412,11 @@ def hardlink_identical_files(directories, filename, options):
     elif stat.S_ISREG(stat_info[stat.ST_MODE]):
         # Create the hash for the file.
         file_hash = hash_value(stat_info[stat.ST_SIZE], stat_info[stat.ST_MTIME],
-            options.notimestamp)
+            options.notimestamp, options.digest)
         # Bump statistics count of regular files found.
         gStats.foundRegularFile()
+        if options.digestindex:
+            digest_index.touch(stat_info)
         if options.verbose >= 2:
             print "File: %s" % filename
         work_file_info = (filename, stat_info)
@@ -264,11 +449,203 @@ def hardlink_identical_files(directories, filename, options):
             file_hashes[file_hash] = [work_file_info]
 
 
+class cWorkItem:
+    """A call to be made by a worker thread."""
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args)
+        except:
+            self.exc_info = sys.exc_info()
+        self.done.set()
+
+    def wait(self):
+        # wait with a timeout so that the main thread can be interrupted
+        while not self.done.isSet():
+            self.done.wait(1)
+        if self.exc_info:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.result
+
+
+class cWorkerPool:
+    """Pool of threads to do blocking file system calls in."""
+    def __init__(self, workers):
+        self.queue = Queue.Queue()
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self.worker)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def worker(self):
+        while 1:
+            item = self.queue.get()
+            if item is None:
+                break
+            item.run()
+
+    def submit(self, func, *args):
+        item = cWorkItem(func, args)
+        self.queue.put(item)
+        return item
+
+    def close(self):
+        for thread in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+def scan_directory(directory, options):
+    """List a directory and stat its entries, skipping the same entries that
+    the serial scan in main skips.  Called from worker threads.
+
+    Returns a status of 'notdir', 'error' or 'ok' and a list of (pathname,
+    stat_info) tuples, where stat_info is None if the entry could not be
+    stat'ed."""
+    if not os.path.isdir(directory):
+        return 'notdir', None
+    try:
+        dir_entries = os.listdir(directory)
+    except OSError:
+        return 'error', None
+    entries = []
+    for entry in dir_entries:
+        pathname = os.path.normpath(os.path.join(directory,entry))
+        if entry[0] == ".":
+            if MIRROR_PL_REGEX.match(entry):
+                continue
+            if RSYNC_TEMP_REGEX.match(entry):
+                continue
+        if os.path.islink(pathname):
+            continue
+        for exclude in options.excludes:
+            if re.search(exclude, pathname):
+                break
+        else:
+            try:
+                stat_info = os.stat(pathname)
+            except OSError:
+                stat_info = None
+            entries.append((pathname, stat_info))
+    return 'ok', entries
+
+def scan_parallel(directories, pool, options):
+    """Walk the directories in the same order as the serial scan in main,
+    listing and stat'ing directories in the worker pool.  Subdirectories are
+    queued as soon as their parent has been listed.
+
+    Returns a list of (directory, status, entries) tuples in the order the
+    serial scan would visit the directories."""
+    def submit(directory):
+        return (directory, pool.submit(scan_directory, directory + '/',
+                                       options))
+    stack = [ submit(x) for x in directories ]
+    events = []
+    while stack:
+        directory, item = stack.pop()
+        status, entries = item.wait()
+        events.append((directory + '/', status, entries))
+        for pathname, stat_info in entries or ():
+            if stat_info and stat.S_ISDIR(stat_info[stat.ST_MODE]):
+                stack.append(submit(pathname))
+    return events
+
+def prefetch_digests(events, pool, options):
+    """Compute the digests of all files that may be compared in the worker
+    pool, so that the linking pass does not have to wait on reads.  Only files
+    that share their size, owner, mode, device and, unless timestamps are
+    ignored, mtime with a different inode are read."""
+    groups = {}
+    for directory, status, entries in events:
+        for pathname, stat_info in entries or ():
+            if (not stat_info or not stat.S_ISREG(stat_info[stat.ST_MODE]) or
+                not stat_info[stat.ST_SIZE]):
+                continue
+            key = (stat_info[stat.ST_DEV], stat_info[stat.ST_SIZE],
+                   stat_info[stat.ST_MODE], stat_info[stat.ST_UID],
+                   stat_info[stat.ST_GID])
+            if not options.notimestamp:
+                key += (stat_info[stat.ST_MTIME], )
+            if options.samename:
+                key += (os.path.basename(pathname), )
+            inode = (stat_info[stat.ST_DEV], stat_info[stat.ST_INO])
+            groups.setdefault(key, {})[inode] = (pathname, stat_info)
+    groups = [ x.values() for x in groups.itervalues() if len(x) > 1 ]
+
+    def compute(files, slot):
+        items = []
+        for pathname, stat_info in files:
+            if digest_index.peek(stat_info, slot):
+                continue
+            limit = slot == 0 and FIRST_BLOCK_SIZE or None
+            items.append((stat_info, pool.submit(file_digest, pathname, limit)))
+        for stat_info, item in items:
+            try:
+                digest = item.wait()
+            except (IOError, OSError):
+                # leave it to the linking pass to report
+                continue
+            digest_index.prefetch(stat_info, slot, digest)
+
+    if not options.firstblock:
+        compute([ x for y in groups for x in y ], 1)
+        return
+
+    # Small files are digested whole, like firstBlockDigest does.
+    compute([ x for y in groups for x in y
+                if x[1][stat.ST_SIZE] <= FIRST_BLOCK_SIZE ], 1)
+    compute([ x for y in groups for x in y
+                if x[1][stat.ST_SIZE] > FIRST_BLOCK_SIZE ], 0)
+    full = []
+    for files in groups:
+        if files[0][1][stat.ST_SIZE] <= FIRST_BLOCK_SIZE:
+            continue
+        byFirst = {}
+        for pathname, stat_info in files:
+            first = digest_index.peek(stat_info, 0)
+            if first:
+                byFirst.setdefault(first, []).append((pathname, stat_info))
+        for matches in byFirst.itervalues():
+            if len(matches) > 1:
+                full.extend(matches)
+    compute(full, 1)
+
+def replay(events, options):
+    """Make the linking decisions for a parallel scan, in the same order
+    and with the same output as the serial scan in main."""
+    directories = []
+    for directory, status, entries in events:
+        if status == 'notdir':
+            print "%s is NOT a directory!" % directory
+            continue
+        gStats.foundDirectory()
+        if status == 'error':
+            print "Error: Unable to do an os.listdir on: %s  Skipping..." % directory
+            continue
+        for pathname, stat_info in entries:
+            if stat_info is None:
+                print "Unable to get stat info for: %s" % pathname
+                print "If running Python 1.5 this could be because the file is greater than 2 Gibibytes"
+                continue
+            hardlink_file(directories, pathname, stat_info, options)
+
+
 class cStatistics:
     def __init__(self):
         self.dircount = 0L                  # how many directories we find
         self.regularfiles = 0L              # how many regular files we find
         self.comparisons = 0L               # how many file content comparisons
+        self.digests = 0L                   # how many file digests computed
+        self.digests_reused = 0L            # digests taken from the index
         self.hardlinked_thisrun = 0L        # hardlinks done this run
         self.hardlinked_previously = 0L;    # hardlinks that are already existing
         self.bytes_saved_thisrun = 0L       # bytes saved by hardlinking this run
@@ -283,6 +660,10 @@ class cStatistics:
         self.regularfiles = self.regularfiles + 1
     def didComparison(self):
         self.comparisons = self.comparisons + 1
+    def didDigest(self):
+        self.digests = self.digests + 1
+    def reusedDigest(self):
+        self.digests_reused = self.digests_reused + 1
     def foundHardlink(self,sourcefile, destfile, stat_info):
         filesize = stat_info[stat.ST_SIZE]
         self.hardlinked_previously = self.hardlinked_previously + 1
@@ -324,12 +705,36 @@ class cStatistics:
         print "Directories           : %s" % self.dircount
         print "Regular files         : %s" % self.regularfiles
         print "Comparisons           : %s" % self.comparisons
+        if options.digest:
+            print "Digests computed      : %s" % self.digests
+            print "Digests reused        : %s" % self.digests_reused
         print "Hardlinked this run   : %s" % self.hardlinked_thisrun
         print "Total hardlinks       : %s" % (self.hardlinked_previously + self.hardlinked_thisrun)
         print "Bytes saved this run  : %s (%s)" % (self.bytes_saved_thisrun, humanize_number(self.bytes_saved_thisrun))
         totalbytes = self.bytes_saved_thisrun + self.bytes_saved_previously;
         print "Total bytes saved     : %s (%s)" % (totalbytes, humanize_number(totalbytes))
         print "Total run time        : %s seconds" % (time.time() - self.starttime)
+    def writeReport(self, filename, options):
+        report = {
+            'dryrun': options.dryrun,
+            'directories': self.dircount,
+            'regular_files': self.regularfiles,
+            'comparisons': self.comparisons,
+            'digests': self.digests,
+            'digests_reused': self.digests_reused,
+            'hardlinked_this_run': self.hardlinked_thisrun,
+            'hardlinked_previously': self.hardlinked_previously,
+            'bytes_saved_this_run': self.bytes_saved_thisrun,
+            'bytes_saved_previously': self.bytes_saved_previously,
+            'hardlinks': [ {'source': source, 'dest': dest}
+                           for (source, dest) in self.hardlinkstats ],
+        }
+        fh = open(filename, 'w')
+        try:
+            json.dump(report, fh, indent=2, sort_keys=True)
+            fh.write('\n')
+        finally:
+            fh.close()
 
 
 
@@ -368,9 +773,25 @@ def parseCommandLine():
     usage = "usage: %prog [options] directory [ directory ... ]"
     version = "%prog: " + VERSION
     parser = OptionParser(usage=usage, version=version)
+    parser.add_option("-b", "--first-block",
+        help="Compare digests of the first %s bytes before digesting whole files (implies --digest)" % FIRST_BLOCK_SIZE,
+        action="store_true", dest="firstblock", default=False,)
+
+    parser.add_option("-d", "--digest",
+        help="Compare files by sha256 digests instead of byte by byte",
+        action="store_true", dest="digest", default=False,)
+
     parser.add_option("-f", "--filenames-equal", help="Filenames have to be identical",
         action="store_true", dest="samename", default=False,)
 
+    parser.add_option("-i", "--digest-index",
+        help="File to keep digests in between runs, unchanged files are not read again (implies --digest)",
+        metavar="FILE", action="store", dest="digestindex", default=None,)
+
+    parser.add_option("-j", "--jobs",
+        help="Number of threads to scan and digest files with (default: %default)", metavar="JOBS",
+        action="store", dest="jobs", default=1, type="int")
+
     parser.add_option("-n", "--dry-run", help="Do NOT actually hardlink files",
         action="store_true", dest="dryrun", default=False,)
 
@@ -380,6 +801,10 @@ def parseCommandLine():
     parser.add_option("-q", "--no-stats", help="Do not print the statistics",
         action="store_false", dest="printstats", default=True,)
 
+    parser.add_option("-r", "--report",
+        help="Write the hardlinks made, or that would be made with --dry-run, and the statistics to FILE as json",
+        metavar="FILE", action="store", dest="report", default=None,)
+
     parser.add_option("-t", "--timestamp-ignore",
         help="File modification times do NOT have to be identical",
         action="store_true", dest="notimestamp", default=False,)
@@ -393,6 +818,11 @@ def parseCommandLine():
         action="append", dest="excludes", default=[],)
 
     (options, args) = parser.parse_args()
+    if options.firstblock or options.digestindex:
+        options.digest = True
+    if options.digestindex:
+        options.digestindex = os.path.abspath(
+            os.path.expanduser(options.digestindex))
     if not args:
         parser.print_help()
         print
@@ -418,14 +848,30 @@ gStats = cStatistics()
 
 file_hashes = {}
 
+# Compile up our regexes ahead of time
+MIRROR_PL_REGEX = re.compile(r'^\.in\.')
+RSYNC_TEMP_REGEX = re.compile((r'^\..*\.\?{6,6}$'))
+
+digest_index = DigestIndex()
+
 VERSION = "0.04 - 2007-11-14 (14-Nov-2007)"
 
 def main():
+    global digest_index
     # Parse our argument list and get our list of directories
     options, directories = parseCommandLine()
-    # Compile up our regexes ahead of time
-    MIRROR_PL_REGEX = re.compile(r'^\.in\.')
-    RSYNC_TEMP_REGEX = re.compile((r'^\..*\.\?{6,6}$'))
+    if options.digestindex:
+        digest_index = DigestIndex(options.digestindex)
+    if options.jobs > 1:
+        pool = cWorkerPool(options.jobs)
+        try:
+            events = scan_parallel(directories, pool, options)
+            if options.digest:
+                prefetch_digests(events, pool, options)
+        finally:
+            pool.close()
+        replay(events, options)
+        directories = []
     # Now go through all the directories that have been added.
     # NOTE: hardlink_identical_files() will add more directories to the
     #       directories list as it finds them.
@@ -461,6 +907,9 @@ def main():
                 if debug1 and os.path.isdir(pathname):
                     print "%s is a directory!" % pathname
                 hardlink_identical_files(directories, pathname, options)
+    digest_index.save()
+    if options.report:
+        gStats.writeReport(options.report, options)
     if options.printstats:
         gStats.printStats(options)
 
@@ -17,14 +17,16 @@ Base modules for dealing
 """
 
 import time
-import smtplib
+import socket
+import itertools
 import logging
 from email.MIMEText import MIMEText
-from smtplib import SMTPRecipientsRefused, SMTPHeloError
-from smtplib import SMTPSenderRefused, SMTPDataError
+from smtplib import SMTPException
 
 log = logging.getLogger('updatebot.advisories')
 
+from updatebot.lib import mailer
+
 from updatebot.errors import AdvisoryRecipientRefusedError
 from updatebot.errors import FailedToSendAdvisoryError
 from updatebot.errors import MultipleAdvisoriesFoundError
@@ -80,28 +82,49 @@ Description:
     def __str__(self):
         return self._subject
 
-    def send(self):
+    def send(self, sender=None):
         """
         Send an advisory email.
+        @param sender: mailer to send with, defaults to a new mailer for the
+                       configured smtp server.
+        @type sender: updatebot.lib.mailer.Mailer
         """
 
-        message = self._getMessage()
-        smtp = self._smtpConnect()
+        if sender is None:
+            sender = mailer.Mailer.fromConfig(self._cfg)
 
         try:
-            results = smtp.sendmail(self._from, self._to + self._bcc,
-                                    message.as_string())
-        except (SMTPRecipientsRefused, SMTPHeloError, SMTPSenderRefused,
-                SMTPDataError), e:
+            results = sender.send(self.getMailMessage())
+        except (SMTPException, socket.error), e:
             raise FailedToSendAdvisoryError(error=e)
-
-        smtp.quit()
+        finally:
+            sender.close()
 
         if results is not None and results != {}:
             raise AdvisoryRecipientRefusedError(data=results)
 
         return results
 
+    def getKey(self):
+        """
+        Get a key that identifies this advisory across runs, used to avoid
+        sending the same advisory twice.
+        """
+
+        troves = sorted(x.strip()
+                        for x in self._data['updateTroves'].split('\n'))
+        return '\n'.join([self._cfg.productName, self._subject, ] + troves)
+
+    def getMailMessage(self):
+        """
+        Get the message to hand to the mailer.
+        @return message
+        @rtype updatebot.lib.mailer.Message
+        """
+
+        return mailer.Message(self.getKey(), self._from, self._to + self._bcc,
+                              self._getMessage().as_string())
+
     def _getMessage(self):
         """
         Get the message to send.
@@ -122,19 +145,6 @@ Description:
 
         return ', '.join(lst)
 
-    def _smtpConnect(self):
-        """
-        Get a smtp connection object.
-        """
-
-        server = smtplib.SMTP(self._cfg.smtpServer)
-
-        rootLogger = logging.getLogger('')
-        if rootLogger.level == logging.DEBUG:
-            server.set_debuglevel(1)
-
-        return server
-
     def setUpdateTroves(self, troves):
         """
         Set the list of updated troves to add to the advisory.
@@ -362,7 +372,7 @@ class BaseAdvisor(object):
 
         toSend = set()
         for patch, advisory in self._advisories.iteritems():
-            binNames = [ x.name for x in patch.packages ]
+            binNames = set(x.name for x in patch.packages)
             for srpm in self._cache[patch]:
                 if srpm not in newTroveMap:
                     log.warn('%s not in newTroveMap' % srpm)
@@ -378,9 +388,28 @@ class BaseAdvisor(object):
                 advisory.setUpdateTroves(newTroveMap[srpm])
                 toSend.add(advisory)
 
-        for advisory in toSend:
-            log.info('sending advisory: %s' % advisory)
-            advisory.send()
+        log.info('sending %s advisories' % len(toSend))
+
+        sender = mailer.Mailer.fromConfig(self._cfg)
+        results = sender.sendMany([ x.getMailMessage() for x in toSend ])
+
+        # Report every failure, then raise the first one. Advisories that
+        # were sent are recorded in the outbox and will not be sent again.
+        errors = []
+        for message, refused, excInfo in results:
+            if excInfo:
+                log.error('failed to send advisory %s: %s'
+                          % (message.key.split('\n')[1], excInfo[1]))
+                errors.append(FailedToSendAdvisoryError(error=excInfo[1]))
+            elif refused:
+                log.error('recipients refused advisory %s: %s'
+                          % (message.key.split('\n')[1], refused))
+                errors.append(AdvisoryRecipientRefusedError(data=refused))
+            else:
+                log.info('sent advisory: %s' % message.key.split('\n')[1])
+
+        if errors:
+            raise errors[0]
 
     def _mkNewTroveMap(self, trvLst, newTroves):
         """
@@ -392,13 +421,18 @@ class BaseAdvisor(object):
         @return {trvLstElement: [(n, v, f), ...]}
         """
 
+        # Index the new troves by name, keeping their position so that each
+        # list of troves is in the same order as newTroves.
+        # { name: [ (index, (n, v, f)), ... ] }
+        nameMap = dict()
+        for i, (n, v, f) in enumerate(newTroves):
+            nameMap.setdefault(n, []).append((i, (n, v, f)))
+
         res = dict()
         for nvf, srcPkg in trvLst:
-            res[srcPkg] = []
-            binNames = [ x.name for x in self._pkgSource.srcPkgMap[srcPkg] ]
-            for n, v, f in newTroves:
-                if n in binNames:
-                    res[srcPkg].append((n, v, f))
+            binNames = set(x.name for x in self._pkgSource.srcPkgMap[srcPkg])
+            res[srcPkg] = [ x[1] for x in sorted(itertools.chain(
+                *[ nameMap.get(x, ()) for x in binNames ])) ]
             if not res[srcPkg]:
                 raise NoPackagesFoundForAdvisory(what=(nvf, srcPkg))
 
@@ -18,6 +18,7 @@ Advisory module for SLES.
 
 import logging
 
+from updatebot.lib import util
 from updatebot.advisories.common import BaseAdvisor
 
 log = logging.getLogger('updatebot.advisories')
@@ -29,16 +30,37 @@ class Advisor(BaseAdvisor):
 
     allowExtraPackages = True
 
+    # set of repository paths with advisory exceptions
+    _exceptionPaths = None
+
     def load(self):
         """
         Parse the required data to generate a mapping of binary package
         object to patch object for a given platform into self._pkgMap.
         """
 
-        for path, client in self._pkgSource.getClients().iteritems():
+        workers = self._cfg.patchLoadWorkers
+
+        # Sort by path so that patches are always merged in the same order.
+        clients = sorted(self._pkgSource.getClients().iteritems())
+
+        def getPatchElements((path, client)):
             log.info('loading patch information %s' % path)
-            for patch in client.getPatchDetail():
-                self._loadOne(patch, path)
+            return client.getPatchElements()
+
+        # Fetch the patches.xml files of all repositories, then fetch and
+        # parse the patch files of all repositories together.
+        elements = util.threadedMap(getPatchElements, clients, workers=workers)
+        jobs = [ (path, element)
+                 for (path, client), elems in zip(clients, elements)
+                 for element in elems ]
+
+        log.info('loading %s patches' % len(jobs))
+        patches = util.threadedMap(lambda x: x[1].parseChildren(), jobs,
+                                   workers=workers)
+
+        for (path, element), patch in zip(jobs, patches):
+            self._loadOne(patch, path)
 
     def _loadOne(self, patch, path):
         """
@@ -66,13 +88,12 @@ class Advisor(BaseAdvisor):
         @type binPkg: repomd.packagexml._Package
         """
 
-        shortPath = binPkg.location.split('/')[0]
+        if self._exceptionPaths is None:
+            self._exceptionPaths = set(x[0].split('/')[0]
+                                       for x in self._cfg.advisoryException)
 
-        for advisoryException in self._cfg.advisoryException:
-            path = advisoryException[0].split('/')[0]
-            if path == shortPath:
-                return True
-        return False
+        shortPath = binPkg.location.split('/')[0]
+        return shortPath in self._exceptionPaths
 
     def _isUpdatesRepo(self, binPkg):
         """
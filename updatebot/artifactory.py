@@ -30,7 +30,7 @@ from . import cmdline
 from . import pkgsource
 from .bot import Bot as BotSuperClass
 from .build import Builder
-from .errors import JobFailedError
+from .lib import profiling
 from .lib import util
 from .update import Updater as UpdaterSuperClass
 
@@ -53,6 +53,7 @@ class Bot(BotSuperClass):
         self._pkgSource = pkgsource.PackageSource(self._cfg, self._ui)
         self._updater = Updater(self._cfg, self._ui, self._pkgSource)
 
+    @profiling.profiled('artifactory.create')
     def create(self, rebuild=False, recreate=None):
         """
         Do initial imports.
@@ -108,63 +109,25 @@ class Updater(UpdaterSuperClass):
             log.info('not building %s', leaf)
             return srcVersion, False
 
-    def _build(self, buildSet, buildReqs, cache):
-        """Helper function to do some repetivite pre-build processing
+    def _getLayers(self, graph):
+        """Split the dependency graph into layers that can be built in order
 
-        :param buildSet: list of name, version, flavor tuples and packages to
-            build
-        :type buildSet: [((name, version, flavor), package), ...]
-        :param dict cache: conary version cache
-        """
-        # unpack buildSet into nvf tuples
-        nvfs = []
-        buildPackages = []
-        resolveTroves = set()
-
-        for package, version in buildSet:
-            nvfs.append((package.name, version, None))
-            buildPackages.append(package)
-
-        # get our base rmakeCfg
-        rmakeCfg = Builder(self._cfg, self._ui)._getRmakeConfig()
-
-        # create resolve troves for deps not in the current chunk
-        resolveTroves.update(set([
-            (dep.name, rmakeCfg.buildLabel, dep.getConaryVersion())
-            for dep in buildReqs
-            if dep not in buildPackages
-            ]))
-
-        if resolveTroves:
-            rmakeCfg.configKey(
-                'resolveTroves',
-                ' '.join('%s=%s/%s' % r for r in resolveTroves),
-                )
-
-        # make a new buidler with rmakeCfg to do the actual build
-        builder = Builder(self._cfg, self._ui, rmakeCfg=rmakeCfg)
-
-        # Build all newly imported packages.
-        tries = 0
-        while True:
-            try:
-                log.debug("Building: \n%s", "\n".join(str(nvf) for nvf in nvfs))
-                log.debug("Resolve troves: \n%s",
-                          "\n".join("%s=%s/%s" % r for r in resolveTroves))
-                trvMap = builder.build(nvfs)
-            except JobFailedError, e:
-                # Commit partial job
-                log.info('committing partial job %s', e.jobId)
-                trvMap = builder._commitJob(e.jobId)
-                break
-                if tries > 1:
-                    raise
-                tries += 1
-                log.info('attempting to retry build: %s of %s', tries, 2)
-            else:
-                break
+        Every package only depends on packages in earlier layers. This
+        consumes the graph.
 
-        return trvMap
+        :param graph: package dependency graph
+        :type graph: conary.lib.graph.DirectedGraph
+        :returns: list of layers
+        :rtype: [[PomPackage, ...], ...]
+        """
+        layers = []
+        leaves = list(graph.getLeaves())
+        while leaves:
+            layers.append(leaves)
+            for leaf in leaves:
+                graph.delete(leaf)
+            leaves = list(graph.getLeaves())
+        return layers
 
     def _createVerCache(self, troveList):
         verCache = {}
@@ -223,15 +186,18 @@ class Updater(UpdaterSuperClass):
         source trove did not changes. Set `recreate` True if you want to check
         if existing sources changed, and import them if they have.
 
+        Sources are imported in dependency order, then all packages that need
+        to be built are handed to a single dispatcher that starts each build
+        as soon as the builds of its dependencies have been committed.
+
         :param buildAll: build all binary packages, even if their source didn't
             change, defaults to False
         :type buildAll: bool
         :param recreate: commit changed source packages when True, else only
             commit new sources
         :type recreate: bool
-        :returns: a list of buildable chunks (sets of packages that can be built
-            together)
-        :rtype: [set([((name, version, flavor), pkg), ...]), ...]
+        :returns: map of built troves and a set of failures
+        :rtype: (dict, set([(trove or jobId, error), ...]))
         """
         # generate a list of trove specs for the packages in the queue so
         # we can populate a cache of existing conary versions
@@ -240,26 +206,18 @@ class Updater(UpdaterSuperClass):
             troveList.append((p.name, p.getConaryVersion(), None))
             troveList.append(('%s:source' % p.name, p.getConaryVersion(), None))
 
-        fail = set()                    # packages that failed to import
-        chunk = set()                   # current chunk of packages to build
-        chunkedPackageNames = set()     # names of packages in the current chunk
-        trvMap = {}                     # map of built troves
-        verCache = self._createVerCache(troveList)  # initial version cache
+        verCache = self._createVerCache(troveList)
 
-        # walk our dependency graph by getting all of the current leaves,
-        # figuring out which can built together, building those and then
-        # reiterating the process with the new set of leaves
-        addedAny = False
         graph = self._pkgSource.pkgQueue
         total = len(list(graph.iterNodes()))
+        layers = self._getLayers(graph)
+        log.info('found %s packages in %s layers', total, len(layers))
+
+        # import sources and find the packages that need to be built
+        toBuild = {}        # map of package to the trove spec to build
         count = 0
-        leaves = set(graph.getLeaves())
-        job = set()               # set of leaves we can build together
-        jobNames = set()          # names of leaves and their deps in job
-        jobBuildReqs = set()      # leaves' build reqs
-        while leaves:
-            addedAny = False
-            for leaf in leaves:
+        for layer in layers:
+            for leaf in layer:
                 try:
                     version, buildLeaf = self._buildLeaf(
                         leaf, verCache, buildAll, recreate)
@@ -268,53 +226,32 @@ class Updater(UpdaterSuperClass):
                     raise
 
                 if buildLeaf:
-                    # defer this leaf to the next round if another
-                    # version of the leaf or of any of its
-                    # dependencies are building this round
-                    deferLeaf = False
-                    if leaf.name in jobNames or any(
-                            (d.name in jobNames and d not in jobBuildReqs)
-                            for d in leaf.dependencies):
-                        deferLeaf = True
-
-                    if not deferLeaf:
-                        # add this leaf to the job
-                        log.info("Building %s", leaf)
-                        job.add((leaf, version))
-                        jobNames.add(leaf.name)
-                        jobBuildReqs.update(set(leaf.dependencies))
-                        jobNames.update(
-                            set([d.name for d in leaf.dependencies]))
-                        graph.delete(leaf)
-                        count += 1
-                        addedAny = True
-                else:
-                    graph.delete(leaf)
-                    count += 1
-
-                if job and len(job) >= self._cfg.chunkSize:
-                    break
-
-            if job and not addedAny:
-                results = self._build(job, jobBuildReqs, verCache)
-                trvMap.update(results)
-                log.info("Processed %s of %s", count, total)
-
-                # update the version cache
-                verCache = self._createVerCache(troveList)
-
-                # clear the job
-                job = set()
-                jobNames = set()
-                jobBuildReqs = set()
-                jobBuildReqNames = set()
-                addedAny = False
-
-            leaves = set(graph.getLeaves())
-
-        # build the last job
-        if job:
-            trvMap.update(self._build(job, jobBuildReqs, verCache))
+                    log.info("Building %s", leaf)
+                    toBuild[leaf] = (leaf.name, version, None)
+                count += 1
             log.info("Processed %s of %s", count, total)
 
-        return trvMap, fail
+        if not toBuild:
+            return {}, set()
+
+        builder = Builder(self._cfg, self._ui)
+        buildLabel = builder._rmakeCfg.buildLabel
+
+        # each package waits for the builds of its own dependencies, and
+        # resolves its dependencies to the exact versions it requires
+        dependencies = {}
+        resolveTroves = {}
+        for package, nvf in toBuild.iteritems():
+            dependencies[nvf] = set([
+                toBuild[dep] for dep in package.dependencies
+                if dep in toBuild
+                ])
+            resolveTroves[nvf] = sorted(set([
+                '%s=%s/%s' % (dep.name, buildLabel, dep.getConaryVersion())
+                for dep in package.dependencies
+                ]))
+
+        trvMap, failures = builder.builddeps(toBuild.values(), dependencies,
+                                             resolveTroves=resolveTroves)
+
+        return trvMap, set(failures)
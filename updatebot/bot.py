@@ -27,6 +27,7 @@ from updatebot import build
 from updatebot import update
 from updatebot import cmdline
 from updatebot import pkgsource
+from updatebot.lib import profiling
 
 from updatebot.errors import InvalidUpdateModeError
 
@@ -83,6 +84,7 @@ class Bot(object):
 
         return sorted(toBuild)
 
+    @profiling.profiled('bot.create')
     def create(self, rebuild=False, recreate=None, toCreate=None):
         """
         Do initial imports.
@@ -177,6 +179,7 @@ class Bot(object):
 
         return trvMap, failed
 
+    @profiling.profiled('bot.update')
     def update(self, force=None, updatePkgs=None, expectedRemovals=None,
         allowPackageDowngrades=None, updateTroves=None,
         keepRemovedPackages=None):
@@ -271,9 +274,9 @@ class Bot(object):
 
         # Update source
         parentPackages = set()
-        for nvf, srcPkg in toUpdate:
+        newVersions = self._updater.updateMany(toUpdate)
+        for (nvf, srcPkg), newVersion in itertools.izip(toUpdate, newVersions):
             toAdvise.remove((nvf, srcPkg))
-            newVersion = self._updater.update(nvf, srcPkg)
             if self._updater.isPlatformTrove(newVersion):
                 toAdvise.append(((nvf[0], newVersion, nvf[2]), srcPkg))
             else:
@@ -331,6 +334,7 @@ class Bot(object):
 
         return trvMap
 
+    @profiling.profiled('bot.mirror')
     def mirror(self, fullTroveSync=False):
         """
         Mirror platform contents to production repository.
@@ -21,6 +21,7 @@ Builder object implementation.
 
 import os
 import xml
+import copy
 import stat
 import time
 import logging
@@ -58,6 +59,7 @@ from updatebot.build.jobs import OrderedCommitDispatcher
 from updatebot.build.dispatcher import Dispatcher
 from updatebot.build.dispatcher import RebuildDispatcher
 from updatebot.build.dispatcher import PromoteDispatcher
+from updatebot.build.dispatcher import DependencyDispatcher
 from updatebot.build.dispatcher import NonCommittalDispatcher
 from updatebot.build.callbacks import StatusOnlyDisplay
 
@@ -227,6 +229,32 @@ class Builder(object):
             dispatcher = NonCommittalDispatcher(self, workers, retries=retries)
         return dispatcher.buildmany(troveSpecs)
 
+    def builddeps(self, troveSpecs, dependencies, resolveTroves=None,
+                  workers=None, retries=None):
+        """
+        Build many troves in separate jobs, starting each job once all of the
+        troves it depends on have been committed.
+        @param troveSpecs: list of trove specs
+        @type troveSpecs: [(name, versionObj, flavorObj), ...]
+        @param dependencies: map of trove spec to the trove specs that must be
+                             committed before it can be built.
+        @type dependencies: dict((n, v, f)=set([(n, v, f), ...]))
+        @param resolveTroves: map of trove spec to resolve trove specs to add
+                              to the job for that trove.
+        @type resolveTroves: dict((n, v, f)=[str, ...])
+        @return (troveMap, failures)
+        """
+
+        if not workers:
+            workers = 30
+
+        if not retries:
+            retries = 0
+
+        dispatcher = DependencyDispatcher(self, workers, retries=retries)
+        return dispatcher.buildmany(troveSpecs, dependencies=dependencies,
+                                    resolveTroves=resolveTroves)
+
     def buildsplitarch(self, troveSpecs):
         """
         Build a list of packages, in N jobs where N is the number of
@@ -445,16 +473,19 @@ class Builder(object):
         return dispatcher.buildmany(troveSpecs)
 
 
-    def start(self, troveSpecs):
+    def start(self, troveSpecs, resolveTroves=None):
         """
         Public version of start job that starts a job without monitoring.
         @param troveSpecs: set of name, version, flavor tuples
         @type troveSpecs: set([(name, version, flavor), ..])
+        @param resolveTroves: optional list of resolve trove specs to add to
+                              the configured resolve troves for this job.
+        @type resolveTroves: list(str, ...)
         @return jobId: integer
         """
 
         troves = self._formatInput(troveSpecs)
-        jobId = self._startJob(troves)
+        jobId = self._startJob(troves, resolveTroves=resolveTroves)
         return jobId
 
     def watch(self, jobId):
@@ -626,18 +657,30 @@ class Builder(object):
         else:
             return self._helper.client.getJobs(jobId)
 
-    def _startJob(self, troveSpecs):
+    def _startJob(self, troveSpecs, resolveTroves=None):
         """
         Create and start a rMake build.
         @param troveSpecs: list of trove specs
         @type troveSpecs: [(name, versionObj, flavorObj), ...]
+        @param resolveTroves: optional list of resolve trove specs to add to
+                              the configured resolve troves for this job.
+        @type resolveTroves: list(str, ...)
         @return integer jobId
         """
 
+        rmakeHelper = self._helper
+        if resolveTroves:
+            # Use a separate helper with a copy of the configuration of this
+            # builder so that the configuration of this builder is not
+            # changed.
+            rmakeCfg = copy.deepcopy(self._rmakeCfg)
+            rmakeCfg.configLine('resolveTroves %s' % ' '.join(resolveTroves))
+            rmakeHelper = helper.rMakeHelper(buildConfig=rmakeCfg)
+
         # Create rMake job
         log.info('Creating build job: %s' % (troveSpecs, ))
-        job = self._helper.createBuildJob(list(troveSpecs))
-        jobId = self._helper.buildJob(job)
+        job = rmakeHelper.createBuildJob(list(troveSpecs))
+        jobId = rmakeHelper.buildJob(job)
         log.info('Started jobId: %s' % jobId)
 
         return jobId
@@ -979,6 +1022,10 @@ class Builder(object):
             for buildTroveTuple, committedList in troveTupleDict.iteritems():
                 troveMap[buildTroveTuple] = committedList
 
+        # The sources that were just built have new binaries.
+        self._conaryhelper.invalidateSources(set([ (x[0], x[1])
+                                                   for x in troveMap ]))
+
         return troveMap
 
     @staticmethod
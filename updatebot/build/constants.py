@@ -42,6 +42,7 @@ class WorkerTypes(object):
     LOCAL_CHANGESET_COMMIT = 4
     REBUILD_START = 5
     PROMOTE = 6
+    RESOLVE_START = 7
 
     names = {
         START: 'Start',
@@ -51,6 +52,7 @@ class WorkerTypes(object):
         LOCAL_CHANGESET_COMMIT: 'Local Changeset Commit',
         REBUILD_START: 'Rebuild Start',
         PROMOTE: 'Promote Troves',
+        RESOLVE_START: 'Resolve Start',
     }
 
 
@@ -31,6 +31,7 @@ from updatebot.build.monitor import JobStarter
 from updatebot.build.monitor import JobMonitor
 from updatebot.build.monitor import JobCommitter
 from updatebot.build.monitor import JobRebuildStarter
+from updatebot.build.monitor import JobResolveStarter
 from updatebot.build.monitor import JobPromoter
 from updatebot.build.constants import JobStatus
 
@@ -151,69 +152,7 @@ class Dispatcher(AbstractDispatcher):
                     self._slots -= 1
                     self._startSlots -= 1
 
-            # get started status
-            for trove, jobId in self._starter.getStatus():
-                self._jobs[jobId] = [trove, JobStatus.JOB_NOT_STARTED, None]
-                self._startSlots += 1
-                self._monitor.monitorJob(jobId)
-
-            # process starter errors
-            for trove, error in self._starter.getErrors():
-                self._startSlots += 1
-                self._slots += 1
-                self._failures.append((trove, error))
-
-            # update job status changes
-            for jobId, status in self._monitor.getStatus():
-                self._jobs[jobId][1] = status
-                # free up the slot once the job is built
-                if status in self._slotdone:
-                    self._slots += 1
-
-                    if self._slots > self._slots.upperlimit:
-                        log.critical('slots is greater than maxSlots')
-
-            # submit any jobs that are ready to commit as long as there are
-            # commit slots
-            toCommit = self._getCommitJobs()
-            # commit all available jobs at one time.
-            if toCommit:
-                for jobId in toCommit:
-                    # update status to !BUILT so that we don't try to commit
-                    # this job more than once.
-                    self._jobs[jobId][1] = JobStatus.JOB_COMMITTING
-
-                self._committer.commitJob(tuple(toCommit))
-                self._commitSlots -= 1
-
-            # process monitor errors
-            for jobId, error in self._monitor.getErrors():
-                self._slots += 1
-                self._jobs[jobId][1] = JobStatus.ERROR_MONITOR_FAILURE
-                self._failures.append((jobId, error))
-
-            # check for commit status
-            for jobId, result in self._committer.getStatus():
-                self._commitSlots += 1
-                # unbatch commit jobs
-                if not isinstance(jobId, tuple):
-                    jobId = (jobId, )
-                for jobId in jobId:
-                    self._jobs[jobId][2] = result
-
-            # process committer errors
-            for jobId, error in self._committer.getErrors():
-                self._commitSlots += 1
-                # unbatch commit jobs
-                if not isinstance(jobId, tuple):
-                    jobId = (jobId, )
-                for jobId in jobId:
-                    self._jobs[jobId][1] = JobStatus.ERROR_COMMITTER_FAILURE
-                    self._failures.append((jobId, error))
-
-                    # Flag job as failed so that monitor worker will exit
-                    # properly.
-                    self._builder.setCommitFailed(jobId, reason=str(error))
+            self._processStatus()
 
             # Wait for a bit before polling again.
             time.sleep(3)
@@ -222,6 +161,82 @@ class Dispatcher(AbstractDispatcher):
         for job, error in self._failures:
             log.error('[%s] failed with error: %s' % (job, error))
 
+        return self._getResults()
+
+    def _processStatus(self):
+        """
+        Process status updates from the starter, monitor and committer.
+        """
+
+        # get started status
+        for trove, jobId in self._starter.getStatus():
+            self._jobs[jobId] = [trove, JobStatus.JOB_NOT_STARTED, None]
+            self._startSlots += 1
+            self._monitor.monitorJob(jobId)
+
+        # process starter errors
+        for trove, error in self._starter.getErrors():
+            self._startSlots += 1
+            self._slots += 1
+            self._failures.append((trove, error))
+
+        # update job status changes
+        for jobId, status in self._monitor.getStatus():
+            self._jobs[jobId][1] = status
+            # free up the slot once the job is built
+            if status in self._slotdone:
+                self._slots += 1
+
+                if self._slots > self._slots.upperlimit:
+                    log.critical('slots is greater than maxSlots')
+
+        # submit any jobs that are ready to commit as long as there are
+        # commit slots
+        toCommit = self._getCommitJobs()
+        # commit all available jobs at one time.
+        if toCommit:
+            for jobId in toCommit:
+                # update status to !BUILT so that we don't try to commit
+                # this job more than once.
+                self._jobs[jobId][1] = JobStatus.JOB_COMMITTING
+
+            self._committer.commitJob(tuple(toCommit))
+            self._commitSlots -= 1
+
+        # process monitor errors
+        for jobId, error in self._monitor.getErrors():
+            self._slots += 1
+            self._jobs[jobId][1] = JobStatus.ERROR_MONITOR_FAILURE
+            self._failures.append((jobId, error))
+
+        # check for commit status
+        for jobId, result in self._committer.getStatus():
+            self._commitSlots += 1
+            # unbatch commit jobs
+            if not isinstance(jobId, tuple):
+                jobId = (jobId, )
+            for jobId in jobId:
+                self._jobs[jobId][2] = result
+
+        # process committer errors
+        for jobId, error in self._committer.getErrors():
+            self._commitSlots += 1
+            # unbatch commit jobs
+            if not isinstance(jobId, tuple):
+                jobId = (jobId, )
+            for jobId in jobId:
+                self._jobs[jobId][1] = JobStatus.ERROR_COMMITTER_FAILURE
+                self._failures.append((jobId, error))
+
+                # Flag job as failed so that monitor worker will exit
+                # properly.
+                self._builder.setCommitFailed(jobId, reason=str(error))
+
+    def _getResults(self):
+        """
+        Collect the results of all committed jobs.
+        """
+
         results = {}
         for jobId, (trove, status, result) in self._jobs.iteritems():
             # don't return errors if we intentionaly didn't commit.
@@ -442,6 +457,111 @@ class RebuildDispatcher(MultiVersionDispatcher):
             additionalResolveTroves))
 
 
+class DependencyDispatcher(Dispatcher):
+    """
+    Dispatcher for building troves that depend on each other. Each trove is
+    built in its own job, which is started as soon as all of the troves that
+    it depends on have been committed.
+    """
+
+    _starterClass = JobResolveStarter
+
+    def __init__(self, builder, maxSlots, retries=0):
+        Dispatcher.__init__(self, builder, maxSlots, retries=retries)
+
+        # trove: list of resolve trove specs
+        self._resolveTroves = {}
+
+        self._starter = self._starterClass((self._builder,
+            self._resolveTroves), retries=self._retries)
+
+    def _running(self):
+        """
+        Check if any jobs are being started, built or committed.
+        """
+
+        if self._startSlots != self._startSlots.upperlimit:
+            return True
+        return bool(self._jobs) and not self._jobDone()
+
+    def buildmany(self, troveSpecs, dependencies=None, resolveTroves=None):
+        """
+        Build troves in dependency order.
+        @param troveSpecs: list of trove specs
+        @type troveSpecs: [(name, versionObj, flavorObj), ...]
+        @param dependencies: map of trove spec to the trove specs that must be
+                             committed before it can be built.
+        @type dependencies: dict((n, v, f)=set([(n, v, f), ...]))
+        @param resolveTroves: map of trove spec to resolve trove specs to add
+                              to the job for that trove.
+        @type resolveTroves: dict((n, v, f)=[str, ...])
+        @return (troveMap, failures)
+        """
+
+        if not troveSpecs:
+            return {}, self._failures
+
+        if dependencies is None:
+            dependencies = {}
+        if resolveTroves is not None:
+            self._resolveTroves.update(resolveTroves)
+
+        troveSet = set(troveSpecs)
+        pending = list(troveSpecs)
+
+        while pending or self._running():
+            # Find troves that have been committed and troves that will never
+            # be committed.
+            committed = set()
+            failed = set([ x[0] for x in self._failures if x[0] in troveSet ])
+            for jobId, (trove, status, result) in self._jobs.iteritems():
+                if result:
+                    committed.add(trove)
+                elif status in self._completed:
+                    failed.add(trove)
+
+            ready = []
+            for trove in list(pending):
+                reqs = dependencies.get(trove, set()) & troveSet
+                if reqs & failed:
+                    log.error('not building %s, dependencies failed: %s'
+                              % (trove, ', '.join([ str(x)
+                                                    for x in reqs & failed ])))
+                    pending.remove(trove)
+                    self._failures.append((trove, 'failed dependencies'))
+                elif reqs <= committed:
+                    ready.append(trove)
+
+            # Nothing can ever become ready if nothing is running.
+            if pending and not ready and not self._running():
+                for trove in pending:
+                    log.error('not building %s, dependencies can not be '
+                              'satisfied' % (trove, ))
+                    self._failures.append((trove, 'unsatisfiable dependencies'))
+                pending = []
+
+            # Only create more jobs once the last batch has been started.
+            if self._startSlots == self._startSlots.upperlimit:
+                while (ready and self._slots and self._startSlots and
+                       self._availableFDs()):
+                    trove = ready.pop(0)
+                    pending.remove(trove)
+                    self._starter.startJob(trove)
+                    self._slots -= 1
+                    self._startSlots -= 1
+
+            self._processStatus()
+
+            # Wait for a bit before polling again.
+            time.sleep(3)
+
+        # report failures
+        for job, error in self._failures:
+            log.error('[%s] failed with error: %s' % (job, error))
+
+        return self._getResults()
+
+
 class PromoteDispatcher(Dispatcher):
     """
     Dispatcher class that promotes the builds to the production label once they
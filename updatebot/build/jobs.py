@@ -66,6 +66,10 @@ class Status(object):
     def isDone(self):
         return self._isDone
 
+    @property
+    def error(self):
+        return self._error
+
     @property
     def results(self):
         if self._results is None:
@@ -84,6 +84,29 @@ class RebuildStartWorker(StartWorker):
             self.status.put((MessageTypes.DATA, (self.trove, jobIds[0])))
 
 
+class ResolveStartWorker(StartWorker):
+    """
+    Worker thread for starting jobs with job specific resolve troves and
+    reporting status.
+    """
+
+    threadType = WorkerTypes.RESOLVE_START
+
+    def __init__(self, status, (builder, resolveTroves, trove)):
+        StartWorker.__init__(self, status, (builder, trove))
+
+        self.resolveTroves = resolveTroves.get(trove)
+
+    def work(self):
+        """
+        Start the specified build and report jobId.
+        """
+
+        jobId = self.builder.start(self.trove,
+                                   resolveTroves=self.resolveTroves)
+        self.status.put((MessageTypes.DATA, (self.trove, jobId)))
+
+
 class MonitorWorker(AbstractWorker):
     """
     Worker thread for monitoring jobs and reporting status.
@@ -216,6 +239,16 @@ class JobRebuildStarter(AbstractStatusMonitor):
     startJob = AbstractStatusMonitor.addJob
 
 
+class JobResolveStarter(AbstractStatusMonitor):
+    """
+    Abstraction around threaded starter model for jobs with job specific
+    resolve troves.
+    """
+
+    workerClass = ResolveStartWorker
+    startJob = AbstractStatusMonitor.addJob
+
+
 class JobMonitor(AbstractStatusMonitor):
     """
     Abstraction around threaded monitoring model.
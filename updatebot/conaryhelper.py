@@ -26,6 +26,7 @@ import time
 import logging
 import tempfile
 import itertools
+import threading
 
 import conary
 from conary import trove
@@ -53,6 +54,7 @@ from updatebot.errors import BinariesNotFoundForSourceVersion
 from updatebot.errors import CanNotPromoteGroupsAndPackagesTogetherError
 
 from updatebot.lib.findtroves import FindTrovesCache
+from updatebot.lib.checkoutstore import CheckoutStore
 from updatebot.lib.conarycallbacks import UpdateBotCloneCallback
 
 log = logging.getLogger('updatebot.conaryhelper')
@@ -67,12 +69,25 @@ class ConaryHelperSharedCache(object):
         # binTroveSpec: sourceTroveSpec
         self.sourceVersionCache = {}
 
-        # Keep a cache of all binary versions that have been looked up in
-        # getBinaryVersions to avoid lots of expensive getTroveVersionsByLabel
-        # calls.
+        # Keep a cache of all binary versions that have been indexed by
+        # _indexLabels so that refreshing the index only has to look up the
+        # sources of new binaries.
         # frzenset(labels): binTroveNVFSet
         self.binaryVersionCache = {}
 
+        # Index of binaries built from source versions, populated one source
+        # at a time with getTrovesBySource or a label at a time by
+        # _indexLabels. Sources are dropped from the index when they are
+        # built again.
+        # srcTroveSpec: binTroveNVFSet
+        self.sourceBinaryIndex = {}
+
+        # Cache of getTrovesBySource results. Sources without any troves
+        # are not cached, since they may not have been built yet, and
+        # entries are dropped when a source is built again.
+        # (srcName, srcVersion): [ binTroveNVF, ... ]
+        self.trovesBySourceCache = {}
+
         # Cache cloned from information
         # srcNVF: destNVF
         self.clonedFromCache = {}
@@ -84,6 +99,27 @@ class ConaryHelperSharedCache(object):
         self.nevraCache = {}
         self.labelNevraCache = {}
 
+    def invalidateSources(self, sources):
+        """
+        Forget the troves known to be built from the given sources, ie.
+        because the sources have just been built.
+        @param sources: source names and versions
+        @type sources: iterable of (srcName, srcVersionObj)
+        """
+
+        sources = set(sources)
+        for source in sources:
+            self.trovesBySourceCache.pop(source, None)
+
+        # Drop the sources from the source index, and forget that their
+        # binaries were indexed so that _indexLabels looks all of them up
+        # again rather than only the new ones.
+        for srcTrv in [ x for x in self.sourceBinaryIndex
+                        if x[:2] in sources ]:
+            binTrvs = self.sourceBinaryIndex.pop(srcTrv)
+            for known in self.binaryVersionCache.itervalues():
+                known.difference_update(binTrvs)
+
 
 class ConaryHelper(object):
     """
@@ -92,6 +128,15 @@ class ConaryHelper(object):
 
     _cache = ConaryHelperSharedCache()
 
+    # Maximum number of unindexed sources to look up one at a time with
+    # getTrovesBySource, the labels are indexed in bulk for larger requests.
+    _sourceIndexThreshold = 50
+
+    # Several source operations need to change the working directory of the
+    # process, hold this lock while doing so to allow helpers to be used from
+    # multiple threads.
+    _cwdLock = threading.RLock()
+
     def __init__(self, cfg, mirrorCfgFn=None):
         self._groupFlavorCount = len(cfg.groupFlavors)
 
@@ -138,6 +183,10 @@ class ConaryHelper(object):
         self._client = conaryclient.ConaryClient(self._ccfg)
         self._repos = self._client.getRepos()
 
+        # Repository clients for worker threads.
+        self._threadRepos = threading.local()
+        self._queryWorkers = cfg.repositoryQueryWorkers
+
         self._newPkgFactory = cfg.newPackageFactory
 
         self._checkoutCache = {}
@@ -147,6 +196,12 @@ class ConaryHelper(object):
 
         self._findTrovesCache = FindTrovesCache(self._repos)
 
+        # Persistent store of source checkouts that is shared between runs.
+        self._checkoutStore = None
+        if cfg.checkoutCacheDir:
+            self._checkoutStore = CheckoutStore(cfg.checkoutCacheDir,
+                                                maxSize=cfg.checkoutCacheSize)
+
     def clearCache(self):
         """
         Clear the trove query cache.
@@ -154,6 +209,16 @@ class ConaryHelper(object):
 
         self._cache.clear()
 
+    def invalidateSources(self, sources):
+        """
+        Forget the troves known to be built from the given sources, call
+        after the sources have been built.
+        @param sources: source names and versions
+        @type sources: iterable of (srcName, srcVersionObj)
+        """
+
+        self._cache.invalidateSources(sources)
+
     def getConaryConfig(self):
         """
         Get a conary config instance.
@@ -512,32 +577,8 @@ class ConaryHelper(object):
         # Needs to be a frozenset so that it is hashable.
         labels = frozenset(labels)
 
-        # FIXME: If this is ever used in a long running process the cache will
-        #        need to be refreshed and/or expired.
-
-        # Check the cache before going on.
-        if labels in self._cache.binaryVersionCache:
-            binTrvSpecs = self._cache.binaryVersionCache[labels]
-        else:
-            # get all binary trove specs for the specified labels
-            req = {None: dict([ (x, None) for x in labels ])}
-            binTrvMap = self._repos.getTroveVersionsByLabel(req)
-
-            # build a list of the binary troves on the labels
-            binTrvSpecs = set()
-            for n, vermap in binTrvMap.iteritems():
-                # filter out sources
-                if n.endswith(':source'):
-                    continue
-                for v, flvs in vermap.iteritems():
-                    for f in flvs:
-                        binTrvSpecs.add((n, v, f))
-
-            # Populate cache.
-            self._cache.binaryVersionCache[labels] = binTrvSpecs
-
         # get a map of source trove specs to binary trove specs
-        srcVerMap = self.getSourceVersions(binTrvSpecs)
+        srcVerMap = self._getSourceBinaryMap(srcTroveSpecs, labels)
 
         srcMap = {}
         for srcTrv in srcTroveSpecs:
@@ -576,6 +617,141 @@ class ConaryHelper(object):
 
         return srcMap
 
+    def _getSourceBinaryMap(self, srcTroveSpecs, labels):
+        """
+        Find the binaries built from the given sources that are on the given
+        labels. Sources that are not in the source index yet are looked up
+        with getTrovesBySource if there are only a few of them, otherwise
+        the labels are indexed in bulk.
+        @param srcTroveSpecs: list of source troves.
+        @type srcTroveSpecs: [(name, versionObj, None), ... ]
+        @param labels: labels to search
+        @type labels: frozenset(conary.versions.Label, ...)
+        @return {srcTrvSpec: set([binTrvSpec, binTrvSpec, ... ])}, sources
+                without binaries on the labels are omitted.
+        """
+
+        index = self._cache.sourceBinaryIndex
+
+        missing = set(x for x in srcTroveSpecs if x not in index)
+        if len(missing) > self._sourceIndexThreshold:
+            self._indexLabels(labels)
+        elif missing:
+            for srcTrv, binTrvs in self._getTrovesBySource(missing).iteritems():
+                if binTrvs:
+                    index.setdefault(srcTrv, set()).update(binTrvs)
+
+        srcVerMap = {}
+        for srcTrv in srcTroveSpecs:
+            binTrvs = set(x for x in index.get(srcTrv, ())
+                          if x[1].trailingLabel() in labels)
+            if binTrvs:
+                srcVerMap[srcTrv] = binTrvs
+        return srcVerMap
+
+    def _indexLabels(self, labels):
+        """
+        Add all binaries on the given labels to the source index. Only the
+        sources of binaries that were not seen the last time these labels
+        were indexed are looked up.
+        @param labels: labels to index
+        @type labels: frozenset(conary.versions.Label, ...)
+        """
+
+        # get all binary trove specs for the specified labels
+        req = {None: dict([ (x, None) for x in labels ])}
+        binTrvMap = self._repos.getTroveVersionsByLabel(req)
+
+        # build a list of the binary troves on the labels
+        binTrvSpecs = set()
+        for n, vermap in binTrvMap.iteritems():
+            # filter out sources
+            if n.endswith(':source'):
+                continue
+            for v, flvs in vermap.iteritems():
+                for f in flvs:
+                    binTrvSpecs.add((n, v, f))
+
+        known = self._cache.binaryVersionCache.setdefault(labels, set())
+        new = binTrvSpecs.difference(known)
+
+        log.info('indexing %s new binaries' % len(new))
+
+        index = self._cache.sourceBinaryIndex
+        for srcTrv, binTrvs in self.getSourceVersions(new).iteritems():
+            index.setdefault(srcTrv, set()).update(binTrvs)
+
+        known.update(new)
+
+    def _getTrovesBySource(self, srcTroveSpecs):
+        """
+        Find all binaries built from the given source versions.
+        @param srcTroveSpecs: list of source troves.
+        @type srcTroveSpecs: [(name, versionObj, None), ... ]
+        @return {srcTrvSpec: set([binTrvSpec, binTrvSpec, ... ])}
+        """
+
+        bySource = self._getTrovesBySources([ (n, v)
+                                              for n, v, f in srcTroveSpecs ])
+
+        siblingMap = {}
+        for srcName, srcVersion, srcFlavor in srcTroveSpecs:
+            siblings = bySource[(srcName, srcVersion)]
+            siblingMap[(srcName, srcVersion, srcFlavor)] = [ x for x in siblings
+                if not x[0].endswith(':source') ]
+
+        # Must lookup versions in the repository since getTrovesBySource
+        # does not include timestamps in the returned version objects.
+        req = set(itertools.chain(*siblingMap.itervalues()))
+        found = req and self._repos.findTroves(self._ccfg.buildLabel, req) or {}
+
+        ret = {}
+        for srcTrv, siblings in siblingMap.iteritems():
+            ret[srcTrv] = set(itertools.chain(*[ found[x] for x in siblings ]))
+        return ret
+
+    def _getThreadRepos(self):
+        """
+        Get a repository client for the current thread.
+        """
+
+        repos = getattr(self._threadRepos, 'repos', None)
+        if repos is None:
+            repos = conaryclient.ConaryClient(self._ccfg).getRepos()
+            self._threadRepos.repos = repos
+        return repos
+
+    def _getTrovesBySources(self, sources):
+        """
+        Find the troves built from each of the given sources. Uncached sources
+        are queried concurrently.
+        @param sources: list of source names and versions
+        @type sources: [(srcName, srcVersionObj), ... ]
+        @return {(srcName, srcVersionObj): [(n, v, f), ... ]}, the versions do
+                not include timestamps.
+        """
+
+        cache = self._cache.trovesBySourceCache
+
+        results = dict((x, cache[x]) for x in sources if x in cache)
+        uncached = sorted(set(x for x in sources if x not in cache))
+        if len(uncached) == 1:
+            results[uncached[0]] = \
+                self._repos.getTrovesBySource(*uncached[0])
+        elif uncached:
+            log.info('looking up troves built from %s sources' % len(uncached))
+
+            def lookup(source):
+                return self._getThreadRepos().getTrovesBySource(*source)
+
+            results.update(itertools.izip(uncached, util.threadedMap(lookup,
+                uncached, workers=self._queryWorkers)))
+
+        # Sources that have not been built yet are looked up again next time.
+        cache.update((x, results[x]) for x in uncached if results[x])
+
+        return dict((x, results[x]) for x in sources)
+
     def getSourceVersionMapFromBinaryVersion(self, (n, v, f), labels=None,
             latest=False, includeBuildLabel=False):
         """
@@ -884,6 +1060,76 @@ class ConaryHelper(object):
         assert version is not None
         return version
 
+    def checkoutMany(self, pkgnames):
+        """
+        Check out the latest versions of several sources in a single changeset
+        and add them to the checkout cache, so that later edits of these
+        packages do not need to go back to the repository. Packages that do not
+        yet exist are skipped and will be created when first edited.
+        @param pkgnames: list of package names
+        @type pkgnames: list(str, ...)
+        @return map of package name to checkout directory
+        @rtype dict(str=/path/to/checkout)
+        """
+
+        names = set(self._convSrcName(x) for x in pkgnames)
+        names = [ x for x in names if (x, None) not in self._checkoutCache ]
+
+        latest = self.getLatestSourceVersions(names)
+        req = [ (x, None, None) for x in sorted(names) if latest[x] ]
+
+        if not req:
+            return {}
+
+        log.info('checking out %s sources' % len(req))
+        coMap = self._multiCheckout(req)
+
+        dirMap = {}
+        for (n, v, f), recipeDir in coMap.iteritems():
+            pkgkey = (n, None)
+            self._checkoutCache[pkgkey] = recipeDir
+            self._checkoutCache[recipeDir] = pkgkey
+            dirMap[n] = recipeDir
+
+        return dirMap
+
+    def commitMany(self, pkgnames, commitMessage=''):
+        """
+        Commit the cached checkouts of several source components, looking up
+        all of the new versions with a single repository query.
+        @param pkgnames: list of package names
+        @type pkgnames: list(str, ...)
+        @param commitMessage: optional argument for setting the commit message
+                              to use when committing to the repository.
+        @type commitMessage: string
+        @return map of package name to the version of the source commit.
+        @rtype dict(str=conary.versions.Version)
+        """
+
+        names = [ self._convSrcName(x) for x in pkgnames ]
+
+        for pkgname in names:
+            pkgkey = (pkgname, None)
+            if pkgkey not in self._checkoutCache:
+                raise NoCheckoutFoundError(pkgname=pkgname)
+
+        log.info('committing %s sources' % len(names))
+
+        for pkgname in names:
+            # Setup flavor objects
+            use.setBuildFlagsFromFlavor(pkgname, self._ccfg.buildFlavor,
+                                        error=False)
+
+            # Commit to repository.
+            recipeDir = self._checkoutCache[(pkgname, None)]
+            self._commit(recipeDir, commitMessage)
+
+        # Get new versions of the source troves.
+        versions = self.getLatestSourceVersions(names)
+        assert None not in versions.values()
+
+        return dict((x, versions[self._convSrcName(x)]) for x in pkgnames)
+
     def _convSrcName(self, name):
         """
         Strip the :source off the end of a name if it is there.
@@ -966,6 +1212,7 @@ class ConaryHelper(object):
         log.info('creating new package %s' % pkgname)
 
         recipeDir = self._getRecipeDir(pkgname)
+        self._cwdLock.acquire()
         cwd = os.getcwd()
         try:
             os.chdir(recipeDir)
@@ -973,6 +1220,7 @@ class ConaryHelper(object):
                              factory=self._newPkgFactory)
         finally:
             os.chdir(cwd)
+            self._cwdLock.release()
 
         return util.join(recipeDir, pkgname)
 
@@ -987,6 +1235,7 @@ class ConaryHelper(object):
 
         log.info('committing %s' % os.path.basename(pkgDir))
 
+        self._cwdLock.acquire()
         cwd = os.getcwd()
         try:
             os.chdir(pkgDir)
@@ -997,6 +1246,7 @@ class ConaryHelper(object):
                 del self._checkoutCache[pkgDir]
         finally:
             os.chdir(cwd)
+            self._cwdLock.release()
             util.rmtree(pkgDir)
 
     @staticmethod
@@ -1011,12 +1261,14 @@ class ConaryHelper(object):
 
         log.info('adding file: %s' % fileName)
 
+        ConaryHelper._cwdLock.acquire()
         cwd = os.getcwd()
         try:
             os.chdir(pkgDir)
             checkin.addFiles([fileName, ], ignoreExisting=True, text=True)
         finally:
             os.chdir(cwd)
+            ConaryHelper._cwdLock.release()
 
     @staticmethod
     def _removeFile(pkgDir, fileName):
@@ -1030,12 +1282,14 @@ class ConaryHelper(object):
 
         log.info('removing file: %s' % fileName)
 
+        ConaryHelper._cwdLock.acquire()
         cwd = os.getcwd()
         try:
             os.chdir(pkgDir)
             checkin.removeFile(fileName)
         finally:
             os.chdir(cwd)
+            ConaryHelper._cwdLock.release()
 
     def _getVersionsByName(self, pkgname):
         """
@@ -1079,6 +1333,86 @@ class ConaryHelper(object):
 
         return None
 
+    def getLatestSourceVersions(self, pkgnames):
+        """
+        Finds the latest versions of several sources with one repository
+        query.
+        @param pkgnames: list of package names to look for
+        @type pkgnames: list(str, ...)
+        @return map of package name to the latest source version, or None if
+                no source was found.
+        @rtype dict(str=conary.versions.Version)
+        """
+
+        label = self._ccfg.buildLabel
+
+        req = dict(('%s:source' % self._convSrcName(x), {label: None})
+                   for x in pkgnames)
+        if not req:
+            return {}
+
+        trvMap = self._repos.getTroveLeavesByLabel(req)
+
+        results = {}
+        for pkgname in pkgnames:
+            versions = trvMap.get('%s:source' % self._convSrcName(pkgname),
+                                  {}).keys()
+
+            # FIXME: This is the same hack that getLatestSourceVersion uses to
+            #        work around shadows that overlap packages on the label.
+            if len(versions) > 1:
+                versions = [ x for x in versions if not x.isShadow() ]
+
+            assert len(versions) in (0, 1)
+
+            if versions:
+                results[pkgname] = versions[0]
+            else:
+                results[pkgname] = None
+
+        return results
+
+    def hasBinaryVersions(self, pkgnames, label=None):
+        """
+        Check if the latest source versions of a list of packages have been
+        built on a label. All packages are looked up with a single
+        repository query.
+        @param pkgnames: list of package names
+        @type pkgnames: list(str, ...)
+        @param label: label or branch to look on, defaults to the buildLabel.
+        @type label: conary.versions.Label
+        @return map of package name to True if there is a binary version built
+                from the latest source version.
+        @rtype dict(str=boolean)
+        """
+
+        if label is None:
+            label = self._ccfg.buildLabel
+        elif hasattr(label, 'label'):
+            label = label.label()
+
+        req = {}
+        for pkgname in pkgnames:
+            name = self._convSrcName(pkgname)
+            req['%s:source' % name] = {label: None}
+            req[name] = {label: None}
+
+        trvMap = self._repos.getTroveVersionsByLabel(req)
+
+        results = {}
+        for pkgname in pkgnames:
+            name = self._convSrcName(pkgname)
+            srcVersions = trvMap.get('%s:source' % name, {}).keys()
+            if not srcVersions:
+                results[pkgname] = False
+                continue
+
+            latest = max(srcVersions)
+            results[pkgname] = bool([ x for x in trvMap.get(name, {})
+                                      if x.getSourceVersion() == latest ])
+
+        return results
+
     def _getLatestTroves(self):
         """
         Get a dict of the latest troves on the buildLabel.
@@ -1425,6 +1759,28 @@ class ConaryHelper(object):
         # Get the list of results from the findTroves query.
         trvList = [ x for x in itertools.chain(*trvMap.itervalues()) ]
 
+        checkoutMap = {}
+
+        # Copy any sources that have already been checked out from the
+        # checkout store.
+        if self._checkoutStore:
+            missing = []
+            context = self._ccfg.context
+            for nvf in trvList:
+                targetDir = self._getRecipeDir(nvf[0])
+                if self._checkoutStore.get(nvf, targetDir, context=context):
+                    checkoutMap[reqMap[revTrvMap[nvf]]] = targetDir
+                else:
+                    util.rmtree(targetDir)
+                    missing.append(nvf)
+
+            log.info('found %s of %s sources in checkout store'
+                     % (len(trvList) - len(missing), len(trvList)))
+
+            trvList = missing
+            if not trvList:
+                return checkoutMap
+
         # Build a changeset request.
         csJob = [ (x[0], (None, None), (x[1], x[2]), True) for x in trvList ]
 
@@ -1439,7 +1795,6 @@ class ConaryHelper(object):
         checkin.verifyAbsoluteChangesetSignatures(cs, callback)
 
         pathMap = {}
-        checkoutMap = {}
         sourceStateMap = {}
         conaryStateTargets = {}
 
@@ -1475,6 +1830,14 @@ class ConaryHelper(object):
         for targetDir, conaryState in conaryStateTargets.iteritems():
             conaryState.write(targetDir + '/CONARY')
 
+        # Save new checkouts for later runs.
+        if self._checkoutStore:
+            for nvf in trvList:
+                self._checkoutStore.add(nvf,
+                    checkoutMap[reqMap[revTrvMap[nvf]]],
+                    context=self._ccfg.context)
+            self._checkoutStore.evict()
+
         return checkoutMap
 
     def cacheSources(self, label, latest=True):
@@ -1586,32 +1949,40 @@ class ConaryHelper(object):
 
         # Build set of troveSpecs to be removed.
         trvSet = set()
-        for trv in troves:
-            # Find all sibling packages.
-            if removeSiblings:
+
+        # Find all sibling packages.
+        if removeSiblings:
+            sources = set()
+            for trv in troves:
                 srcName = trv.troveInfo.sourceName()
                 if not srcName:
                     srcName = trv.getName()
                 srcVersion = trv.getVersion().getSourceVersion()
-                siblings = self._repos.getTrovesBySource(srcName, srcVersion)
+                sources.add((srcName, srcVersion))
 
-                # Must lookup versions in the repository since getTrovesBySource
-                # does not include timestamps in the returned version objects
-                # and creating a trove requires versions with timestamps.
+            siblings = set(itertools.chain(
+                *self._getTrovesBySources(sources).itervalues()))
+
+            # Must lookup versions in the repository since getTrovesBySource
+            # does not include timestamps in the returned version objects
+            # and creating a trove requires versions with timestamps.
+            if siblings:
                 trvSet.update(set([ x for x in
                     itertools.chain(*self._repos.findTroves(
                         self._ccfg.buildLabel, siblings).values()) ]))
 
-                # Add sources to remmove.
-                if removeSources:
-                    # As mentioned above, must lookup version with timestamp.
-                    srcLst = self._repos.findTrove(self._ccfg.buildLabel,
-                        (srcName, srcVersion, None))
+            # Add sources to remmove.
+            if removeSources:
+                # As mentioned above, must lookup version with timestamp.
+                srcMap = self._repos.findTroves(self._ccfg.buildLabel,
+                    [ (n, v, None) for n, v in sources ])
 
+                for srcLst in srcMap.itervalues():
                     assert len(set(srcLst)) == 1
                     for n, v, f in srcLst:
                         trvSet.add((n, v, f))
 
+        for trv in troves:
             # Don't recurse group contents.
             if trv.getName().startswith('group-'):
                 continue
@@ -1711,16 +2082,21 @@ class ConaryHelper(object):
 
             sources.setdefault((srcName, srcVersion), set()).add((n, v, f))
 
+        # Look up the siblings of all sources at once.
+        bySource = self._getTrovesBySources(sources.keys())
+
         # Map siblings back to nvfs.
         siblingMap = {}
-        for (srcName, srcVersion), trvSpecs in sources.iteritems():
-            siblings = self._repos.getTrovesBySource(srcName, srcVersion)
+        for source, trvSpecs in sources.iteritems():
+            siblings = bySource[source]
 
             for trvSpec in trvSpecs:
                 if not allVersions:
-                    siblings = [ x for x in siblings if x[1] == trvSpec[1] ]
+                    trvSiblings = [ x for x in siblings if x[1] == trvSpec[1] ]
+                else:
+                    trvSiblings = siblings
 
-                siblingMap.setdefault(trvSpec, set()).update(set(siblings))
+                siblingMap.setdefault(trvSpec, set()).update(set(trvSiblings))
 
         if isinstance(nvf, list):
             return siblingMap
@@ -558,6 +558,16 @@ class UpdateBotConfigSection(cfg.ConfigSection):
     emailBcc            = (CfgList(CfgString), [])
     smtpServer          = CfgString
 
+    # Number of smtp sessions to send advisories with at once.
+    smtpConnections     = (CfgInt, 1)
+
+    # Maximum number of messages to send per minute, 0 for no limit.
+    smtpRateLimit       = (CfgInt, 0)
+
+    # Directory to record sent advisories in so that they are not sent again
+    # if the bot is restarted. Disabled if unset.
+    emailOutboxDir      = CfgString
+
     # Jira Info
     jiraUser            = CfgString
     jiraPassword        = CfgString
@@ -746,6 +756,18 @@ class UpdateBotConfigSection(cfg.ConfigSection):
     # uri to a pkgcache server
     pkgcacheUri = CfgString
 
+    # Number of packages to upload to the pkgcache server in each
+    # transaction. Each batch is committed on its own, so an interrupted
+    # upload only has to redo the batches that were not committed.
+    pkgcacheBatchSize = (CfgInt, 100)
+
+    # Number of batches to upload to the pkgcache server at the same time.
+    pkgcacheUploadThreads = (CfgInt, 4)
+
+    # Only upload packages whose hash is not already in the pkgcache
+    # repository. Disable to upload every package again.
+    pkgcacheOnlyChanged = (CfgBool, True)
+
     # Set the number of troves to send to rmake at the same time in current mode
     # It was hardwired to 1 now it is configurable. Be careful.
     # If you don't know then don't change it
@@ -771,6 +793,19 @@ class UpdateBotConfigSection(cfg.ConfigSection):
     # user config for artifactory api
     artifactoryUser = CfgUserInfo
 
+    # number of concurrent requests to make to the artifactory api
+    artifactoryWorkers = (CfgInt, 8)
+
+    # maximum number of concurrent requests to make to a single host
+    artifactoryHostConnections = (CfgInt, 4)
+
+    # directory to cache maven lookups in between runs, disabled if unset
+    pomCacheDir = CfgString
+
+    # seconds to cache lookups of snapshots, version ranges and missing
+    # artifacts for
+    pomCacheTTL = (CfgInt, 3600)
+
     # allow rmake to commit outdated sources
     commitOutdatedSources = (CfgBool, False)
 
@@ -780,6 +815,45 @@ class UpdateBotConfigSection(cfg.ConfigSection):
     # pom relocation
     relocatePoms = (CfgRelocatePomList, [])
 
+    # Directory to keep source checkouts in between runs, may be shared
+    # between several bot processes. Checkouts are not persisted if unset.
+    checkoutCacheDir = CfgString
+
+    # Maximum size of the checkout cache in megabytes, 0 for unlimited.
+    checkoutCacheSize = (CfgInt, 1024)
+
+    # Directory to cache repository metadata files that are listed with a
+    # checksum in, such as the patch files of SuSE repositories. Disabled if
+    # unset.
+    repositoryCacheDir = CfgString
+
+    # Number of patch files to fetch and parse at once when loading
+    # advisories.
+    patchLoadWorkers = (CfgInt, 8)
+
+    # Number of concurrent repository queries to make when looking up the
+    # troves built from many sources.
+    repositoryQueryWorkers = (CfgInt, 4)
+
+    # Path to write a json report of time and memory used while loading
+    # package sources and running the bot, disabled if unset. May also be
+    # set with the UPDATEBOT_PROFILE environment variable.
+    profileReport = CfgString
+
+    # Number of directory listings to fetch at once when indexing http
+    # mirrors of rpm trees.
+    urlWalkerWorkers = (CfgInt, 4)
+
+    # Directory to cache directory listings of http mirrors in, listings are
+    # revalidated with If-Modified-Since. Disabled if unset.
+    urlWalkerCacheDir = CfgString
+
+    # Path to a sqlite database that the package source is exported to for
+    # queries by name, NEVRA, location and dependencies. The database is
+    # reused between runs until the repository metadata changes. An in
+    # memory database is used if unset.
+    packageDatabase = CfgString
+
 
 class UpdateBotConfig(cfg.SectionedConfigFile):
     """
@@ -30,6 +30,7 @@ from conary.versions import ThawVersion
 from rpmutils import NEVRA
 
 from updatebot.lib import util
+from updatebot.lib import profiling
 from updatebot import groupmgr
 from updatebot.bot import Bot as BotSuperClass
 
@@ -163,6 +164,7 @@ class Bot(BotSuperClass):
             log.info('modifying group model')
             group.modifyContents(additions=addPackages, removals=removePackages)
 
+    @profiling.profiled('current.create')
     def create(self, *args, **kwargs):
         """
         Handle initial import case.
@@ -595,6 +597,7 @@ class Bot(BotSuperClass):
 
         assert False, 'How did we get here?'
 
+    @profiling.profiled('current.update')
     def update(self, *args, **kwargs):
         """
         Handle update case.
@@ -766,7 +769,7 @@ class Bot(BotSuperClass):
         # Find the latest nevras.
         actualLatest = {}
         for name, vercmpd in names.iteritems():
-            lt = sorted(vercmpd.keys(), cmp=util.packagevercmp)[-1]
+            lt = sorted(vercmpd.keys(), key=util.packageVersionKey)[-1]
             for nevra, nvfs in vercmpd[lt].iteritems():
                 for nvf in nvfs:
                     actualLatest[nvf] = nevra
@@ -874,7 +877,7 @@ class Bot(BotSuperClass):
                 for bin, src in common.iteritems():
                     nvmap.setdefault(nevraMap[bin], set()).add(src)
 
-                lts = sorted(nvmap[sorted(nvmap, cmp=util.packagevercmp)[-1]])[-1]
+                lts = sorted(nvmap[sorted(nvmap, key=util.packageVersionKey)[-1]])[-1]
 
             for bin in fullSrcs.get(lts):
                 toAdd.setdefault((bin[0], bin[1]), set()).add(bin[2])
@@ -18,7 +18,6 @@ Module for ordering errata.
 
 import datetime
 import os
-import copy
 import time
 import logging
 from dateutil import parser as dateutil_parser
@@ -219,8 +218,10 @@ class ErrataFilter(object):
         def rhnUrls(errataSet):
             return ' '.join(rhnUrl(x) for x in errataSet)
 
-        # duplicate updater and pkgsource so as to not change state.
-        pkgSource = copy.copy(self._pkgSource)
+        # duplicate updater and use a view of the pkgsource so as to not
+        # change state.
+        snapshot = self._pkgSource.freeze()
+        pkgSource = snapshot.view()
         updater = update.Updater(self._cfg, self._ui, pkgSource)
         updater._conaryhelper = _ConaryHelperShim(self._cfg)
 
@@ -569,6 +570,9 @@ class ErrataFilter(object):
         # Clear the cache since it would be dirty at this point.
         updater._conaryhelper.clearCache()
 
+        # The snapshot is not needed once the order has been played through.
+        snapshot.release()
+
         # Fail if there are any errors.
         assert not errors
 
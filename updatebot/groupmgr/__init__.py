@@ -18,3 +18,4 @@
 from updatebot.groupmgr.manager import GroupManager
 from updatebot.groupmgr.single import SingleGroupManager
 from updatebot.groupmgr.single import SingleGroupManagerSet
+from updatebot.groupmgr.single import ErrataGroupManagerSet
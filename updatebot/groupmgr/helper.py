@@ -22,6 +22,7 @@ Conary interface for group content management.
 import os
 import time
 import logging
+import threading
 
 from updatebot.lib import util
 from updatebot.conaryhelper import ConaryHelper
@@ -49,6 +50,16 @@ class GroupHelper(ConaryHelper):
     Modified conary helper to deal with managing group sources.
     """
 
+    # Parsed group models, keyed by source name and version. Committed
+    # sources never change, so there is no need to parse them more than once.
+    # (pkgName, version): {groupName: GroupContentsModel}
+    _modelCache = {}
+    _modelCacheOrder = []
+    _modelCacheSize = 32
+    # Models are loaded from worker threads, the cache is shared by all
+    # helpers.
+    _modelCacheLock = threading.RLock()
+
     def __init__(self, cfg):
         ConaryHelper.__init__(self, cfg)
         self._configDir = cfg.configPath
@@ -86,6 +97,17 @@ class GroupHelper(ConaryHelper):
         repository.
         """
 
+        key = (self._convSrcName(pkgName), version)
+        if version is not None:
+            self._modelCacheLock.acquire()
+            try:
+                cached = self._modelCache.get(key)
+            finally:
+                self._modelCacheLock.release()
+            if cached is not None:
+                log.info('loading cached model for %s' % pkgName)
+                return dict((x, y.copy()) for x, y in cached.iteritems())
+
         log.info('loading model for %s' % pkgName)
         recipeDir = self._edit(pkgName, version=version)
         groupFileName = util.join(recipeDir, 'groups.xml')
@@ -102,14 +124,48 @@ class GroupHelper(ConaryHelper):
                 contentsModel.fileName = groupObj.filename
                 groups[groupObj.name] = contentsModel
 
+        if version is not None:
+            self._cacheModel(key, groups)
+            groups = dict((x, y.copy()) for x, y in groups.iteritems())
+
         return groups
 
+    def _cacheModel(self, key, groups):
+        """
+        Store a parsed model in the model cache, expiring the least recently
+        added model if the cache is full.
+        """
+
+        self._modelCacheLock.acquire()
+        try:
+            if key in self._modelCache:
+                self._modelCacheOrder.remove(key)
+            elif len(self._modelCacheOrder) >= self._modelCacheSize:
+                self._modelCache.pop(self._modelCacheOrder.pop(0))
+
+            self._modelCache[key] = groups
+            self._modelCacheOrder.append(key)
+        finally:
+            self._modelCacheLock.release()
+
     def setModel(self, pkgName, groups, version=None):
         """
         Freeze group model and save to the repository.
         """
 
         log.info('saving model for %s' % pkgName)
+
+        # The checkout for this version is about to be modified, make sure the
+        # cached copy is not handed out in place of the modified model.
+        key = (self._convSrcName(pkgName), version)
+        self._modelCacheLock.acquire()
+        try:
+            if key in self._modelCache:
+                self._modelCache.pop(key)
+                self._modelCacheOrder.remove(key)
+        finally:
+            self._modelCacheLock.release()
+
         recipeDir = self._edit(pkgName, version=version)
         groupFileName = util.join(recipeDir, 'groups.xml')
 
@@ -59,13 +59,17 @@ class GroupManager(object):
                    added to the x86 group and all x86_64 packages will be added
                    to the x86_64 group.
     @type useMap: dict
+    @param builder: optional argument, builder instance to use for building
+                    groups. This allows several managers to share one build
+                    dispatcher. If not specified a new builder is created.
+    @type builder: updatebot.build.Builder
     """
 
     _helperClass = GroupHelper
     _sanityCheckerClass = GroupSanityChecker
 
     def __init__(self, cfg, ui, parentGroup=False, targetGroup=False,
-        useMap=None):
+        useMap=None, builder=None):
 
         self._cfg = cfg
         self._ui = ui
@@ -76,8 +80,9 @@ class GroupManager(object):
             self._useMap = useMap
 
         self._helper = self._helperClass(self._cfg)
-        self._builder = Builder(self._cfg, self._ui,
-            rmakeCfgFn='rmakerc-groups')
+        if builder is None:
+            builder = Builder(self._cfg, self._ui, rmakeCfgFn='rmakerc-groups')
+        self._builder = builder
         self._sanity = self._sanityCheckerClass(self._cfg, self._helper)
 
         assert not (parentGroup and targetGroup)
@@ -19,6 +19,9 @@
 Model representation of groups.
 """
 
+import copy
+
+from updatebot.lib import xstream
 from updatebot.lib.xobjects import XGroup
 from updatebot.lib.xobjects import XGroupDoc
 from updatebot.lib.xobjects import XGroupList
@@ -68,9 +71,8 @@ class AbstractModel(object):
         Thaw the model from xml.
         """
 
-        model = cls.docClass.fromfile(xmlfn)
         obj = args and cls(*args) or cls()
-        for item in model.data.items:
+        for item in xstream.fromfile(cls.docClass, xmlfn):
             obj._addItem(item)
         return obj
 
@@ -82,12 +84,21 @@ class AbstractModel(object):
         def _srtByKey(a, b):
             return cmp(a.key, b.key)
 
-        model = self.dataClass()
-        model.items = sorted(self._data.values(), cmp=_srtByKey)
+        items = sorted(self._data.values(), cmp=_srtByKey)
+        xstream.tofile(self.docClass, items, toFile)
 
-        doc = self.docClass()
-        doc.data = model
-        doc.tofile(toFile)
+    def copy(self):
+        """
+        Create a copy of this model that does not share any items with the
+        original.
+        """
+
+        obj = copy.copy(self)
+        obj._data = {}
+        obj._nameMap = {}
+        for item in self._data.itervalues():
+            obj._addItem(copy.copy(item))
+        return obj
 
     def iteritems(self):
         """
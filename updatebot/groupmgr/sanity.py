@@ -41,6 +41,17 @@ class GroupSanityChecker(object):
         self._cfg = cfg
         self._helper = helper
 
+        # Cache of query results, keyed by the set of trove specs that were
+        # queried for. Since the sanity checks are run over the same group
+        # contents several times before a commit succeeds, results are reused
+        # for as long as the group contents do not change.
+        # frozenset(troves): (foundTroves, sourceMap)
+        self._groupTroveCache = {}
+        # frozenset(troves): {name: [nvf, ...]}
+        self._latestTroveCache = {}
+        # frozenset(labels): set(nvf, ...)
+        self._oldVersionCache = {}
+
     def check(self, groups, errataState):
         """
         Validate the contents of the package group to ensure sanity:
@@ -79,10 +90,15 @@ class GroupSanityChecker(object):
         if errors:
             raise GroupValidationFailedError(errors=errors)
 
-    def _checkNameVersionConflict(self, group):
+    def _getGroupTroves(self, group):
         """
-        Check for packages taht have the same source name, but different
-        versions.
+        Find all troves that match the exact versions listed in the group model
+        along with a mapping of source trove specs to binary trove specs. This
+        information is shared between checks and reused until the contents of
+        the group change.
+        @param group: group contents model
+        @type group: updatebot.groupmgr.model.GroupContentsModel
+        @return (set of binary trove specs, {srcTrvSpec: [binTrvSpec, ...]})
         """
 
         # get names and versions
@@ -106,6 +122,10 @@ class GroupSanityChecker(object):
 
             troves.add((name, version, flavor))
 
+        key = frozenset(troves)
+        if key in self._groupTroveCache:
+            return self._groupTroveCache[key]
+
         # Get flavors and such.
         foundTroves = set([ x for x in
             itertools.chain(*self._helper.findTroves(troves,
@@ -114,6 +134,46 @@ class GroupSanityChecker(object):
         # get sources for each name version pair
         sources = self._helper.getSourceVersions(foundTroves)
 
+        self._groupTroveCache[key] = (foundTroves, sources)
+        return foundTroves, sources
+
+    def _getOldVersions(self, labels):
+        """
+        Find all binary versions that are allowed to be in the group because of
+        useOldVersion exceptions. All exceptions are looked up in one batch.
+        @param labels: set of labels to search
+        @type labels: set(conary.versions.Label, ...)
+        @return set of binary trove specs
+        """
+
+        key = frozenset(labels)
+        if key in self._oldVersionCache:
+            return self._oldVersionCache[key]
+
+        nvfs = set(itertools.chain(*self._cfg.useOldVersion.itervalues()))
+
+        oldVersions = set()
+        if nvfs:
+            # Allow missing specs so that one stale exception does not hide
+            # all of the others.
+            trvs = set(itertools.chain(*self._helper.findTroves(nvfs,
+                labels=labels, allowMissing=True).itervalues()))
+            srcSpecs = self._helper.getSourceVersions(trvs).keys()
+            srcMap = self._helper.getBinaryVersions(srcSpecs,
+                labels=list(labels), latest=False)
+            oldVersions.update(itertools.chain(*srcMap.itervalues()))
+
+        self._oldVersionCache[key] = oldVersions
+        return oldVersions
+
+    def _checkNameVersionConflict(self, group):
+        """
+        Check for packages taht have the same source name, but different
+        versions.
+        """
+
+        foundTroves, sources = self._getGroupTroves(group)
+
         seen = {}
         for (n, v, f), pkgSet in sources.iteritems():
             binVer = list(pkgSet)[0][1]
@@ -169,8 +229,11 @@ class GroupSanityChecker(object):
             troves.add((name, version, flavor))
 
         # Get flavors and such.
-        foundTroves = dict([ (x[0], y) for x, y in
-            self._helper.findTroves(troves, labels=labels).iteritems() ])
+        key = frozenset(troves)
+        if key not in self._latestTroveCache:
+            self._latestTroveCache[key] = dict([ (x[0], y) for x, y in
+                self._helper.findTroves(troves, labels=labels).iteritems() ])
+        foundTroves = self._latestTroveCache[key]
 
         pkgs = {}
         for pkgKey, pkgData in group.iteritems():
@@ -188,16 +251,11 @@ class GroupSanityChecker(object):
 
         # Get all old versions so that we can make sure any version conflicts
         # were introduced by old version handling.
-        oldVersions = set()
         if self._cfg.platformSearchPath:
             qlabels = set(self._cfg.platformSearchPath) | labels
         else:
             qlabels = labels
-        for nvfLst in self._cfg.useOldVersion.itervalues():
-            for nvf in nvfLst:
-                srcMap = self._helper.getSourceVersionMapFromBinaryVersion(nvf,
-                        labels=qlabels, latest=False)
-                oldVersions |= set(itertools.chain(*srcMap.itervalues()))
+        oldVersions = self._getOldVersions(qlabels)
 
         errors = {}
         for name, found in foundTroves.iteritems():
@@ -261,28 +319,7 @@ class GroupSanityChecker(object):
         removeSource = [ x[0] for x in
                          self._cfg.removeSource.get(updateId, []) ]
 
-        # get names and versions
-        troves = set()
-        labels = set()
-        for pkgKey, pkgData in group.iteritems():
-            name = str(pkgData.name)
-
-            version = None
-            if pkgData.version:
-                versionObj = versions.ThawVersion(pkgData.version)
-                labels.add(versionObj.branch().label())
-                version = str(versionObj.asString())
-
-            flavor = None
-            troves.add((name, version, flavor))
-
-        # Get flavors and such.
-        foundTroves = set([ x for x in
-            itertools.chain(*self._helper.findTroves(troves,
-                                                labels=labels).itervalues()) ])
-
-        # get sources for each name version pair
-        sources = self._helper.getSourceVersions(foundTroves)
+        foundTroves, sources = self._getGroupTroves(group)
 
         # collapse to sourceName: [ binNames, ] dictionary
         sourceNameMap = dict([ (x[0].split(':')[0], [ z[0] for z in y ])
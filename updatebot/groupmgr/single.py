@@ -19,9 +19,17 @@
 Module for managing groups that contain only packages with no subgroups.
 """
 
+import time
+import logging
+
+from updatebot.build import Builder
 from updatebot.groupmgr.helper import GroupHelper
 from updatebot.groupmgr.manager import GroupManager
 
+from updatebot.errors import JobsFailedError
+
+log = logging.getLogger('updatebot.groupmgr')
+
 class SingleGroupHelper(GroupHelper):
     """
     Group helper for managing groups with only packages and no other groups.
@@ -96,3 +104,81 @@ class SingleGroupManagerSet(object):
         """
 
         return bool(self._mgrs)
+
+
+class ErrataGroupManagerSet(SingleGroupManagerSet):
+    """
+    Class for working with a set of per advisory groups. All managers in the
+    set share one builder so that group cooks are fed to a single build
+    dispatcher.
+    """
+
+    def __init__(self, cfg, ui, builder=None):
+        SingleGroupManagerSet.__init__(self, cfg, ui)
+
+        if builder is None:
+            builder = Builder(self._cfg, self._ui, rmakeCfgFn='rmakerc-groups')
+        self._builder = builder
+
+        self._helper = SingleGroupHelper(self._cfg)
+
+    def newGroup(self, name):
+        """
+        Create a new group manager instance with the provided name.
+        """
+
+        assert name not in self._mgrs
+        mgr = self._managerClass(name, self._cfg, self._ui,
+            builder=self._builder)
+        self._mgrs[name] = mgr
+        return mgr
+
+    def hasBinaryVersions(self, names):
+        """
+        Check which of the named groups already have a binary version of their
+        latest source on the target label, using a single repository query.
+        Groups that have been built but not promoted are not included.
+        @param names: list of group names, without the group- prefix.
+        @type names: list(str, ...)
+        @return map of group name to True if the group has been built.
+        @rtype dict(str=boolean)
+        """
+
+        srcNames = dict(('group-%s:source' % x, x) for x in names)
+        built = self._helper.hasBinaryVersions(srcNames.keys(),
+                                               label=self._cfg.targetLabel)
+        return dict((srcNames[x], y) for x, y in built.iteritems())
+
+    def buildmany(self):
+        """
+        Build all groups in the set, submitting all of them to the shared
+        build dispatcher before waiting for any of them to complete. Raises
+        JobsFailedError naming the failed groups if any group fails to build
+        or commit.
+        """
+
+        # Make sure there are groups defined
+        assert self._mgrs
+
+        results = []
+        for mgr in self._mgrs.itervalues():
+            results.append(mgr.buildGroup(mgr.latest, multiBuild=True))
+
+        # A failed build or commit stops the dispatcher, so stop waiting as
+        # soon as any group has failed.
+        while [ x for x in results if not x.isDone ]:
+            failed = [ x for x in results if x.error is not None ]
+            if failed:
+                raise JobsFailedError(
+                    jobIds=sorted([ x.jobId[0] for x in failed ]),
+                    why='; '.join([ '%s: %s' % (x.jobId[0], x.error)
+                                    for x in failed ]))
+            time.sleep(3)
+
+        pkgMap = {}
+        for res in results:
+            pkgMap.update(res.results)
+
+        log.info('built %s groups' % len(pkgMap))
+
+        return pkgMap
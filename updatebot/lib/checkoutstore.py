@@ -0,0 +1,231 @@
+#
+# Copyright (c) SAS Institute, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""
+Persistent store of source checkouts.
+
+Committed source troves never change, so a checkout of a given source version
+can be reused by any later run. Checkouts are stored in directories named by
+a digest of the source name, version and checkout context. Entries are
+written to a temporary directory and renamed into place, so readers never see
+partial entries. A lock file is held shared while reading or adding entries
+and exclusive while evicting, which allows several processes to share one
+store.
+"""
+
+import os
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+
+from updatebot.lib import util
+
+log = logging.getLogger('updatebot.lib.checkoutstore')
+
+class CheckoutStore(object):
+    """
+    Content addressed store of source checkouts with least recently used
+    eviction.
+    @param path: directory to store checkouts in.
+    @type path: str
+    @param maxSize: maximum size of the store in megabytes, 0 for unlimited.
+    @type maxSize: int
+    """
+
+    _lockFileName = '.lock'
+
+    def __init__(self, path, maxSize=0):
+        self._path = path
+        self._maxSize = maxSize * 1024 * 1024
+
+        if not os.path.exists(self._path):
+            try:
+                os.makedirs(self._path)
+            except OSError:
+                # Another process may have created the store.
+                if not os.path.isdir(self._path):
+                    raise
+
+        self._added = 0
+
+    @staticmethod
+    def _getKey(nvf, context=None):
+        """
+        Get the store key for a source trove.
+        """
+
+        n, v, f = nvf
+        if not n.endswith(':source'):
+            n = '%s:source' % n
+        key = '%s=%s' % (n, v.freeze())
+        if context:
+            key = '%s{%s}' % (key, context)
+        return hashlib.sha1(key).hexdigest()
+
+    def _lock(self, mode):
+        """
+        Take the store lock, returns the lock file object.
+        """
+
+        fh = open(util.join(self._path, self._lockFileName), 'a')
+        fcntl.flock(fh.fileno(), mode)
+        return fh
+
+    @staticmethod
+    def _unlock(fh):
+        """
+        Release the store lock.
+        """
+
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+        fh.close()
+
+    def has(self, nvf, context=None):
+        """
+        Check if a checkout of a source trove is stored.
+        @param nvf: source trove spec
+        @type nvf: tuple(str, conary.versions.Version, None)
+        @param context: conary context the checkout was made in.
+        @type context: str
+        @return boolean
+        """
+
+        return os.path.isdir(util.join(self._path,
+                                       self._getKey(nvf, context=context)))
+
+    def get(self, nvf, targetDir, context=None):
+        """
+        Copy a stored checkout into targetDir. The store entry is copied
+        rather than linked since checkouts are modified after being retrieved.
+        @param nvf: source trove spec
+        @type nvf: tuple(str, conary.versions.Version, None)
+        @param targetDir: existing directory to copy the checkout into.
+        @type targetDir: str
+        @param context: conary context the checkout was made in.
+        @type context: str
+        @return True if the checkout was found, otherwise False.
+        @rtype boolean
+        """
+
+        entry = util.join(self._path, self._getKey(nvf, context=context))
+
+        lock = self._lock(fcntl.LOCK_SH)
+        try:
+            if not os.path.isdir(entry):
+                return False
+
+            for name in os.listdir(entry):
+                src = util.join(entry, name)
+                dest = util.join(targetDir, name)
+                if os.path.isdir(src) and not os.path.islink(src):
+                    shutil.copytree(src, dest, symlinks=True)
+                else:
+                    shutil.copy2(src, dest)
+
+            # Mark as recently used.
+            os.utime(entry, None)
+        finally:
+            self._unlock(lock)
+
+        return True
+
+    def add(self, nvf, srcDir, context=None):
+        """
+        Add a copy of a checkout to the store.
+        @param nvf: source trove spec
+        @type nvf: tuple(str, conary.versions.Version, None)
+        @param srcDir: directory containing the checkout.
+        @type srcDir: str
+        @param context: conary context the checkout was made in.
+        @type context: str
+        """
+
+        entry = util.join(self._path, self._getKey(nvf, context=context))
+        if os.path.isdir(entry):
+            return
+
+        lock = self._lock(fcntl.LOCK_SH)
+        try:
+            tmpDir = tempfile.mkdtemp(dir=self._path, prefix='.tmp-')
+            tmpEntry = util.join(tmpDir, 'entry')
+            shutil.copytree(srcDir, tmpEntry, symlinks=True)
+
+            try:
+                os.rename(tmpEntry, entry)
+                self._added += 1
+            except OSError:
+                # Another process stored the same checkout first.
+                pass
+
+            util.rmtree(tmpDir)
+        finally:
+            self._unlock(lock)
+
+    @staticmethod
+    def _getSize(path):
+        """
+        Get the total size of all files under path.
+        """
+
+        size = 0
+        for root, dirs, files in os.walk(path):
+            for name in files:
+                size += os.lstat(os.path.join(root, name)).st_size
+        return size
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the store fits in the
+        configured size.
+        """
+
+        if not self._maxSize:
+            return
+
+        lock = self._lock(fcntl.LOCK_EX)
+        try:
+            entries = []
+            total = 0
+            for name in os.listdir(self._path):
+                path = util.join(self._path, name)
+                if name.startswith('.'):
+                    # Clean up after processes that did not finish adding
+                    # entries.
+                    if (os.path.isdir(path) and
+                        os.stat(path).st_mtime < time.time() - 3600):
+                        util.rmtree(path)
+                    continue
+
+                size = self._getSize(path)
+                total += size
+                entries.append((os.stat(path).st_mtime, size, path))
+
+            entries.sort()
+            removed = 0
+            while entries and total > self._maxSize:
+                mtime, size, path = entries.pop(0)
+                util.rmtree(path)
+                total -= size
+                removed += 1
+
+            if removed:
+                log.info('removed %s entries from checkout store' % removed)
+        finally:
+            self._unlock(lock)
@@ -0,0 +1,327 @@
+#
+# Copyright (c) SAS Institute, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Module for delivering mail over reused smtp sessions.
+
+Messages are delivered by a configurable number of worker threads, each
+keeping a single smtp session open for all of the messages it sends, at no
+more than a configured rate. Messages may be recorded in a durable outbox so
+that messages that were already delivered are not sent again if a run is
+restarted.
+"""
+
+import os
+import sys
+import time
+import socket
+import hashlib
+import smtplib
+import logging
+import tempfile
+import threading
+
+from updatebot.lib import util
+
+log = logging.getLogger('updatebot.lib.mailer')
+
+
+class Outbox(object):
+    """
+    Directory of messages that are waiting to be sent or have been sent,
+    keyed by a caller supplied message key.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._pending = os.path.join(path, 'pending')
+        self._sent = os.path.join(path, 'sent')
+
+        for path in (self._pending, self._sent):
+            if not os.path.exists(path):
+                try:
+                    os.makedirs(path)
+                except OSError:
+                    if not os.path.isdir(path):
+                        raise
+
+    @staticmethod
+    def _getName(key):
+        return hashlib.sha1(key).hexdigest()
+
+    def _write(self, dirname, key, data):
+        fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+        try:
+            fh = os.fdopen(fd, 'w')
+            try:
+                fh.write(data)
+                fh.flush()
+                os.fsync(fh.fileno())
+            finally:
+                fh.close()
+            os.rename(tmp, os.path.join(dirname, self._getName(key)))
+        except:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def isSent(self, key):
+        """
+        Check if a message has already been sent.
+        @param key: message key
+        @type key: str
+        @return boolean
+        """
+
+        return os.path.exists(os.path.join(self._sent, self._getName(key)))
+
+    def add(self, key, message):
+        """
+        Record a message as waiting to be sent.
+        @param key: message key
+        @type key: str
+        @param message: message text
+        @type message: str
+        """
+
+        self._write(self._pending, key, message)
+
+    def markSent(self, key):
+        """
+        Record a message as sent.
+        @param key: message key
+        @type key: str
+        """
+
+        self._write(self._sent, key, '%s\n%s\n' % (time.time(), key))
+
+        pending = os.path.join(self._pending, self._getName(key))
+        if os.path.exists(pending):
+            os.unlink(pending)
+
+
+class RateLimiter(object):
+    """
+    Limit the rate of an operation shared between threads.
+    """
+
+    def __init__(self, perMinute):
+        self._interval = perMinute and 60.0 / perMinute or 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        Block until the operation may be done again.
+        """
+
+        if not self._interval:
+            return
+
+        with self._lock:
+            now = time.time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self._interval
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SmtpSession(object):
+    """
+    Smtp connection that is opened when first used and reopened if the
+    server drops it.
+    """
+
+    def __init__(self, server):
+        self._server = server
+        self._smtp = None
+
+    def _connect(self):
+        log.debug('connecting to %s' % self._server)
+        self._smtp = smtplib.SMTP(self._server)
+
+        rootLogger = logging.getLogger('')
+        if rootLogger.level == logging.DEBUG:
+            self._smtp.set_debuglevel(1)
+
+    def sendmail(self, fromAddr, toAddrs, message):
+        """
+        Send a message, reconnecting once if the connection was lost.
+        @return dictionary of refused recipients, as smtplib.SMTP.sendmail.
+        """
+
+        for attempt in (0, 1):
+            if self._smtp is None:
+                self._connect()
+            try:
+                return self._smtp.sendmail(fromAddr, toAddrs, message)
+            except (smtplib.SMTPServerDisconnected, socket.error):
+                self._smtp = None
+                if attempt:
+                    raise
+                log.info('lost connection to %s, reconnecting' % self._server)
+
+    def close(self):
+        """
+        Close the connection if it is open.
+        """
+
+        if self._smtp is None:
+            return
+
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, socket.error):
+            self._smtp.close()
+        self._smtp = None
+
+
+class Message(object):
+    """
+    Message to be delivered.
+    """
+
+    __slots__ = ('key', 'fromAddr', 'toAddrs', 'text', )
+
+    def __init__(self, key, fromAddr, toAddrs, text):
+        self.key = key
+        self.fromAddr = fromAddr
+        self.toAddrs = toAddrs
+        self.text = text
+
+    def __str__(self):
+        return self.key
+
+
+class Mailer(object):
+    """
+    Deliver messages over reused smtp sessions.
+    """
+
+    def __init__(self, server, connections=1, rateLimit=0, outboxDir=None):
+        """
+        @param server: smtp server, host[:port]
+        @type server: str
+        @param connections: number of smtp sessions to send with at once
+        @type connections: int
+        @param rateLimit: maximum messages to send per minute, 0 for no limit
+        @type rateLimit: int
+        @param outboxDir: directory to record sent messages in, messages are
+                          not recorded if None
+        @type outboxDir: str
+        """
+
+        self._server = server
+        self._connections = max(1, connections)
+        self._limiter = RateLimiter(rateLimit)
+        self._outbox = outboxDir and Outbox(outboxDir) or None
+
+        self._local = threading.local()
+        self._sessions = []
+        self._sessionLock = threading.Lock()
+
+    @classmethod
+    def fromConfig(cls, cfg):
+        """
+        Create a mailer from the smtp settings in the updatebot config.
+        """
+
+        return cls(cfg.smtpServer, connections=cfg.smtpConnections,
+                   rateLimit=cfg.smtpRateLimit, outboxDir=cfg.emailOutboxDir)
+
+    def _getSession(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = SmtpSession(self._server)
+            with self._sessionLock:
+                self._sessions.append(session)
+        return session
+
+    def close(self):
+        """
+        Close all smtp sessions.
+        """
+
+        with self._sessionLock:
+            sessions = self._sessions
+            self._sessions = []
+            self._local = threading.local()
+
+        for session in sessions:
+            session.close()
+
+    def _send(self, message):
+        """
+        Send a single message, unless the outbox says it has been sent.
+        @return dictionary of refused recipients, or None if the message was
+                already sent.
+        """
+
+        if self._outbox:
+            if self._outbox.isSent(message.key):
+                log.info('already sent %s' % message)
+                return None
+            self._outbox.add(message.key, message.text)
+
+        self._limiter.wait()
+        refused = self._getSession().sendmail(message.fromAddr,
+                                              message.toAddrs, message.text)
+
+        # Only messages that every recipient accepted are done, others are
+        # left in the outbox to be retried.
+        if self._outbox and not refused:
+            self._outbox.markSent(message.key)
+
+        return refused
+
+    def send(self, message):
+        """
+        Send a single message.
+        @param message: message to send
+        @type message: Message
+        @return dictionary of refused recipients, or None if the message was
+                already sent.
+        """
+
+        return self._send(message)
+
+    def sendMany(self, messages):
+        """
+        Send a list of messages concurrently. All messages are attempted even
+        if some of them fail.
+        @param messages: messages to send
+        @type messages: list(Message, ...)
+        @return list of (message, refused recipients, exc_info) tuples in the
+                order the messages were sent. exc_info is None if the
+                message was sent.
+        """
+
+        def send(message):
+            try:
+                return self._send(message), None
+            except (smtplib.SMTPException, socket.error):
+                return None, sys.exc_info()
+
+        results = []
+        try:
+            for message, (refused, excInfo) in util.iterThreaded(send,
+                    messages, workers=self._connections):
+                results.append((message, refused, excInfo))
+        finally:
+            self.close()
+
+        return results
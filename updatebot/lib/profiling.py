@@ -0,0 +1,309 @@
+#
+# Copyright (c) SAS Institute, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Module for recording where time and memory go while the bot runs.
+
+Profiling is enabled by setting the profileReport config option, or the
+UPDATEBOT_PROFILE environment variable, to the path of a report file. Code
+marks the phases it wants measured with the phase context manager or the
+profiled decorator. Timings are aggregated per phase name and written to the
+report as json when writeReport is called and when the process exits.
+
+Phases record wall time, the change in resident memory, peak resident memory
+and the change in the number of objects tracked by the garbage collector,
+which stands in for allocation counts. Phases that run once per package can
+be recorded without the memory statistics to keep the overhead down.
+"""
+
+import os
+import gc
+import json
+import time
+import atexit
+import socket
+import logging
+import resource
+import threading
+from functools import wraps
+
+log = logging.getLogger('updatebot.lib.profiling')
+
+ENVIRONMENT_VARIABLE = 'UPDATEBOT_PROFILE'
+
+_lock = threading.RLock()
+_reportPath = None
+_startTime = None
+_phases = {}
+_order = []
+_stack = threading.local()
+
+_pageSize = resource.getpagesize()
+
+
+def configure(cfg=None):
+    """
+    Enable profiling if requested by config or the environment. The
+    environment variable takes precedence over the config.
+    @param cfg: updatebot config object
+    @type cfg: updatebot.config.UpdateBotConfigSection
+    @return True if profiling is enabled
+    @rtype boolean
+    """
+
+    global _reportPath, _startTime
+
+    path = os.environ.get(ENVIRONMENT_VARIABLE)
+    if not path and cfg is not None:
+        path = getattr(cfg, 'profileReport', None)
+
+    with _lock:
+        if not path or path == _reportPath:
+            return enabled()
+
+        if _reportPath is None:
+            atexit.register(writeReport)
+            _startTime = time.time()
+
+        _reportPath = path
+        log.info('profiling enabled, writing report to %s' % path)
+
+    return True
+
+def enabled():
+    """
+    @return True if profiling is enabled
+    @rtype boolean
+    """
+
+    return _reportPath is not None
+
+def _getRss():
+    """
+    Get the current resident set size in bytes, or None where it is not
+    available.
+    """
+
+    try:
+        fh = open('/proc/self/statm')
+        try:
+            return int(fh.read().split()[1]) * _pageSize
+        finally:
+            fh.close()
+    except (IOError, IndexError, ValueError):
+        return None
+
+def _getMaxRss():
+    """
+    Get the peak resident set size of the process in bytes.
+    """
+
+    # ru_maxrss is reported in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _PhaseStats(object):
+    """
+    Aggregated measurements for all runs of a phase.
+    """
+
+    __slots__ = ('name', 'parent', 'calls', 'wallTime', 'maxWallTime',
+                 'rssDelta', 'peakRss', 'objectDelta', 'errors', )
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.calls = 0
+        self.wallTime = 0.0
+        self.maxWallTime = 0.0
+        self.rssDelta = None
+        self.peakRss = None
+        self.objectDelta = None
+        self.errors = 0
+
+    def add(self, wallTime, rssDelta, peakRss, objectDelta, error):
+        self.calls += 1
+        self.wallTime += wallTime
+        self.maxWallTime = max(self.maxWallTime, wallTime)
+        if error:
+            self.errors += 1
+        if rssDelta is not None:
+            self.rssDelta = (self.rssDelta or 0) + rssDelta
+        if peakRss is not None:
+            self.peakRss = max(self.peakRss, peakRss)
+        if objectDelta is not None:
+            self.objectDelta = (self.objectDelta or 0) + objectDelta
+
+    def asDict(self):
+        return dict(
+            name=self.name,
+            parent=self.parent,
+            calls=self.calls,
+            wall_time=self.wallTime,
+            max_wall_time=self.maxWallTime,
+            rss_delta=self.rssDelta,
+            peak_rss=self.peakRss,
+            object_delta=self.objectDelta,
+            errors=self.errors,
+        )
+
+
+class _NullPhase(object):
+    """
+    Phase used when profiling is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        return False
+
+_nullPhase = _NullPhase()
+
+
+class _Phase(object):
+    """
+    Context manager that measures one run of a phase.
+    """
+
+    def __init__(self, name, detail):
+        self._name = name
+        self._detail = detail
+
+    def __enter__(self):
+        stack = getattr(_stack, 'phases', None)
+        if stack is None:
+            stack = _stack.phases = []
+
+        self._parent = stack and stack[-1] or None
+        stack.append(self._name)
+
+        if self._detail:
+            self._rss = _getRss()
+            self._objects = len(gc.get_objects())
+        self._start = time.time()
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        wallTime = time.time() - self._start
+
+        rssDelta = peakRss = objectDelta = None
+        if self._detail:
+            rss = _getRss()
+            if rss is not None and self._rss is not None:
+                rssDelta = rss - self._rss
+            peakRss = _getMaxRss()
+            objectDelta = len(gc.get_objects()) - self._objects
+
+        _stack.phases.pop()
+
+        with _lock:
+            stats = _phases.get(self._name)
+            if stats is None:
+                stats = _phases[self._name] = _PhaseStats(self._name,
+                                                          self._parent)
+                _order.append(self._name)
+            stats.add(wallTime, rssDelta, peakRss, objectDelta,
+                      excType is not None)
+
+            if self._detail:
+                log.debug('%s: %.2fs, rss delta %s, peak rss %s, objects %s'
+                          % (self._name, wallTime, rssDelta, peakRss,
+                             objectDelta))
+
+        return False
+
+
+def phase(name, detail=True):
+    """
+    Get a context manager that records a run of the named phase.
+    @param name: name of the phase
+    @type name: str
+    @param detail: record memory statistics as well as time, this is
+                   expensive and should be disabled for phases that run
+                   many times.
+    @type detail: boolean
+    """
+
+    if _reportPath is None:
+        return _nullPhase
+    return _Phase(name, detail)
+
+def profiled(name, detail=True):
+    """
+    Decorator that records every call of the decorated function as a run of
+    the named phase.
+    @param name: name of the phase
+    @type name: str
+    @param detail: record memory statistics as well as time
+    @type detail: boolean
+    """
+
+    def deco(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _reportPath is None:
+                return func(*args, **kwargs)
+            with _Phase(name, detail):
+                return func(*args, **kwargs)
+        return wrapper
+    return deco
+
+def getReport():
+    """
+    Get the measurements collected so far.
+    @return report
+    @rtype dict
+    """
+
+    with _lock:
+        return dict(
+            version=1,
+            host=socket.gethostname(),
+            pid=os.getpid(),
+            start_time=_startTime,
+            end_time=time.time(),
+            peak_rss=_getMaxRss(),
+            phases=[ _phases[x].asDict() for x in _order ],
+        )
+
+def writeReport(path=None):
+    """
+    Write the measurements collected so far to the report file.
+    @param path: path to write to, defaults to the configured report path
+    @type path: str
+    """
+
+    path = path or _reportPath
+    if path is None:
+        return
+
+    report = getReport()
+
+    tmpPath = '%s.%s.tmp' % (path, os.getpid())
+    try:
+        fh = open(tmpPath, 'w')
+        try:
+            json.dump(report, fh, indent=2, sort_keys=True)
+            fh.write('\n')
+        finally:
+            fh.close()
+        os.rename(tmpPath, path)
+    except (IOError, OSError), e:
+        log.error('failed to write profiling report %s: %s' % (path, e))
+        if os.path.exists(tmpPath):
+            os.unlink(tmpPath)
@@ -17,11 +17,25 @@
 
 """
 Module for walking url trees much like os.walk
+
+Directory listings are fetched by a bounded pool of worker threads over
+persistent keep-alive connections, so the children of a directory are
+fetched concurrently while the caller processes their parent. Listings may
+optionally be cached on disk and revalidated with If-Modified-Since.
 """
 
 import os
+import sys
+import json
+import socket
+import urllib
+import hashlib
+import httplib
 import urllib2
 import urlparse
+import tempfile
+import threading
+from Queue import Queue
 from HTMLParser import HTMLParser
 
 class Parser(HTMLParser):
@@ -44,6 +58,217 @@ class Parser(HTMLParser):
                 self._callback._regref(d['href'])
 
 
+class ConnectionPool(object):
+    """
+    Pool of persistent http connections, keyed by scheme and host.
+    """
+
+    _connectionClasses = {
+        'http': httplib.HTTPConnection,
+        'https': httplib.HTTPSConnection,
+    }
+
+    _maxRedirects = 5
+
+    def __init__(self, timeout=60):
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._proxies = urllib.getproxies()
+
+    def _getConnection(self, key):
+        """
+        Get an idle connection to the given host or open a new one.
+        @return (connection, reused)
+        """
+
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+
+        scheme, netloc = key
+        cls = self._connectionClasses[scheme]
+        return cls(netloc, timeout=self._timeout), False
+
+    def _putConnection(self, key, conn):
+        """
+        Return a connection to the pool for reuse.
+        """
+
+        with self._lock:
+            self._idle.setdefault(key, []).append(conn)
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+
+        for conns in idle.itervalues():
+            for conn in conns:
+                conn.close()
+
+    def get(self, url, headers=None):
+        """
+        Fetch a url, following redirects.
+        @param url: url to fetch
+        @type url: str
+        @param headers: extra request headers
+        @type headers: dict
+        @return (status, response headers, body), status is either 200 or 304
+        @rtype (int, httplib.HTTPMessage, str)
+        @raises urllib2.HTTPError: for any other status
+        """
+
+        for i in range(self._maxRedirects + 1):
+            status, msg, body = self._get(url, headers or {})
+            if status in (301, 302, 303, 307) and msg.getheader('location'):
+                url = urlparse.urljoin(url, msg.getheader('location'))
+                continue
+            if status not in (200, 304):
+                raise urllib2.HTTPError(url, status,
+                                        httplib.responses.get(status, ''),
+                                        msg, None)
+            return status, msg, body
+
+        raise urllib2.HTTPError(url, status, 'too many redirects', msg, None)
+
+    def _get(self, url, headers):
+        """
+        Issue a single GET request.
+        """
+
+        parts = urlparse.urlsplit(url)
+        scheme = parts.scheme.lower()
+
+        # httplib does not know about proxies, leave those to urllib2.
+        if scheme not in self._connectionClasses or scheme in self._proxies:
+            return self._getUrllib2(url, headers)
+
+        key = (scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        while True:
+            conn, reused = self._getConnection(key)
+            try:
+                conn.request('GET', path, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                # The server may have closed an idle connection, retry once
+                # on a new connection.
+                if reused:
+                    continue
+                raise
+
+            if resp.will_close:
+                conn.close()
+            else:
+                self._putConnection(key, conn)
+
+            return resp.status, resp.msg, body
+
+    @staticmethod
+    def _getUrllib2(url, headers):
+        """
+        Issue a GET request with urllib2.
+        """
+
+        req = urllib2.Request(url, headers=headers)
+        try:
+            resp = urllib2.urlopen(req)
+        except urllib2.HTTPError, e:
+            if e.code == 304:
+                return e.code, e.info(), ''
+            raise
+        try:
+            return 200, resp.info(), resp.read()
+        finally:
+            resp.close()
+
+
+class ListingCache(object):
+    """
+    On disk cache of the hrefs found in directory listings, along with the
+    Last-Modified header of the listing for revalidation.
+    """
+
+    def __init__(self, path):
+        self._path = path
+
+        if not os.path.exists(self._path):
+            try:
+                os.makedirs(self._path)
+            except OSError:
+                if not os.path.isdir(self._path):
+                    raise
+
+    def _entryPath(self, url):
+        return os.path.join(self._path, hashlib.sha1(url).hexdigest())
+
+    def get(self, url):
+        """
+        Get the cached entry for a url.
+        @return (lastModified, refs) or None
+        """
+
+        try:
+            fh = open(self._entryPath(url))
+            try:
+                entry = json.load(fh)
+            finally:
+                fh.close()
+        except (IOError, ValueError):
+            return None
+
+        if entry.get('url') != url:
+            return None
+
+        return entry['lastModified'], entry['refs']
+
+    def set(self, url, lastModified, refs):
+        """
+        Store the hrefs found at a url.
+        """
+
+        fd, tmp = tempfile.mkstemp(dir=self._path, prefix='.tmp-')
+        try:
+            fh = os.fdopen(fd, 'w')
+            try:
+                json.dump(dict(url=url, lastModified=lastModified, refs=refs),
+                          fh)
+            finally:
+                fh.close()
+            os.rename(tmp, self._entryPath(url))
+        except:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+
+class _Listing(object):
+    """
+    Result of fetching a directory listing, filled in by a worker thread.
+    """
+
+    __slots__ = ('path', 'prev', 'done', 'dirs', 'files', 'excInfo', )
+
+    def __init__(self, path, prev):
+        self.path = path
+        self.prev = prev
+        self.done = threading.Event()
+        self.dirs = None
+        self.files = None
+        self.excInfo = None
+
+
 class UrlWalker(object):
     """
     Class to implement walker interface for urls, similar to os.walk.
@@ -51,83 +276,156 @@ class UrlWalker(object):
 
     _ignore = ('/', )
 
-    def __init__(self, baseUrl):
+    def __init__(self, baseUrl, workers=4, cacheDir=None):
         url = urlparse.urlparse(baseUrl)
         self._baseUrl = url.geturl()[:-len(url.path)]
-        self._cur = os.path.abspath(url.path)
+        self._root = os.path.abspath(url.path)
 
-        self._prev = None
-        self._parser = Parser(self)
-        self._refs = []
+        self._workers = max(1, workers)
+        self._pool = ConnectionPool()
+        self._cache = cacheDir and ListingCache(cacheDir) or None
 
     @classmethod
-    def walk(cls, baseUrl):
+    def walk(cls, baseUrl, workers=4, cacheDir=None):
         """
         Walk a url path.
+        @param baseUrl: url to start walking from
+        @type baseUrl: str
+        @param workers: maximum number of directories to fetch at once
+        @type workers: int
+        @param cacheDir: directory to cache listings in, disabled if None
+        @type cacheDir: str
+        @return iterator of (url, directories, files) tuples, top down. Like
+                os.walk, directories may be removed from the list to avoid
+                walking them.
         """
 
-        obj = cls(baseUrl)
+        obj = cls(baseUrl, workers=workers, cacheDir=cacheDir)
         return obj._walk()
 
-    def _walk(self, prev=None):
+    def _walk(self):
+        """
+        Walk url path depth first, fetching the children of each directory
+        in the background once it has been yielded.
+        """
+
+        queue = Queue()
+        threads = []
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._worker, args=(queue, ))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        def submit(path, prev):
+            listing = _Listing(path, prev)
+            queue.put(listing)
+            return listing
+
+        try:
+            stack = [ submit(self._root, None), ]
+            while stack:
+                listing = stack.pop()
+                listing.done.wait()
+                if listing.excInfo:
+                    raise listing.excInfo[0], listing.excInfo[1], \
+                        listing.excInfo[2]
+
+                yield (self._getUrl(listing.path), listing.dirs, listing.files)
+
+                children = [ submit(os.path.normpath(
+                                os.path.join(listing.path, x)), listing.path)
+                             for x in listing.dirs ]
+                stack.extend(reversed(children))
+        finally:
+            # Drop any queued fetches and stop the workers.
+            while not queue.empty():
+                try:
+                    queue.get_nowait()
+                except Exception:
+                    break
+            for thread in threads:
+                queue.put(None)
+            for thread in threads:
+                thread.join()
+            self._pool.close()
+
+    def _worker(self, queue):
+        """
+        Fetch listings from the queue until told to stop.
+        """
+
+        while True:
+            listing = queue.get()
+            if listing is None:
+                break
+
+            try:
+                listing.dirs, listing.files = self._list(listing.path,
+                                                         listing.prev)
+            except Exception:
+                listing.excInfo = sys.exc_info()
+            listing.done.set()
+
+    def _list(self, cur, prev):
         """
-        Walk url path.
+        Get the directories and files in a url path.
         """
 
         files = []
         directories = []
 
-        for path in self._read():
+        for path in self._read(self._getUrl(cur)):
             if self._isDirectory(path):
-                if not self._filterDirectory(path, prev):
+                if not self._filterDirectory(path, cur, prev):
                     directories.append(os.path.normpath(path))
             elif not self._filterFile(path):
                 files.append(path)
 
-        yield (self._getCurrentUrl(), directories, files)
-
-        cur = self._cur
-        for directory in directories:
-            self._cur = os.path.normpath(os.path.join(cur, directory))
-            for res in self._walk(prev=cur):
-                yield res
+        return directories, files
 
-    def _read(self):
+    def _read(self, url):
         """
         Read a url path and parse the html.
         """
 
-        self._refs = []
-        url = self._getCurrentUrl()
-        doc = urllib2.urlopen(url).read()
-        self._parser.feed(doc)
-        self._parser.close()
-        return self._refs
+        headers = {}
+        cached = self._cache and self._cache.get(url)
+        if cached and cached[0]:
+            headers['If-Modified-Since'] = cached[0]
 
-    def _regref(self, ref):
-        """
-        Callback for the html parser to register hrefs.
-        """
+        status, msg, doc = self._pool.get(url, headers=headers)
+        if status == 304 and cached:
+            return cached[1]
 
-        self._refs.append(ref)
+        refs = []
+        parser = Parser(_RefCollector(refs))
+        parser.feed(doc)
+        parser.close()
+
+        lastModified = msg.getheader('last-modified')
+        if self._cache and lastModified:
+            self._cache.set(url, lastModified, refs)
+
+        return refs
 
-    def _getCurrentUrl(self):
+    def _getUrl(self, cur):
         """
-        Return the current url.
+        Return the url of a path.
         """
 
-        if self._cur == '/':
+        if cur == '/':
             return self._baseUrl
 
         base = self._baseUrl.endswith('/')
-        cur = self._cur.startswith('/')
+        absolute = cur.startswith('/')
 
-        if (base and not cur) or (not base and cur):
-            return self._baseUrl + self._cur
-        elif not base and not cur:
-            return self._baseUrl + '/' + self._cur
-        elif base and cur:
-            return self._baseUrl + self._cur[1:]
+        if (base and not absolute) or (not base and absolute):
+            return self._baseUrl + cur
+        elif not base and not absolute:
+            return self._baseUrl + '/' + cur
+        elif base and absolute:
+            return self._baseUrl + cur[1:]
 
     @staticmethod
     def _isDirectory(name):
@@ -137,16 +435,16 @@ class UrlWalker(object):
 
         return name.endswith('/')
 
-    def _filterDirectory(self, name, prev):
+    def _filterDirectory(self, name, cur, prev):
         """
         Check if a directory should be filtered out.
         """
 
         name = os.path.normpath(name)
 
-        if prev is None and self._cur.startswith(name):
+        if prev is None and cur.startswith(name):
             return True
-        if name == self._cur:
+        if name == cur:
             return True
         if name == prev:
             return True
@@ -167,6 +465,22 @@ class UrlWalker(object):
 
         return False
 
+
+class _RefCollector(object):
+    """
+    Collect the hrefs found by a Parser into a list.
+    """
+
+    def __init__(self, refs):
+        self._refs = refs
+
+    def _regref(self, ref):
+        """
+        Callback for the html parser to register hrefs.
+        """
+
+        self._refs.append(ref)
+
 walk = UrlWalker.walk
 
 if __name__ == '__main__':
@@ -23,15 +23,19 @@ Module for common utility functions.
 # pylint: disable=W0611
 
 import os
+import sys
 import epdb
 import signal
 import resource
+from Queue import Queue
+from threading import Thread
 
 from rmake.lib import osutil
 from conary.lib.util import rmtree
 from conary.lib.util import convertPackageNameToClassName as _pkgNameToClassName
 
 from rpmutils import rpmvercmp
+from rpmutils.vercmp import vercmpKey
 
 def join(a, *b):
     """
@@ -70,19 +74,25 @@ def packagevercmp(a, b):
     # Not all "packages" have epoch set. If comparing between two packages, at
     # least one without an epoch specified, ignore epoch.
     if a.epoch is not None and b.epoch is not None:
-        epochcmp = rpmvercmp(a.epoch, b.epoch)
+        epochcmp = cmp(vercmpKey(a.epoch), vercmpKey(b.epoch))
         if epochcmp != 0:
             return epochcmp
 
-    vercmp = rpmvercmp(a.version, b.version)
-    if vercmp != 0:
-        return vercmp
+    return cmp((vercmpKey(a.version), vercmpKey(a.release)),
+               (vercmpKey(b.version), vercmpKey(b.release)))
 
-    relcmp = rpmvercmp(a.release, b.release)
-    if relcmp != 0:
-        return relcmp
+def packageVersionKey(pkg):
+    """
+    Sort key for package objects, for use in place of packagevercmp. Packages
+    without an epoch are sorted as if their epoch was 0.
+    @param pkg: package object from repo metadata
+    @type pkg: repomd.packagexml._Package
+    """
 
-    return 0
+    epoch = pkg.epoch
+    if epoch is None:
+        epoch = '0'
+    return (vercmpKey(epoch), vercmpKey(pkg.version), vercmpKey(pkg.release))
 
 def packageCompare(a, b):
     """
@@ -233,6 +243,75 @@ def recurseDeps(pkg):
     _helper(pkg)
     return deps
 
+def iterThreaded(func, items, workers=10):
+    """
+    Call func once for each item in a pool of worker threads.
+    @param func: function to call, takes one item as an argument.
+    @type func: callable
+    @param items: items to process.
+    @type items: iterable
+    @param workers: maximum number of concurrent calls.
+    @type workers: int
+    @return iterator of (item, result) tuples in the order that they complete.
+            Exceptions raised by func are raised in the calling thread.
+    """
+
+    items = list(items)
+    if not items:
+        return
+
+    inq = Queue()
+    outq = Queue()
+    for item in items:
+        inq.put(item)
+
+    # Tells the workers to stop once the consumer has gone away.
+    stop = []
+
+    def worker():
+        while not stop:
+            try:
+                item = inq.get_nowait()
+            except Exception:
+                break
+            try:
+                outq.put((item, func(item), None))
+            except Exception:
+                outq.put((item, None, sys.exc_info()))
+
+    for i in range(min(workers, len(items))):
+        thread = Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    try:
+        for i in range(len(items)):
+            item, result, excInfo = outq.get()
+            if excInfo:
+                raise excInfo[0], excInfo[1], excInfo[2]
+            yield item, result
+    finally:
+        stop.append(True)
+
+def threadedMap(func, items, workers=10):
+    """
+    Call func once for each item in a pool of worker threads and return the
+    results in the same order as the items.
+    @param func: function to call, takes one item as an argument.
+    @type func: callable
+    @param items: items to process.
+    @type items: iterable
+    @param workers: maximum number of concurrent calls.
+    @type workers: int
+    @return list of results
+    """
+
+    # Results are keyed by index, since items need not be hashable.
+    items = list(items)
+    results = dict(iterThreaded(lambda x: func(items[x]),
+                                range(len(items)), workers=workers))
+    return [ results[x] for x in range(len(items)) ]
+
 class BoundedCounter(object):
     """
     Basic counter that can be incremented and decremented while enforcing
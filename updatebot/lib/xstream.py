@@ -0,0 +1,233 @@
+#
+# Copyright (c) SAS Institute, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""
+Streaming serializer and parser for the item list documents defined in
+updatebot.lib.xobjects.
+
+These documents are flat lists of items with string and integer elements, so
+they can be written and read without building an xobj object tree. Every
+document that is written is also serialized with xobj and the xobj output is
+written if the two differ. The first document of each type that is read in a
+process is also parsed with xobj and the results are compared. If they
+differ, xobj is used to read that document type from then on.
+"""
+
+import logging
+from xml.sax.saxutils import escape
+from xml.etree import cElementTree as etree
+
+log = logging.getLogger('updatebot.lib.xstream')
+
+XML_DECLARATION = "<?xml version='1.0' encoding='UTF-8'?>\n"
+
+# Results of comparing the streaming parser to xobj.
+# docClass: boolean, True if the results matched.
+_verifiedRead = {}
+
+
+def _getDataClass(docClass):
+    """
+    Get the item list class for a document class.
+    """
+
+    return docClass.__dict__['data']
+
+def _getItemClass(docClass):
+    """
+    Get the item class for a document class.
+    """
+
+    return _getDataClass(docClass).__dict__['items'][0]
+
+def _getFields(itemClass):
+    """
+    Get a sorted list of (elementName, type) for all of the declared elements
+    of an item class.
+    """
+
+    fields = {}
+    for cls in reversed(itemClass.__mro__):
+        for name, value in cls.__dict__.iteritems():
+            if name.startswith('_'):
+                continue
+            if value in (str, int):
+                fields[name] = value
+    return sorted(fields.iteritems())
+
+def _itemValues(item, fields):
+    """
+    Get a tuple of element values for an item, used for comparing parse
+    results.
+    """
+
+    return tuple(getattr(item, x, None) for x, y in fields)
+
+def _fmtText(value):
+    """
+    Format an element value as escaped xml text.
+    """
+
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    elif not isinstance(value, str):
+        value = str(value)
+    return escape(value)
+
+def toxml(docClass, items):
+    """
+    Serialize a list of items into an xml string.
+    @param docClass: document class to serialize as.
+    @type docClass: subclass of updatebot.lib.xobjects.XDocManager
+    @param items: list of items to serialize, in order.
+    @type items: list(item instance, ...)
+    @return xml string
+    @rtype str
+    """
+
+    fields = _getFields(_getItemClass(docClass))
+
+    if not items:
+        return XML_DECLARATION + '<data/>\n'
+
+    lines = [ XML_DECLARATION + '<data>', ]
+    for item in items:
+        elements = []
+        for name, fieldType in fields:
+            value = getattr(item, name, None)
+            if value is None or value in (str, int):
+                continue
+            elements.append('    <%s>%s</%s>' % (name, _fmtText(value), name))
+
+        if elements:
+            lines.append('  <items>')
+            lines.extend(elements)
+            lines.append('  </items>')
+        else:
+            lines.append('  <items/>')
+    lines.append('</data>\n')
+
+    return '\n'.join(lines)
+
+def iterparse(docClass, fn):
+    """
+    Parse an xml file into item instances without loading the whole document
+    into memory.
+    @param docClass: document class to parse as.
+    @type docClass: subclass of updatebot.lib.xobjects.XDocManager
+    @param fn: file name to parse.
+    @type fn: str
+    @return iterator of item instances
+    """
+
+    itemClass = _getItemClass(docClass)
+    fields = dict(_getFields(itemClass))
+
+    values = {}
+    for event, elem in etree.iterparse(fn, events=('end', )):
+        if elem.tag == 'items':
+            item = itemClass()
+            for name, value in values.iteritems():
+                setattr(item, name, value)
+            values = {}
+            elem.clear()
+            yield item
+        elif elem.tag in fields:
+            text = elem.text or ''
+            if fields[elem.tag] is int:
+                # Empty integer elements are read as None, like xobj does.
+                if text:
+                    text = int(text)
+                else:
+                    text = None
+            elif isinstance(text, unicode):
+                try:
+                    text = str(text)
+                except UnicodeEncodeError:
+                    pass
+            values[elem.tag] = text
+
+def _xobjToxml(docClass, items):
+    """
+    Serialize a list of items using xobj.
+    """
+
+    model = _getDataClass(docClass)()
+    model.items = items
+
+    doc = docClass()
+    doc.data = model
+    return doc.toxml()
+
+def _xobjParse(docClass, fn):
+    """
+    Parse a file using xobj.
+    """
+
+    return docClass.fromfile(fn).data.items
+
+def tofile(docClass, items, fn):
+    """
+    Serialize a list of items to a file.
+    @param docClass: document class to serialize as.
+    @type docClass: subclass of updatebot.lib.xobjects.XDocManager
+    @param items: list of items to serialize, in order.
+    @type items: list(item instance, ...)
+    @param fn: file name to write to.
+    @type fn: str
+    """
+
+    # Compare every document, differences in escaping or unicode handling
+    # may only show up in some documents.
+    xml = toxml(docClass, items)
+    expected = _xobjToxml(docClass, items)
+    if xml != expected:
+        log.warn('streaming serialization of %s does not match xobj, '
+                 'writing the xobj serialization' % docClass.__name__)
+        xml = expected
+
+    fObj = open(fn, 'w')
+    fObj.write(xml)
+    fObj.close()
+
+def fromfile(docClass, fn):
+    """
+    Parse a file into a list of items.
+    @param docClass: document class to parse as.
+    @type docClass: subclass of updatebot.lib.xobjects.XDocManager
+    @param fn: file name to parse.
+    @type fn: str
+    @return list of item instances
+    """
+
+    if not _verifiedRead.get(docClass, True):
+        return _xobjParse(docClass, fn)
+
+    items = list(iterparse(docClass, fn))
+
+    if docClass not in _verifiedRead:
+        expected = _xobjParse(docClass, fn)
+        fields = _getFields(_getItemClass(docClass))
+        _verifiedRead[docClass] = (
+            [ _itemValues(x, fields) for x in items ] ==
+            [ _itemValues(x, fields) for x in expected ])
+        if not _verifiedRead[docClass]:
+            log.warn('streaming parser for %s does not match xobj, falling '
+                     'back to xobj' % docClass.__name__)
+            items = expected
+
+    return items
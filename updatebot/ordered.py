@@ -27,7 +27,10 @@ from conary.deps import deps
 
 from updatebot import errata
 from updatebot import groupmgr
+from updatebot.lib import util
+from updatebot.lib import profiling
 from updatebot.lib import watchdog
+from updatebot.build import Builder
 from updatebot.bot import Bot as BotSuperClass
 
 from updatebot.errors import SourceNotImportedError
@@ -147,6 +150,7 @@ class Bot(BotSuperClass):
 
         return pkgMap
 
+    @profiling.profiled('ordered.create')
     def create(self, *args, **kwargs):
         """
         Handle initial import case.
@@ -247,6 +251,7 @@ class Bot(BotSuperClass):
 
         return missingPackages, missingOrder
 
+    @profiling.profiled('ordered.update')
     def update(self, *args, **kwargs):
         """
         Handle update case.
@@ -492,6 +497,7 @@ class Bot(BotSuperClass):
 
         return updateSet
 
+    @profiling.profiled('ordered.promote')
     def promote(self, enforceAllExpected=True, checkMissingPackages=True):
         """
         Promote binary groups from the devel label to the production lable in
@@ -621,11 +627,23 @@ class Bot(BotSuperClass):
         log.info('promoted %s groups in %s seconds'
             % (count, time.time() - startime))
 
-    def createErrataGroups(self, rebuildGroups=False):
+    def createErrataGroups(self, rebuildGroups=False, parallel=False,
+        workers=None):
         """
         Create groups for each advisory that only contain the versions of
         packages that were included in that advisory. Once created, promote
         to production branch.
+        @param rebuildGroups: rebuild groups that already exist, comparing the
+                              new model to the existing model.
+        @type rebuildGroups: boolean
+        @param parallel: process all advisories at once rather than one bucket
+                         at a time. Group models are populated concurrently,
+                         committed in bulk and built through one build
+                         dispatcher. Not supported with rebuildGroups.
+        @type parallel: boolean
+        @param workers: number of concurrent workers to use when populating
+                        group models in parallel mode.
+        @type workers: int
         """
 
         # Get current timestamp
@@ -642,6 +660,13 @@ class Bot(BotSuperClass):
                                             targetGroup=True)
         targetErrataState = targetGroup.latest.errataState
 
+        if parallel and rebuildGroups:
+            log.warn('parallel mode does not support rebuilding groups, '
+                     'falling back to serial mode')
+        elif parallel:
+            return self._createErrataGroupsParallel(targetGroup,
+                targetErrataState, workers=workers)
+
         log.info('starting errata group processing')
 
         count = 0
@@ -662,15 +687,7 @@ class Bot(BotSuperClass):
                 raise TargetVersionNotFoundError(version=version,
                                                  updateId=updateId)
 
-            log.info('%s: looking up version exceptions' % updateId)
-            # Lookup any places we need to use old versions ahead of time.
-            multiVersionExceptions = dict([
-                (x[0], x[1]) for x in itertools.chain(
-                    self._updater.getTargetVersions(itertools.chain(
-                *self._getOldVersionExceptions(updateId).itervalues()
-                    ))[0]
-                )
-            ])
+            multiVersionExceptions = self._getMultiVersionExceptions(updateId)
 
             # Now that we know that the packages that are part of this update
             # should be on the target label we can separate things into
@@ -704,37 +721,8 @@ class Bot(BotSuperClass):
                 binTrvMap = \
                     self._updater.getBinaryVersionsFromSourcePackages(srcPkgs)
 
-                binTrvs = set()
-                for srcPkg, binTrvSpecs in binTrvMap.iteritems():
-                    targetSpecs, failed = self._updater.getTargetVersions(
-                        binTrvSpecs)
-                    binTrvs.update(set(targetSpecs))
-
-                # Handle attaching an update that was caused by changes that we
-                # made outside of the normal update stream to an existing
-                # advisory.
-                for nvf in self._cfg.extendAdvisory.get(advisory, ()):
-                    srcMap = self._updater.getSourceVersionMapFromBinaryVersion(
-                        nvf, labels=self._cfg.platformSearchPath,
-                        latest=False, includeBuildLabel=True)
-                    assert len(srcMap) == 1
-                    targetVersions = self._updater.getTargetVersions(
-                        srcMap.values()[0])[0]
-                    binTrvs.update(set(targetVersions))
-
-                # Group unique versions by flavor
-                nvfMap = {}
-                for n, v, f in self._filterBinPkgSet(binTrvs, multiVersionExceptions):
-                    # Taghandler components were moved to common label
-                    # and packages were rebuilt, so omit them here to
-                    # prevent older versions of packages being pulled in
-                    # (raising exceptions during commit) due solely to
-                    # their taghandler components (which are missing in
-                    # the newer versions).
-                    if n.endswith(':tagdescription') or n.endswith(':taghandler'):
-                        continue
-                    n = n.split(':')[0]
-                    nvfMap.setdefault((n, v), set()).add(f)
+                nvfMap = self._getErrataGroupContents(advisory, binTrvMap,
+                    multiVersionExceptions)
 
                 if rebuildGroups and targetGrp.hasBinaryVersion():
                     # For comparing with rebuilt group model.
@@ -843,6 +831,199 @@ class Bot(BotSuperClass):
         log.info('processed %s errata groups in %s seconds'
             % (count, time.time() - startime))
 
+    def _createErrataGroupsParallel(self, targetGroup, targetErrataState,
+        workers=None):
+        """
+        Create groups for all advisories up to the target errata state at once.
+        Advisories that already have groups are found with one repository
+        query, the models of the remaining groups are populated concurrently,
+        then all groups are committed, built through one build dispatcher and
+        promoted.
+        @param targetGroup: group manager for the target label.
+        @type targetGroup: updatebot.groupmgr.GroupManager
+        @param targetErrataState: latest errata state on the target label.
+        @type targetErrataState: int
+        @param workers: number of concurrent workers to populate models with.
+        @type workers: int
+        """
+
+        if not workers:
+            workers = 10
+
+        log.info('starting parallel errata group processing')
+
+        startime = time.time()
+
+        # Find all advisories that are candidates for group creation.
+        pending = []
+        for updateId, updates in self._errata.iterByIssueDate(current=0):
+            # Stop if the updateId is greater than the state of the
+            # latest group on the production label.
+            if updateId > targetErrataState:
+                log.info('current updateId (%s) is newer than target label '
+                    'contents' % updateId)
+                break
+
+            # Make sure the group representing the current updateId has been
+            # imported and promoted to the production label.
+            version = self._errata.getBucketVersion(updateId)
+            if not targetGroup.hasBinaryVersion(sourceVersion=version):
+                raise TargetVersionNotFoundError(version=version,
+                                                 updateId=updateId)
+
+            groupNames = self._errata.getNames(updateId)
+            for advInfo in self._errata.getUpdateDetail(updateId):
+                advisory = advInfo['name']
+
+                srcPkgs = self._errata.getAdvisoryPackages(advisory)
+                if advisory in self._cfg.brokenErrata:
+                    # We expect srcPkgs to be empty for known-broken errata.
+                    log.warning('%s: skipping broken advisory' % advisory)
+                    continue
+                else:
+                    assert srcPkgs
+
+                pending.append((updateId, version, advisory,
+                                groupNames[advisory], srcPkgs))
+
+        builder = Builder(self._cfg, self._ui, rmakeCfgFn='rmakerc-groups')
+        mgr = groupmgr.ErrataGroupManagerSet(self._cfg, self._ui,
+            builder=builder)
+
+        # Filter out any advisories that already have groups built.
+        log.info('checking %s advisories for existing groups' % len(pending))
+        built = mgr.hasBinaryVersions([ x[3] for x in pending ])
+        for updateId, version, advisory, name, srcPkgs in pending:
+            if built[name]:
+                log.info('%s: found existing version, skipping' % advisory)
+        pending = [ x for x in pending if not built[x[3]] ]
+
+        if not pending:
+            log.info('all errata groups already built and promoted')
+            return
+
+        # Find all of the binaries for all pending advisories at once.
+        log.info('finding built packages for %s advisories' % len(pending))
+        allSrcPkgs = set(itertools.chain(*[ x[4] for x in pending ]))
+        allBinTrvMap = \
+            self._updater.getBinaryVersionsFromSourcePackages(allSrcPkgs)
+
+        exceptions = {}
+        contents = {}
+        managers = {}
+        for updateId, version, advisory, name, srcPkgs in pending:
+            if updateId not in exceptions:
+                exceptions[updateId] = \
+                    self._getMultiVersionExceptions(updateId)
+
+            binTrvMap = dict((x, allBinTrvMap[x]) for x in srcPkgs
+                             if x in allBinTrvMap)
+            contents[advisory] = self._getErrataGroupContents(advisory,
+                binTrvMap, exceptions[updateId])
+
+            managers[advisory] = mgr.newGroup(name)
+
+        def populate(job):
+            updateId, version, advisory, name, srcPkgs = job
+
+            grp = managers[advisory].getGroup()
+            grp.version = version
+            grp.errataState = updateId
+
+            # Add packages to group model.
+            for (n, v), flvs in contents[advisory].iteritems():
+                log.info('%s: adding package %s=%s' % (advisory, n, v))
+                for f in flvs:
+                    log.info('%s: %s' % (advisory, f))
+                grp.addPackage(n, v, flvs)
+
+        log.info('populating %s group models' % len(pending))
+        util.threadedMap(populate, pending, workers=workers)
+
+        log.info('committing %s group sources' % len(pending))
+        mgr.commit()
+
+        log.info('building %s groups' % len(pending))
+        trvMap = mgr.buildmany()
+
+        log.info('promoting %s groups' % len(pending))
+        # Setting expected to an empty tuple since we don't expect anything
+        # other than groups to be promoted.
+        expected = tuple()
+        toPromote = self._flattenSetDict(trvMap)
+        promoted = self._updater.publish(toPromote, expected,
+                                         self._cfg.targetLabel)
+
+        log.info('completed errata group processing')
+        log.info('processed %s errata groups in %s seconds'
+            % (len(pending), time.time() - startime))
+
+    def _getMultiVersionExceptions(self, updateId):
+        """
+        Lookup any places we need to use old versions for a given bucket.
+        @param updateId: bucket identifier
+        @type updateId: int
+        @return map of package name to target label version
+        @rtype dict(str=conary.versions.VersionFromString)
+        """
+
+        log.info('%s: looking up version exceptions' % updateId)
+        return dict([
+            (x[0], x[1]) for x in itertools.chain(
+                self._updater.getTargetVersions(itertools.chain(
+            *self._getOldVersionExceptions(updateId).itervalues()
+                ))[0]
+            )
+        ])
+
+    def _getErrataGroupContents(self, advisory, binTrvMap, exceptions):
+        """
+        Find the contents of the group for a given advisory.
+        @param advisory: advisory name
+        @type advisory: str
+        @param binTrvMap: map of source packages in the advisory to binary
+                          trove specs built from those sources.
+        @type binTrvMap: dict(srcPkg=set((n, v, f), ...))
+        @param exceptions: map of package name to old version exceptions.
+        @type exceptions: dict(str=conary.versions.VersionFromString)
+        @return map of package name and target label version to flavors
+        @rtype dict((n, v)=set(f, ...))
+        """
+
+        binTrvs = set()
+        for srcPkg, binTrvSpecs in binTrvMap.iteritems():
+            targetSpecs, failed = self._updater.getTargetVersions(
+                binTrvSpecs)
+            binTrvs.update(set(targetSpecs))
+
+        # Handle attaching an update that was caused by changes that we
+        # made outside of the normal update stream to an existing
+        # advisory.
+        for nvf in self._cfg.extendAdvisory.get(advisory, ()):
+            srcMap = self._updater.getSourceVersionMapFromBinaryVersion(
+                nvf, labels=self._cfg.platformSearchPath,
+                latest=False, includeBuildLabel=True)
+            assert len(srcMap) == 1
+            targetVersions = self._updater.getTargetVersions(
+                srcMap.values()[0])[0]
+            binTrvs.update(set(targetVersions))
+
+        # Group unique versions by flavor
+        nvfMap = {}
+        for n, v, f in self._filterBinPkgSet(binTrvs, exceptions):
+            # Taghandler components were moved to common label
+            # and packages were rebuilt, so omit them here to
+            # prevent older versions of packages being pulled in
+            # (raising exceptions during commit) due solely to
+            # their taghandler components (which are missing in
+            # the newer versions).
+            if n.endswith(':tagdescription') or n.endswith(':taghandler'):
+                continue
+            n = n.split(':')[0]
+            nvfMap.setdefault((n, v), set()).add(f)
+
+        return nvfMap
+
     def _getOldVersionExceptions(self, updateId):
         versionExceptions = {}
         if updateId in self._cfg.useOldVersion:
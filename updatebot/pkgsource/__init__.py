@@ -24,6 +24,8 @@ from updatebot.pkgsource.rpmsource import RpmSource
 from updatebot.pkgsource.yumsource import YumSource
 from updatebot.pkgsource.errors import UnsupportedRepositoryError
 
+from updatebot.lib import profiling
+
 
 def PackageSource(cfg, ui):
     """
@@ -31,6 +33,8 @@ def PackageSource(cfg, ui):
     backend based on config data.
     """
 
+    profiling.configure(cfg)
+
     if cfg.repositoryFormat == 'yum':
         return YumSource(cfg, ui)
     elif cfg.repositoryFormat == 'artifactory':
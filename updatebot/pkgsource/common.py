@@ -22,8 +22,47 @@ Common module between all pkgSource implementations.
 import copy
 import logging
 
+from updatebot.pkgsource.pkgdb import PackageDatabase
+from updatebot.pkgsource.frozen import FrozenPackageSource
+
 log = logging.getLogger('updatebot.pkgsource')
 
+class PackageSourceDelta(object):
+    """
+    Changes applied to a package source by a refresh.
+    """
+
+    def __init__(self):
+        # repositories with changed metadata
+        self.repositories = []
+
+        # set([srcPkg, ...])
+        self.addedSources = set()
+        self.removedSources = set()
+
+        # sources that are still available, but gained or lost binaries
+        self.updatedSources = set()
+
+        # set([binPkg, ...])
+        self.addedBinaries = set()
+        self.removedBinaries = set()
+
+        # useMap keys that were added, removed or changed
+        self.useChanges = set()
+
+    def __nonzero__(self):
+        return bool(self.addedSources or self.removedSources or
+                    self.updatedSources or self.addedBinaries or
+                    self.removedBinaries or self.useChanges)
+
+    def __str__(self):
+        return ('%s sources added, %s removed, %s updated; '
+                '%s binaries added, %s removed'
+                % (len(self.addedSources), len(self.removedSources),
+                   len(self.updatedSources), len(self.addedBinaries),
+                   len(self.removedBinaries)))
+
+
 class BasePackageSource(object):
     """
     Base class for pkgSources
@@ -61,6 +100,9 @@ class BasePackageSource(object):
         # {(binName, srcConaryVersion, archStr): [archStr, archStr, ...]}
         self.useMap = dict()
 
+        # PackageDatabase instance, see getDatabase.
+        self._db = None
+
     def __copy__(self):
         log.info('copying pkgsource')
         cls = self.__class__
@@ -85,6 +127,82 @@ class BasePackageSource(object):
         obj.useMap = copy.deepcopy(self.useMap, memo)
         return obj
 
+    def freeze(self):
+        """
+        Get a read-only snapshot of the package source that can be shared by
+        views and forked processes without copying.
+        @return updatebot.pkgsource.frozen.FrozenPackageSource
+        """
+
+        return FrozenPackageSource(self)
+
+    def getDatabase(self):
+        """
+        Get an indexed database of the packages in this package source. The
+        package source is only loaded and exported if the database at the
+        configured packageDatabase path is missing or out of date.
+        @return updatebot.pkgsource.pkgdb.PackageDatabase
+        """
+
+        fingerprint = self._getDatabaseFingerprint()
+
+        # Without a fingerprint there is no way to tell if a database is out
+        # of date, so only trust databases exported by this instance.
+        if (self._db is not None and
+            (fingerprint is None or self._db.getFingerprint() == fingerprint)):
+            return self._db
+
+        db = self._db
+        if db is None:
+            db = PackageDatabase(self._cfg.packageDatabase or ':memory:')
+
+        if fingerprint is None or db.getFingerprint() != fingerprint:
+            self.load()
+            db.export(self, fingerprint)
+
+        self._db = db
+        return db
+
+    def _getDatabaseFingerprint(self):
+        """
+        Get a string that identifies the repository metadata and config that
+        the package source is built from, or None if the backend can not
+        tell without loading.
+        NOTE: Backends that can should implement this method.
+        """
+
+        return None
+
+    def whatProvides(self, name):
+        """
+        Get the packages that provide a capability.
+        @param name: name of the provided capability
+        @type name: str
+        @return [updatebot.pkgsource.pkgdb.PackageInfo, ...]
+        """
+
+        return self.getDatabase().whatProvides(name)
+
+    def whatRequires(self, name):
+        """
+        Get the packages that require a capability.
+        @param name: name of the required capability
+        @type name: str
+        @return [updatebot.pkgsource.pkgdb.PackageInfo, ...]
+        """
+
+        return self.getDatabase().whatRequires(name)
+
+    def whatObsoletes(self, name):
+        """
+        Get the packages that obsolete a package name.
+        @param name: name of the obsoleted package
+        @type name: str
+        @return [updatebot.pkgsource.pkgdb.PackageInfo, ...]
+        """
+
+        return self.getDatabase().whatObsoletes(name)
+
     def getClients(self):
         """
         Get instances of repository clients.
@@ -100,3 +218,16 @@ class BasePackageSource(object):
         Method to parse all package data into data structures listed above.
         NOTE: This method should be implmented by all backends.
         """
+
+    def refresh(self):
+        """
+        Method to apply changes in the package data since the last load or
+        refresh to the data structures listed above, without reloading
+        packages that have not changed.
+        NOTE: This method should be implmented by backends that can tell
+              what changed.
+        @return changes that were applied
+        @rtype PackageSourceDelta
+        """
+
+        raise NotImplementedError
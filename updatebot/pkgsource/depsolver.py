@@ -0,0 +1,378 @@
+#
+# Copyright (c) SAS Institute, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Module for computing the dependency closure of binary packages in a package
+source.
+
+Packages are numbered when the solver is first used and the provides and
+requires of every package are stored in tables keyed by those numbers.
+Versioned dependencies are compared the same way rpm compares them, file
+requirements are resolved from the file lists of the repositories, and when
+more than one package satisfies a requirement the preferred architecture,
+then the newest version, is picked. The providers of each distinct
+requirement are only looked up once.
+
+Example:
+> solver = DependencySolver(pkgSource, arches=('x86_64', 'noarch', ))
+> pkgs, unresolved = solver.resolve([ solver.getLatest(x)
+>                                     for x in cfg.package ])
+"""
+
+import logging
+
+from rpmutils.vercmp import vercmpKey
+
+from updatebot.lib import profiling
+from updatebot.pkgsource.errors import UnknownPackageError
+
+log = logging.getLogger('updatebot.pkgsource')
+
+# Comparison bits of rpm dependency flags.
+_LESS = 1
+_GREATER = 2
+_EQUAL = 4
+
+_senses = {
+    'LT': _LESS,
+    'LE': _LESS | _EQUAL,
+    'EQ': _EQUAL,
+    'GE': _GREATER | _EQUAL,
+    'GT': _GREATER,
+}
+
+_operators = {
+    'LT': '<',
+    'LE': '<=',
+    'EQ': '=',
+    'GE': '>=',
+    'GT': '>',
+}
+
+
+def _getEvr(epoch, version, release):
+    """
+    Get the comparison key of an epoch, version and release. Missing epochs
+    compare as 0 and a missing release matches any release.
+    """
+
+    if not version:
+        return None
+    return (vercmpKey(epoch or '0'), vercmpKey(version),
+            release and vercmpKey(release) or None)
+
+def _compareEvr(a, b):
+    res = cmp(a[:2], b[:2])
+    if res or a[2] is None or b[2] is None:
+        return res
+    return cmp(a[2], b[2])
+
+def _overlaps(provSense, provEvr, reqSense, reqEvr):
+    """
+    Check if a provide satisfies a requirement, following rpmdsCompare.
+    Unversioned provides and requirements always overlap.
+    """
+
+    if not provSense or not reqSense or provEvr is None or reqEvr is None:
+        return True
+
+    res = _compareEvr(provEvr, reqEvr)
+    if res < 0:
+        return bool(provSense & _GREATER or reqSense & _LESS)
+    elif res > 0:
+        return bool(provSense & _LESS or reqSense & _GREATER)
+    return bool(provSense & reqSense)
+
+def _formatDependency(dep):
+    """
+    Format a dependency the way rpm prints it.
+    """
+
+    flags = getattr(dep, 'flags', None)
+    if flags not in _operators or not getattr(dep, 'version', None):
+        return dep.name
+
+    evr = dep.version
+    if getattr(dep, 'epoch', None) not in (None, '0'):
+        evr = '%s:%s' % (dep.epoch, evr)
+    if getattr(dep, 'release', None):
+        evr = '%s-%s' % (evr, dep.release)
+    return '%s %s %s' % (dep.name, _operators[flags], evr)
+
+
+class DependencySolver(object):
+    """
+    Resolve the dependencies of binary packages against the binary packages
+    of a package source.
+    """
+
+    def __init__(self, pkgSource, arches=None, fileLists=True):
+        """
+        @param pkgSource: package source to resolve against
+        @type pkgSource: updatebot.pkgsource.common.BasePackageSource
+        @param arches: architectures that may be selected, most preferred
+                       first. All architectures may be selected if None.
+        @type arches: list(str, ...)
+        @param fileLists: load the file lists of the repositories to resolve
+                          file requirements.
+        @type fileLists: boolean
+        """
+
+        self._pkgSource = pkgSource
+        self._fileLists = fileLists
+
+        # {arch: rank}
+        self._archRank = None
+        if arches is not None:
+            self._archRank = dict((y, x) for x, y in enumerate(arches))
+
+        # All tables below are indexed by package number.
+        self._pkgs = []
+        self._evrs = []
+        # [(requirement, ...), ...]
+        self._requires = []
+
+        # {pkg: number}
+        self._pkgIds = {}
+        # {name: [number, ...]}
+        self._names = {}
+        # {capability: [(number, sense, evr), ...]}
+        self._provides = {}
+
+        # Requirements are (name, sense, evr) tuples, shared between all
+        # packages that have the same requirement.
+        # {requirement: requirement}
+        self._reqs = {}
+        # {requirement: requirement as printed by rpm}
+        self._reqStrings = {}
+        # {requirement: (number, ...)}
+        self._providers = {}
+
+        self._indexed = False
+
+    @profiling.profiled('depsolver.index')
+    def _index(self):
+        """
+        Build the package tables.
+        """
+
+        if self._indexed:
+            return
+
+        self._pkgSource.load()
+
+        log.info('indexing package dependencies')
+
+        for pkgs in self._pkgSource.binNameMap.itervalues():
+            for pkg in pkgs:
+                if pkg.arch in ('src', 'nosrc') or pkg in self._pkgIds:
+                    continue
+                if (self._archRank is not None and
+                    pkg.arch not in self._archRank):
+                    continue
+                self._addPackage(pkg)
+
+        self._indexFiles()
+        self._indexed = True
+
+        log.info('indexed %s packages, %s capabilities, %s requirements'
+                 % (len(self._pkgs), len(self._provides), len(self._reqs)))
+
+    def _addPackage(self, pkg):
+        idx = len(self._pkgs)
+        self._pkgs.append(pkg)
+        self._pkgIds[pkg] = idx
+        self._names.setdefault(pkg.name, []).append(idx)
+
+        # Packages always provide their own name.
+        evr = _getEvr(pkg.epoch, pkg.version, pkg.release)
+        self._evrs.append(evr)
+        self._provides.setdefault(pkg.name, []).append((idx, _EQUAL, evr))
+
+        requires = []
+        for node in getattr(pkg, 'format', None) or ():
+            kind = node.getName()
+            if kind not in ('rpm:provides', 'rpm:requires'):
+                continue
+
+            for dep in node.iterChildren():
+                if hasattr(dep, 'isspace') and dep.isspace():
+                    continue
+
+                sense = _senses.get(getattr(dep, 'flags', None), 0)
+                depEvr = None
+                if sense:
+                    depEvr = _getEvr(getattr(dep, 'epoch', None),
+                                     getattr(dep, 'version', None),
+                                     getattr(dep, 'release', None))
+
+                if kind == 'rpm:provides':
+                    self._provides.setdefault(dep.name, []).append(
+                        (idx, sense, depEvr))
+                elif not dep.name.startswith('rpmlib('):
+                    req = (dep.name, sense, depEvr)
+                    if req not in self._reqs:
+                        self._reqs[req] = req
+                        self._reqStrings[req] = _formatDependency(dep)
+                    requires.append(self._reqs[req])
+
+        self._requires.append(tuple(requires))
+
+    def _indexFiles(self):
+        """
+        Add the files that are required by any package to the provides table.
+        Files listed in the primary metadata are used first, file lists are
+        only loaded if that leaves any file requirements unresolved.
+        """
+
+        paths = set([ x[0] for x in self._reqs if x[0].startswith('/') ])
+        if not paths:
+            return
+
+        for idx, pkg in enumerate(self._pkgs):
+            for path in getattr(pkg, 'files', None) or ():
+                if path in paths:
+                    self._provides.setdefault(path, []).append(
+                        (idx, 0, None))
+
+        missing = set([ x for x in paths if x not in self._provides ])
+        if not missing or not self._fileLists:
+            return
+
+        log.info('loading file lists for %s file requirements' % len(missing))
+
+        nevras = dict((x.getNevra(), y) for x, y in self._pkgIds.iteritems())
+        for client in self._pkgSource.getClients().itervalues():
+            if not hasattr(client, 'getFileLists'):
+                continue
+            for flPkg in client.getFileLists():
+                idx = nevras.get((flPkg.name, flPkg.epoch, flPkg.version,
+                                  flPkg.release, flPkg.arch))
+                if idx is None:
+                    continue
+                for path in flPkg.files or ():
+                    if path in missing:
+                        self._provides.setdefault(path, []).append(
+                            (idx, 0, None))
+
+    def _sort(self, pkgIds):
+        """
+        Sort package numbers with the most preferred package first.
+        """
+
+        # Each sort is stable, so this orders by architecture rank, then
+        # newest version, then name.
+        pkgIds = sorted(pkgIds, key=lambda x: self._pkgs[x].name)
+        pkgIds.sort(key=lambda x: self._evrs[x], reverse=True)
+        if self._archRank is not None:
+            pkgIds.sort(key=lambda x: self._archRank[self._pkgs[x].arch])
+        return tuple(pkgIds)
+
+    def _getProviders(self, req):
+        """
+        Get the numbers of the packages that satisfy a requirement, most
+        preferred first.
+        """
+
+        providers = self._providers.get(req)
+        if providers is None:
+            name, sense, evr = req
+            providers = self._providers[req] = self._sort(set([
+                idx for idx, provSense, provEvr in self._provides.get(name, ())
+                if _overlaps(provSense, provEvr, sense, evr) ]))
+        return providers
+
+    def whatProvides(self, name, flags=None, epoch=None, version=None,
+                     release=None):
+        """
+        Get the packages that satisfy a requirement.
+        @param name: name of the required capability
+        @type name: str
+        @param flags: rpm comparison flags, ie. GE, or None for any version.
+        @type flags: str
+        @return list of packages, most preferred first.
+        """
+
+        self._index()
+
+        sense = _senses.get(flags, 0)
+        evr = sense and _getEvr(epoch, version, release) or None
+        return [ self._pkgs[x] for x in self._getProviders((name, sense, evr)) ]
+
+    def getLatest(self, name):
+        """
+        Get the preferred package of a given name.
+        @param name: binary package name
+        @type name: str
+        @return package or None if there is no package with this name.
+        """
+
+        self._index()
+
+        pkgIds = self._names.get(name)
+        if not pkgIds:
+            return None
+        return self._pkgs[self._sort(pkgIds)[0]]
+
+    @profiling.profiled('depsolver.resolve')
+    def resolve(self, pkgs):
+        """
+        Compute the dependency closure of a set of packages. Requirements
+        that are satisfied by a package that has already been selected are
+        not resolved again.
+        @param pkgs: binary packages from the package source
+        @type pkgs: iterable of packages
+        @return (set of packages, {package: set of requirements})
+                where the dictionary holds the requirements of each package
+                that could not be satisfied.
+        """
+
+        self._index()
+
+        selected = [ False ] * len(self._pkgs)
+        stack = []
+        for pkg in pkgs:
+            idx = self._pkgIds.get(pkg)
+            if idx is None:
+                raise UnknownPackageError(pkg=pkg)
+            if not selected[idx]:
+                selected[idx] = True
+                stack.append(idx)
+
+        unresolved = {}
+        while stack:
+            idx = stack.pop()
+            for req in self._requires[idx]:
+                providers = self._getProviders(req)
+                if not providers:
+                    unresolved.setdefault(self._pkgs[idx], set()).add(
+                        self._reqStrings[req])
+                    continue
+
+                for prov in providers:
+                    if selected[prov]:
+                        break
+                else:
+                    prov = providers[0]
+                    selected[prov] = True
+                    stack.append(prov)
+
+        closure = set([ self._pkgs[x] for x, y in enumerate(selected) if y ])
+
+        log.info('resolved %s packages, %s with unresolved requirements'
+                 % (len(closure), len(unresolved)))
+
+        return closure, unresolved
@@ -34,3 +34,23 @@ class UnsupportedRepositoryError(PackageSourceError):
     _params = ['repo', 'supported']
     _template = ('%(repo)s is not a supported repository format, please '
                  'choose one of the following %(supported)s')
+
+class SharedPackageSourceNotFoundError(PackageSourceError):
+    """
+    Raised when a shared package source is unpickled in a process that did
+    not create or inherit it.
+    """
+
+    _params = ['token', ]
+    _template = ('shared package source %(token)s is not available in this '
+                 'process, shared package sources can only be passed to '
+                 'forked processes')
+
+class UnknownPackageError(PackageSourceError):
+    """
+    Raised when a package is not one of the binary packages of the package
+    source it is looked up in.
+    """
+
+    _params = ['pkg', ]
+    _template = '%(pkg)s is not a binary package in this package source'
@@ -0,0 +1,301 @@
+#
+# Copyright (c) SAS Institute, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Read-only package source snapshots that can be shared without copying.
+
+A FrozenPackageSource holds immutable copies of the maps of a finalized
+package source. Package objects are shared with the source it was made from.
+Any number of views can be made of a snapshot in constant time. A view looks
+like a package source, and changes made through it are kept in the view
+rather than in the snapshot.
+
+Snapshots are never modified, so forked processes share them with their
+parent. Pickling a snapshot only records a token, which is resolved back to
+the inherited snapshot when it is unpickled in a forked child, so workers do
+not need to receive a pickled copy. Pickled views only carry the token and
+the changes made through the view. Snapshots are forgotten once nothing
+refers to them or when they are released.
+"""
+
+import os
+import weakref
+import logging
+from UserDict import DictMixin
+
+from updatebot.pkgsource.errors import SharedPackageSourceNotFoundError
+
+log = logging.getLogger('updatebot.pkgsource')
+
+# Snapshots that have been created in this process or inherited from the
+# parent process. Snapshots are only kept while something else refers to
+# them, views keep the snapshot they were made from.
+# {token: FrozenPackageSource}
+_snapshots = weakref.WeakValueDictionary()
+
+
+def _readOnly(self, *args, **kwargs):
+    raise TypeError('%s is read-only' % self.__class__.__name__)
+
+
+class FrozenDict(dict):
+    """
+    Dictionary that can not be modified after it is created.
+    """
+
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = _readOnly
+    clear = pop = popitem = setdefault = update = _readOnly
+
+    def copy(self):
+        return self
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class OverlayDict(DictMixin):
+    """
+    Dictionary that reads through to a FrozenDict and keeps changes to
+    itself. Read-only sets from the base are copied the first time they are
+    looked up by key, so callers can change them as they would the maps of a
+    package source. Values returned while iterating are not copied.
+    """
+
+    def __init__(self, base):
+        self._base = base
+        self._local = dict()
+        self._deleted = set()
+
+    def __getitem__(self, key):
+        if key in self._local:
+            return self._local[key]
+        if key in self._deleted:
+            raise KeyError(key)
+
+        value = self._base[key]
+        if isinstance(value, frozenset):
+            value = self._local[key] = set(value)
+        return value
+
+    def __setitem__(self, key, value):
+        self._local[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._local.pop(key, None)
+        if key in self._base:
+            self._deleted.add(key)
+
+    def __contains__(self, key):
+        return key in self._local or (key not in self._deleted and
+                                      key in self._base)
+
+    has_key = __contains__
+
+    def __iter__(self):
+        for key in self._local:
+            yield key
+        for key in self._base:
+            if key not in self._local and key not in self._deleted:
+                yield key
+
+    iterkeys = __iter__
+
+    def keys(self):
+        return list(self)
+
+    def __len__(self):
+        # Deleted keys are always in the base and never in the local dict.
+        return (len(self._base) - len(self._deleted) +
+                len([ x for x in self._local if x not in self._base ]))
+
+    def iteritems(self):
+        for key, value in self._local.iteritems():
+            yield key, value
+        for key, value in self._base.iteritems():
+            if key not in self._local and key not in self._deleted:
+                yield key, value
+
+    def itervalues(self):
+        for key, value in self.iteritems():
+            yield value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def copy(self):
+        obj = self.__class__(self._base)
+        # Sets copied from the base may have been changed, copy them again
+        # so changes made through one copy do not show up in the other.
+        for key, value in self._local.iteritems():
+            if isinstance(value, set):
+                value = set(value)
+            obj._local[key] = value
+        obj._deleted = set(self._deleted)
+        return obj
+
+    __copy__ = copy
+
+
+def _freezeValue(value):
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
+
+class FrozenPackageSource(object):
+    """
+    Read-only snapshot of the maps of a finalized package source.
+    """
+
+    _maps = ('locationMap', 'srcPkgMap', 'binPkgMap', 'srcNameMap',
+             'binNameMap', 'obsoletesMap', 'useMap', )
+
+    def __init__(self, pkgSource):
+        """
+        @param pkgSource: package source to take a snapshot of, the source is
+                          loaded if it has not been already.
+        @type pkgSource: updatebot.pkgsource.common.BasePackageSource
+        """
+
+        pkgSource.load()
+
+        log.info('freezing pkgsource')
+
+        self._cfg = pkgSource._cfg
+        self._ui = pkgSource._ui
+        self._clients = pkgSource._clients
+
+        for name in self._maps:
+            pkgMap = getattr(pkgSource, name)
+            setattr(self, name, FrozenDict([ (x, _freezeValue(y))
+                for x, y in pkgMap.iteritems() ]))
+
+        self._token = '%s-%s' % (os.getpid(), id(self))
+        _snapshots[self._token] = self
+
+    def load(self):
+        """
+        Snapshots are always loaded.
+        """
+
+    def getClients(self):
+        """
+        Get instances of repository clients.
+        """
+
+        return self._clients
+
+    def view(self):
+        """
+        Get a view of the snapshot that can be changed without affecting the
+        snapshot.
+        @return PackageSourceView
+        """
+
+        return PackageSourceView(self)
+
+    def release(self):
+        """
+        Stop sharing this snapshot with processes forked after this call.
+        """
+
+        _snapshots.pop(self._token, None)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (getSnapshot, (self._token, ))
+
+
+class PackageSourceView(object):
+    """
+    Package source that reads from a snapshot and keeps any changes to
+    itself.
+    """
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self._cfg = snapshot._cfg
+        self._ui = snapshot._ui
+
+        for name in snapshot._maps:
+            setattr(self, name, OverlayDict(getattr(snapshot, name)))
+
+    def load(self):
+        """
+        Views are always loaded.
+        """
+
+    def getClients(self):
+        """
+        Get instances of repository clients.
+        """
+
+        return self._snapshot.getClients()
+
+    def __copy__(self):
+        obj = self.__class__(self._snapshot)
+        for name in self._snapshot._maps:
+            setattr(obj, name, getattr(self, name).copy())
+        return obj
+
+    def __reduce__(self):
+        # Only send the token of the snapshot and the changes made through
+        # this view, the snapshot is inherited by forked processes.
+        return (_restoreView, (self._snapshot, dict(
+            (x, (getattr(self, x)._local, getattr(self, x)._deleted))
+            for x in self._snapshot._maps)))
+
+
+def _restoreView(snapshot, changes):
+    """
+    Recreate a pickled view of a snapshot.
+    """
+
+    view = PackageSourceView(snapshot)
+    for name, (local, deleted) in changes.iteritems():
+        overlay = getattr(view, name)
+        overlay._local = local
+        overlay._deleted = deleted
+    return view
+
+
+def getSnapshot(token):
+    """
+    Get a snapshot that was created in this process or one of its parents.
+    @param token: token of the snapshot
+    @type token: str
+    @return FrozenPackageSource
+    """
+
+    snapshot = _snapshots.get(token)
+    if snapshot is None:
+        raise SharedPackageSourceNotFoundError(token=token)
+    return snapshot
@@ -26,6 +26,7 @@ log = logging.getLogger('updatebot.pkgsource')
 
 import prism_rest_client
 
+from updatebot.lib import profiling
 from updatebot.pkgsource.yumsource import YumSource as PackageSource
 
 class Package(object):
@@ -82,6 +83,7 @@ class PkgCache(PackageSource):
         self._loaded = False
         self._cfg.synthesizeSources = False
 
+    @profiling.profiled('pkgsource.load')
     def load(self):
         """
         Method to parse all package data into data structures listed above.
@@ -96,9 +98,10 @@ class PkgCache(PackageSource):
         self._distro = distro
 
         log.info('fetching packages for %s', self._distro.name)
-        pkgs = self._distro.packages
-        for pkg in pkgs:
-            self._distro._cache[pkg._data.id] = pkg
+        with profiling.phase('pkgsource.fetch'):
+            pkgs = self._distro.packages
+            for pkg in pkgs:
+                self._distro._cache[pkg._data.id] = pkg
         log.info('finished fetching packages')
 
         for pkg in self._distro.packages:
@@ -118,3 +121,17 @@ class PkgCache(PackageSource):
 
         self.finalize()
         self._loaded = True
+
+    def refresh(self):
+        """
+        The pkgcache service does not provide a way to tell what changed.
+        """
+
+        raise NotImplementedError
+
+    def _getDatabaseFingerprint(self):
+        """
+        The pkgcache service does not provide a way to tell what changed.
+        """
+
+        return None
@@ -0,0 +1,401 @@
+#
+# Copyright (c) SAS Institute, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""
+Module for exporting package sources to an indexed sqlite database.
+
+The database holds every source and binary package of a package source, the
+source each binary was built from and the provides, requires and obsoletes of
+each package. It is indexed for lookups by name, NEVRA, location and
+dependency name, so questions like "what provides foo" can be answered
+without loading and scanning the package source.
+
+Example:
+> db = pkgSource.getDatabase()
+> for pkg in db.whatProvides('libfoo.so.1()(64bit)'):
+>     print pkg, db.getSource(pkg)
+"""
+
+import os
+import logging
+import sqlite3
+from collections import namedtuple
+
+log = logging.getLogger('updatebot.pkgsource')
+
+SCHEMA_VERSION = 1
+
+# Dependency lists from the package metadata that are stored, mapped to the
+# table they are stored in.
+DEPENDENCY_TABLES = {
+    'rpm:provides': 'provides',
+    'rpm:requires': 'requires',
+    'rpm:obsoletes': 'obsoletes',
+}
+
+_schema = """
+CREATE TABLE IF NOT EXISTS metadata (
+    key         TEXT PRIMARY KEY,
+    value       TEXT
+);
+
+CREATE TABLE IF NOT EXISTS packages (
+    id              INTEGER PRIMARY KEY,
+    name            TEXT NOT NULL,
+    epoch           TEXT,
+    version         TEXT,
+    release         TEXT,
+    arch            TEXT,
+    location        TEXT,
+    sourcerpm       TEXT,
+    checksum        TEXT,
+    checksumType    TEXT,
+    buildTimestamp  TEXT,
+    isSource        INTEGER NOT NULL,
+    sourceId        INTEGER
+);
+CREATE INDEX IF NOT EXISTS packagesNameIdx ON packages(name);
+CREATE INDEX IF NOT EXISTS packagesNevraIdx
+    ON packages(name, epoch, version, release, arch);
+CREATE INDEX IF NOT EXISTS packagesLocationIdx ON packages(location);
+CREATE INDEX IF NOT EXISTS packagesSourceIdx ON packages(sourceId);
+"""
+
+_depSchema = """
+CREATE TABLE IF NOT EXISTS %(table)s (
+    packageId   INTEGER NOT NULL,
+    name        TEXT NOT NULL,
+    flags       TEXT,
+    epoch       TEXT,
+    version     TEXT,
+    release     TEXT
+);
+CREATE INDEX IF NOT EXISTS %(table)sNameIdx ON %(table)s(name);
+CREATE INDEX IF NOT EXISTS %(table)sPackageIdx ON %(table)s(packageId);
+"""
+
+_packageColumns = ('id', 'name', 'epoch', 'version', 'release', 'arch',
+                   'location', 'sourcerpm', 'checksum', 'checksumType',
+                   'buildTimestamp', 'isSource', 'sourceId', )
+
+
+class PackageInfo(namedtuple('PackageInfo', _packageColumns)):
+    """
+    Package as stored in the database.
+    """
+
+    __slots__ = ()
+
+    def getNevra(self):
+        """
+        Return the name, epoch, version, release, and arch of the package.
+        """
+
+        return (self.name, self.epoch, self.version, self.release, self.arch)
+
+    def __str__(self):
+        return os.path.basename(self.location or self.name)
+
+
+DependencyInfo = namedtuple('DependencyInfo',
+    'name flags epoch version release')
+
+
+class PackageDatabase(object):
+    """
+    Indexed sqlite database of the packages in a package source.
+    """
+
+    def __init__(self, path):
+        """
+        @param path: path to the database file, or :memory:
+        @type path: str
+        """
+
+        self._path = path
+        self._db = sqlite3.connect(path)
+        self._db.text_factory = str
+        self._createSchema()
+
+    def _createSchema(self):
+        version = None
+        if 'metadata' in self._getTables():
+            cu = self._db.execute(
+                "SELECT value FROM metadata WHERE key = 'schemaVersion'")
+            row = cu.fetchone()
+            version = row and int(row[0]) or None
+
+        # The database is only a cache of the package source, so start over
+        # rather than migrating old schemas.
+        if version != SCHEMA_VERSION:
+            for table in self._getTables():
+                self._db.execute('DROP TABLE %s' % table)
+
+        self._db.executescript(_schema)
+        for table in DEPENDENCY_TABLES.itervalues():
+            self._db.executescript(_depSchema % {'table': table})
+        self._setMetadata('schemaVersion', str(SCHEMA_VERSION))
+        self._db.commit()
+
+    def _getTables(self):
+        cu = self._db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")
+        return [ x[0] for x in cu ]
+
+    def _setMetadata(self, key, value):
+        self._db.execute('INSERT OR REPLACE INTO metadata (key, value) '
+                         'VALUES (?, ?)', (key, value))
+
+    def getFingerprint(self):
+        """
+        Get the fingerprint of the package source that was last exported.
+        @return fingerprint or None if nothing has been exported.
+        """
+
+        cu = self._db.execute(
+            "SELECT value FROM metadata WHERE key = 'fingerprint'")
+        row = cu.fetchone()
+        return row and row[0] or None
+
+    def export(self, pkgSource, fingerprint=None):
+        """
+        Replace the contents of the database with the packages of a loaded
+        package source.
+        @param pkgSource: package source to export
+        @type pkgSource: updatebot.pkgsource.common.BasePackageSource
+        @param fingerprint: identifies the repository metadata the package
+                            source was loaded from, used to tell if the
+                            database is out of date.
+        @type fingerprint: str
+        """
+
+        log.info('exporting package source to %s' % self._path)
+
+        db = self._db
+        db.execute('DELETE FROM packages')
+        for table in DEPENDENCY_TABLES.itervalues():
+            db.execute('DELETE FROM %s' % table)
+        db.execute("DELETE FROM metadata WHERE key = 'fingerprint'")
+
+        # {pkg: packageId}
+        sourceIds = {}
+        for srcPkg in pkgSource.srcPkgMap:
+            sourceIds[srcPkg] = self._addPackage(srcPkg, True, None)
+
+        count = len(sourceIds)
+        for binPkgs in pkgSource.binNameMap.itervalues():
+            for binPkg in binPkgs:
+                srcPkg = pkgSource.binPkgMap.get(binPkg)
+                self._addPackage(binPkg, False, sourceIds.get(srcPkg))
+                count += 1
+
+        if fingerprint is not None:
+            self._setMetadata('fingerprint', fingerprint)
+
+        db.commit()
+
+        log.info('exported %s packages' % count)
+
+    def _addPackage(self, pkg, isSource, sourceId):
+        """
+        Insert a package and its dependencies.
+        @return id of the new package
+        """
+
+        cu = self._db.execute('INSERT INTO packages (name, epoch, version, '
+            'release, arch, location, sourcerpm, checksum, checksumType, '
+            'buildTimestamp, isSource, sourceId) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (pkg.name, pkg.epoch, pkg.version, pkg.release, pkg.arch,
+             pkg.location, getattr(pkg, 'sourcerpm', None),
+             getattr(pkg, 'checksum', None),
+             getattr(pkg, 'checksumType', None),
+             getattr(pkg, 'buildTimestamp', None),
+             int(isSource), sourceId))
+        pkgId = cu.lastrowid
+
+        for node in getattr(pkg, 'format', None) or ():
+            table = DEPENDENCY_TABLES.get(node.getName())
+            if table is None:
+                continue
+
+            deps = []
+            for child in node.iterChildren():
+                if hasattr(child, 'isspace') and child.isspace():
+                    continue
+                deps.append((pkgId, child.name, getattr(child, 'flags', None),
+                             getattr(child, 'epoch', None),
+                             getattr(child, 'version', None),
+                             getattr(child, 'release', None)))
+
+            self._db.executemany('INSERT INTO %s (packageId, name, flags, '
+                'epoch, version, release) VALUES (?, ?, ?, ?, ?, ?)' % table,
+                deps)
+
+        return pkgId
+
+    def _getPackages(self, where, args=()):
+        cu = self._db.execute('SELECT %s FROM packages WHERE %s'
+                              % (', '.join(_packageColumns), where), args)
+        return [ PackageInfo(*x) for x in cu ]
+
+    def getPackages(self, name, isSource=None):
+        """
+        Get all packages with a given name.
+        @param name: package name
+        @type name: str
+        @param isSource: only return source packages if True, or binary
+                         packages if False.
+        @type isSource: boolean
+        @return [PackageInfo, ...]
+        """
+
+        if isSource is None:
+            return self._getPackages('name = ?', (name, ))
+        return self._getPackages('name = ? AND isSource = ?',
+                                 (name, int(isSource)))
+
+    def getPackagesByNevra(self, nevra):
+        """
+        Get all packages matching a name, epoch, version, release and arch.
+        @param nevra: (name, epoch, version, release, arch)
+        @type nevra: tuple
+        @return [PackageInfo, ...]
+        """
+
+        # Use IS for the epoch, packages without an epoch store NULL.
+        return self._getPackages('name = ? AND epoch IS ? AND version = ? AND '
+                                 'release = ? AND arch = ?', tuple(nevra))
+
+    def getPackageByLocation(self, location):
+        """
+        Get the package at a location.
+        @param location: location of the package in the repository
+        @type location: str
+        @return PackageInfo or None
+        """
+
+        pkgs = self._getPackages('location = ?', (location, ))
+        return pkgs and pkgs[0] or None
+
+    def getNames(self, isSource=False):
+        """
+        Get the names of all binary or source packages.
+        @return set of package names
+        """
+
+        cu = self._db.execute('SELECT DISTINCT name FROM packages '
+                              'WHERE isSource = ?', (int(isSource), ))
+        return set([ x[0] for x in cu ])
+
+    def getSource(self, pkg):
+        """
+        Get the source package a binary was built from.
+        @param pkg: binary package
+        @type pkg: PackageInfo
+        @return PackageInfo or None
+        """
+
+        if pkg.sourceId is None:
+            return None
+        pkgs = self._getPackages('id = ?', (pkg.sourceId, ))
+        return pkgs and pkgs[0] or None
+
+    def getBinaries(self, srcPkg):
+        """
+        Get the binary packages built from a source package.
+        @param srcPkg: source package
+        @type srcPkg: PackageInfo
+        @return [PackageInfo, ...]
+        """
+
+        return self._getPackages('sourceId = ?', (srcPkg.id, ))
+
+    def _whatDepends(self, table, name):
+        return self._getPackages('id IN (SELECT packageId FROM %s '
+                                 'WHERE name = ?)' % table, (name, ))
+
+    def whatProvides(self, name):
+        """
+        Get the packages that provide a capability.
+        @param name: name of the provided capability
+        @type name: str
+        @return [PackageInfo, ...]
+        """
+
+        return self._whatDepends('provides', name)
+
+    def whatRequires(self, name):
+        """
+        Get the packages that require a capability.
+        @param name: name of the required capability
+        @type name: str
+        @return [PackageInfo, ...]
+        """
+
+        return self._whatDepends('requires', name)
+
+    def whatObsoletes(self, name):
+        """
+        Get the packages that obsolete a package name.
+        @param name: name of the obsoleted package
+        @type name: str
+        @return [PackageInfo, ...]
+        """
+
+        return self._whatDepends('obsoletes', name)
+
+    def _getDependencies(self, table, pkg):
+        cu = self._db.execute('SELECT name, flags, epoch, version, release '
+                              'FROM %s WHERE packageId = ?' % table, (pkg.id, ))
+        return [ DependencyInfo(*x) for x in cu ]
+
+    def getProvides(self, pkg):
+        """
+        Get the capabilities a package provides.
+        @param pkg: package
+        @type pkg: PackageInfo
+        @return [DependencyInfo, ...]
+        """
+
+        return self._getDependencies('provides', pkg)
+
+    def getRequires(self, pkg):
+        """
+        Get the capabilities a package requires.
+        @param pkg: package
+        @type pkg: PackageInfo
+        @return [DependencyInfo, ...]
+        """
+
+        return self._getDependencies('requires', pkg)
+
+    def getObsoletes(self, pkg):
+        """
+        Get the packages a package obsoletes.
+        @param pkg: package
+        @type pkg: PackageInfo
+        @return [DependencyInfo, ...]
+        """
+
+        return self._getDependencies('obsoletes', pkg)
+
+    def close(self):
+        """
+        Close the database.
+        """
+
+        self._db.close()
@@ -27,6 +27,7 @@ from conary.lib import graph
 import artifactory
 
 from ..config import MavenCoordinateGlobList
+from ..lib import profiling
 from ..lib import util
 
 
@@ -106,15 +107,20 @@ class PomSource(object):
             return coordinate in self._inclusions
 
     @loaded
+    @profiling.profiled('pkgsource.finalize')
     def finalize(self):
         for node in self.pkgQueue.iterNodes():
             self.pkgQueue.addEdges((node, dep, 1) for dep in node.dependencies)
 
     @loaded
+    @profiling.profiled('pkgsource.load')
     def load(self):
         client = artifactory.Client(self._cfg)
         log.info('loading repository data')
-        self.loadFromClient(client)
+        try:
+            self.loadFromClient(client)
+        finally:
+            client.close()
         self.finalize()
         self._loaded = True
 
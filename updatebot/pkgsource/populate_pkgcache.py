@@ -16,12 +16,14 @@
 
 import os
 import hashlib
+import threading
 
 import prism_rest_client
 from prism_rest_client.lib.util import AttrDict
 
 from updatebot import cmdline
 from updatebot import pkgsource
+from updatebot.lib import util
 
 import logging
 log = logging.getLogger('updatebot.pkgsource.populate_pkgcache')
@@ -45,6 +47,13 @@ class PkgCacheLoader(object):
         self.pkgSource = pkgsource.PackageSource(cfg, ui)
         self.api = prism_rest_client.open(cfg.pkgcacheUri)
 
+        # Upload threads each use their own client, since the transaction
+        # is set in the client headers.
+        self._local = threading.local()
+
+        # {pkg: hash}
+        self._checksums = {}
+
     def load(self):
         self.loadPkgSource()
         self.parsePkgSourceData()
@@ -109,8 +118,12 @@ class PkgCacheLoader(object):
         return _pkg
 
     def _getChecksum(self, pkg):
-        return (pkg.checksum or hashlib.sha256(pkg.location + pkg.name +
-            pkg.epoch + pkg.version + pkg.release + pkg.arch).hexdigest())
+        checksum = self._checksums.get(pkg)
+        if checksum is None:
+            checksum = self._checksums[pkg] = (pkg.checksum or
+                hashlib.sha256(pkg.location + pkg.name + pkg.epoch +
+                    pkg.version + pkg.release + pkg.arch).hexdigest())
+        return checksum
 
     def _findRepo(self, pkg, repos):
         """
@@ -160,53 +173,127 @@ class PkgCacheLoader(object):
                 idx += 1
         return os.path.sep.join(commonPath)
 
-    def loadPkgCache(self):
-        log.info('creating transaction')
-        t = self.api.transactions.append({})
+    def _begin(self, api):
+        """
+        Start a transaction that all following requests made with the given
+        client are part of.
+        """
 
-        self.api._cache.client.headers = {
+        t = api.transactions.append({})
+        api._cache.client.headers = {
             'X-TransactionId': t.transaction_id,
         }
+        return t
 
+    def _commit(self, api, t):
+        t.committed = True
+        t.persist()
+        api._cache.client.headers = {}
+
+    def _getDistro(self, api):
         name = self._cfg.platformName
         version = self._cfg.upstreamProductVersion
 
-        distros = self.api.distros
+        distros = api.distros
         if (name, version) not in [ (x.name, x.version) for x in distros ]:
-            distro = distros.append({
+            return distros.append({
                 'name': name,
                 'version': version,
             })
         else:
-            distro = dict(((x.name, x.version), x) for x in distros).get(
+            return dict(((x.name, x.version), x) for x in distros).get(
                     (name, version))
 
-        self._loadPkgCache(distro, self._sourcePackages)
-        self._loadPkgCache(distro, self._packages)
+    def _getThreadRepos(self):
+        """
+        Get the pkgcache repositories of the distro with this thread's client.
+        @return (client, {repoName: repo})
+        """
 
-        log.info('committing transaction')
-        t.committed = True
-        t.persist()
+        repos = getattr(self._local, 'repos', None)
+        if repos is None:
+            api = self._local.api = prism_rest_client.open(
+                self._cfg.pkgcacheUri)
+            distro = self._getDistro(api)
+            repos = self._local.repos = dict((x.name, x)
+                                             for x in distro.repos)
+        return self._local.api, repos
+
+    def loadPkgCache(self):
+        log.info('creating transaction')
+        t = self._begin(self.api)
 
-    def _loadPkgCache(self, distro, packages):
+        distro = self._getDistro(self.api)
+
+        # {repoName: set(hash, ...)}
+        hashes = {}
         distro_repos = distro.repos
         repos = dict((x.name, x) for x in distro_repos)
-
         for name, obj in self._repos.iteritems():
             if name in repos:
-                repo = repos[name]
                 log.info('fetching package hashes for %s' % name)
-                pkg_hashes = repo.package_hashes.hashes
+                hashes[name] = set(repos[name].package_hashes.hashes)
             else:
                 log.info('adding repository %s' % name)
-                repo = distro_repos.append(obj)
-                pkg_hashes = []
+                distro_repos.append(obj)
+                hashes[name] = set()
 
-            for pkg in packages.get(name, []):
-                if pkg.hash in pkg_hashes:
-                    log.info('found package in cache %s' % pkg.nevra.name)
-                    continue
+        log.info('committing transaction')
+        self._commit(self.api, t)
+
+        # Sources are committed before any binaries that refer to them.
+        self._loadPkgCache(self._sourcePackages, hashes)
+        self._loadPkgCache(self._packages, hashes)
+
+    def _loadPkgCache(self, packages, hashes):
+        """
+        Upload packages in batches, each batch in its own transaction.
+        @param packages: packages to upload
+        @type packages: dict(repoName=[pkg, ...])
+        @param hashes: hashes of the packages already in each repository
+        @type hashes: dict(repoName=set(hash, ...))
+        """
+
+        batchSize = max(1, self._cfg.pkgcacheBatchSize)
+
+        batches = []
+        total = 0
+        for name in sorted(self._repos):
+            pkgs = packages.get(name, [])
+            if pkgs and self._cfg.pkgcacheOnlyChanged:
+                cached = len(pkgs)
+                pkgs = [ x for x in pkgs if x.hash not in hashes[name] ]
+                log.info('found %s of %s packages in cache for %s'
+                         % (cached - len(pkgs), cached, name))
+
+            for idx in range(0, len(pkgs), batchSize):
+                batches.append((name, pkgs[idx:idx + batchSize]))
+            total += len(pkgs)
+
+        done = 0
+        for (name, pkgs), count in util.iterThreaded(self._uploadBatch,
+                batches, workers=self._cfg.pkgcacheUploadThreads):
+            hashes[name].update([ x.hash for x in pkgs ])
+            done += count
+            log.info('uploaded %s of %s packages' % (done, total))
+
+    def _uploadBatch(self, batch):
+        """
+        Upload a batch of packages to one repository in a transaction.
+        @param batch: (repoName, [pkg, ...])
+        @type batch: tuple
+        @return number of packages uploaded
+        """
+
+        name, pkgs = batch
+        api, repos = self._getThreadRepos()
+        repo = repos[name]
+
+        t = self._begin(api)
+        for pkg in pkgs:
+            p = repo.packages.append(pkg)
+            log.debug('adding %(name)s, %(epoch)s, %(version)s, '
+                '%(release)s, %(arch)s to ' % p.nevra._data + repo.name)
+        self._commit(api, t)
 
-                p = repo.packages.append(pkg)
-                log.info('adding %(name)s, %(epoch)s, %(version)s, '
-                    '%(release)s, %(arch)s to ' % p.nevra._data + repo.name)
+        return len(pkgs)
@@ -71,6 +71,13 @@ class Client(object):
     def __init__(self, path):
         self._path = path
 
+    def getChecksum(self, name):
+        """
+        There is no metadata to checksum when walking a package tree.
+        """
+
+        return None
+
     def getPackageDetail(self):
         """
         Walk the specified path to find rpms.
@@ -118,7 +125,18 @@ class UrlClient(Client):
     Url based client.
     """
 
-    walkMethod = urlwalker.walk
+    def __init__(self, path, workers=4, cacheDir=None):
+        Client.__init__(self, path)
+        self._workers = workers
+        self._cacheDir = cacheDir
+
+    def walkMethod(self, path):
+        """
+        Walk the url tree, fetching directory listings concurrently.
+        """
+
+        return urlwalker.walk(path, workers=self._workers,
+                              cacheDir=self._cacheDir)
 
 
 class RpmSource(PackageSource):
@@ -183,7 +201,8 @@ class _RpmSource(PackageSource):
 
         log.info('loading %s' % fullUrl)
 
-        client = UrlClient(fullUrl)
+        client = UrlClient(fullUrl, workers=self._cfg.urlWalkerWorkers,
+                           cacheDir=self._cfg.urlWalkerCacheDir)
         self.loadFromClient(client, basePath=basePath)
 
         self.finalize()
@@ -20,12 +20,15 @@ Module for interacting with packages in multiple yum repositories.
 """
 
 import os
+import hashlib
 import itertools
 import logging
 
 import repomd
 from updatebot.lib import util
+from updatebot.lib import profiling
 from updatebot.pkgsource.common import BasePackageSource
+from updatebot.pkgsource.common import PackageSourceDelta
 
 from updatebot.errors import CanNotFindSourceForBinariesError
 
@@ -62,10 +65,22 @@ class YumSource(BasePackageSource):
         # {binPkg: set([archStr, ..])}
         self._repoMap = dict()
 
+        # packages loaded from each repository, used to find what changed
+        # when refreshing.
+        # {basePath: {location: pkg}}
+        self._repoPackages = dict()
+
+        # {basePath: primary metadata checksum}
+        self._repoChecksums = dict()
+
+        # {pkg: {basePath: pkg}}
+        self._pkgRepos = dict()
+
     def setLoaded(self):
         self._loaded = True
 
     @loaded
+    @profiling.profiled('pkgsource.load')
     def load(self):
         """
         Load package source based on config data.
@@ -73,7 +88,9 @@ class YumSource(BasePackageSource):
 
         for repo in self._cfg.repositoryPaths:
             log.info('loading repository data %s' % repo)
-            client = repomd.Client(self._cfg.repositoryUrl + '/' + repo)
+            with profiling.phase('pkgsource.fetch'):
+                client = repomd.Client(self._cfg.repositoryUrl + '/' + repo,
+                    cacheDir=self._cfg.repositoryCacheDir)
             archStr = self._cfg.repositoryArch.get(repo, None)
             self.loadFromClient(client, repo, archStr=archStr)
             self._clients[repo] = client
@@ -81,6 +98,384 @@ class YumSource(BasePackageSource):
         self.finalize()
         self._loaded = True
 
+    @profiling.profiled('pkgsource.refresh')
+    def refresh(self):
+        """
+        Fetch the repository metadata again and apply the packages that were
+        added or removed since the last load or refresh. Repositories with
+        unchanged primary metadata are not parsed.
+        @return changes that were applied
+        @rtype updatebot.pkgsource.common.PackageSourceDelta
+        """
+
+        delta = PackageSourceDelta()
+
+        if not self._loaded:
+            self.load()
+            delta.repositories.extend(self._cfg.repositoryPaths)
+            delta.addedSources.update(self.srcPkgMap)
+            delta.addedBinaries.update([ x for x in self.binPkgMap
+                                         if x.arch not in ('src', 'nosrc') ])
+            delta.useChanges.update(self.useMap)
+            return delta
+
+        # [(basePath, pkg), ...]
+        added = []
+        removed = []
+
+        # Drop repositories that are no longer configured.
+        for repo in self._repoPackages.keys():
+            if repo not in self._cfg.repositoryPaths:
+                log.info('removing repository data %s' % repo)
+                for pkg in self._repoPackages.pop(repo).itervalues():
+                    removed.append((repo, pkg))
+                    self._pkgRepos.get(pkg, {}).pop(repo, None)
+                self._repoChecksums.pop(repo, None)
+                self._clients.pop(repo, None)
+                delta.repositories.append(repo)
+
+        for repo in self._cfg.repositoryPaths:
+            with profiling.phase('pkgsource.fetch'):
+                client = repomd.Client(self._cfg.repositoryUrl + '/' + repo,
+                    cacheDir=self._cfg.repositoryCacheDir)
+            self._clients[repo] = client
+
+            checksum = client.getChecksum('primary')
+            if (checksum is not None and
+                checksum == self._repoChecksums.get(repo)):
+                log.info('repository data unchanged %s' % repo)
+                continue
+
+            log.info('refreshing repository data %s' % repo)
+            delta.repositories.append(repo)
+
+            old = self._repoPackages.get(repo, dict())
+            new = dict([ (x.location, x)
+                         for x in self._getPackages(client, repo) ])
+
+            unchanged = set()
+            for location, pkg in new.iteritems():
+                oldPkg = old.get(location)
+                if oldPkg is not None and self._isSamePackage(oldPkg, pkg):
+                    # Keep the package objects that are already in the maps.
+                    new[location] = oldPkg
+                    unchanged.add(oldPkg)
+                else:
+                    added.append((repo, pkg))
+
+            for location, pkg in old.iteritems():
+                if new.get(location) is not pkg:
+                    removed.append((repo, pkg))
+                    # The package may still be available from another
+                    # location in this repository.
+                    if pkg not in unchanged:
+                        self._pkgRepos.get(pkg, {}).pop(repo, None)
+
+            self._repoPackages[repo] = new
+            self._repoChecksums[repo] = checksum
+
+        if not added and not removed:
+            return delta
+
+        # Remove binaries before sources so that only binaries that are
+        # still available are mapped again when their source is removed.
+        removed.sort(key=lambda x: x[1].sourcerpm in ('', None))
+        for repo, pkg in removed:
+            self._removePackage(repo, pkg, delta)
+
+        srcKeys = set(self._srcMap)
+        addedBins = []
+        for repo, pkg in added:
+            isBinary = pkg.sourcerpm != '' and pkg.sourcerpm is not None
+            if isBinary and pkg not in self.binPkgMap:
+                addedBins.append(pkg)
+            archStr = self._cfg.repositoryArch.get(repo, None)
+            self._addPackage(pkg, repo, archStr=archStr)
+            if isBinary:
+                self._updateRepoMap(pkg)
+
+        # Map the new packages the same way finalize does for a full load.
+        if self._cfg.synthesizeSources:
+            self._createSrcMap()
+
+        # Sources that were dropped for not having any binaries stay in
+        # _srcMap. Restore the ones that now have binaries so that they are
+        # matched like new sources.
+        rpmKeys = set([ (x[0], x[2], x[3], x[4]) for x in self._rpmMap ])
+        for key, srcPkg in self._srcMap.iteritems():
+            if (key in srcKeys and srcPkg not in self.srcPkgMap and
+                (key[0], key[2], key[3], key[4]) in rpmKeys):
+                self._srcPkgs.add(srcPkg)
+                self.srcNameMap.setdefault(srcPkg.name, set()).add(srcPkg)
+                srcKeys.discard(key)
+
+        newSources = [ y for x, y in self._srcMap.iteritems()
+                       if x not in srcKeys ]
+        self._matchSources(newSources)
+        self._matchBinaries()
+
+        # Sources that lost all of their binaries are dropped, as they would
+        # be by a full load.
+        for srcPkg in list(delta.updatedSources):
+            if (srcPkg in self.srcPkgMap and
+                not [ x for x in self.srcPkgMap[srcPkg]
+                      if x.arch not in ('src', 'nosrc') ]):
+                log.info('removing source without binary rpms: %s' % srcPkg)
+
+                # Synthesized sources go away with their binaries.
+                if not self._pkgRepos.get(srcPkg):
+                    self._dropLocation(srcPkg.location, srcPkg)
+                    self._dropLocation(os.path.basename(srcPkg.location),
+                                       srcPkg)
+                    self._removeSource(srcPkg, delta)
+                    continue
+
+                # Like _matchSources, keep sources that are still in a
+                # repository in _srcMap and the locationMap, so that they are
+                # matched again if their binaries come back.
+                for pkg in self.srcPkgMap.pop(srcPkg):
+                    self.binPkgMap.pop(pkg, None)
+                names = self.srcNameMap.get(srcPkg.name)
+                if names is not None:
+                    names.discard(srcPkg)
+                    if not names:
+                        del self.srcNameMap[srcPkg.name]
+                self._srcPkgs.discard(srcPkg)
+                delta.removedSources.add(srcPkg)
+
+        delta.useChanges = self._updateUseMap()
+        self._relocateNosrc(newSources)
+        self._mergeSources(required=False)
+
+        # Packages that were removed and added back, ie. because they moved
+        # between repositories, are reported as updates.
+        for srcPkg in newSources:
+            if srcPkg not in self.srcPkgMap:
+                continue
+            if srcPkg in delta.removedSources:
+                delta.updatedSources.add(srcPkg)
+            else:
+                delta.addedSources.add(srcPkg)
+
+        for binPkg in addedBins:
+            if binPkg not in self.binPkgMap:
+                continue
+            if binPkg in delta.removedBinaries:
+                delta.removedBinaries.discard(binPkg)
+            else:
+                delta.addedBinaries.add(binPkg)
+            delta.updatedSources.add(self.binPkgMap[binPkg])
+
+        delta.updatedSources = set([ x for x in delta.updatedSources
+            if x in self.srcPkgMap and x not in delta.addedSources ])
+        delta.removedSources = set([ x for x in delta.removedSources
+            if x not in self.srcPkgMap ])
+
+        log.info('refreshed package source: %s' % delta)
+
+        return delta
+
+    def _getDatabaseFingerprint(self):
+        """
+        Identify the package source by the checksums of the primary metadata
+        of each repository and the config that changes how the maps are
+        built. Only repomd.xml is fetched if the source is not loaded.
+        """
+
+        checksums = []
+        for repo in self._cfg.repositoryPaths:
+            if self._loaded:
+                checksum = self._repoChecksums.get(repo)
+            else:
+                client = repomd.Client(self._cfg.repositoryUrl + '/' + repo,
+                    cacheDir=self._cfg.repositoryCacheDir)
+                checksum = client.getChecksum('primary')
+            if checksum is None:
+                return None
+            checksums.append((repo, checksum))
+
+        cfg = self._cfg
+        key = repr((
+            self.__class__.__name__,
+            cfg.repositoryUrl,
+            checksums,
+            sorted(cfg.excludeArch),
+            cfg.ignore32bitPackages,
+            cfg.synthesizeSources,
+            sorted(cfg.repositoryArch.items()),
+            cfg.repositoryPackage,
+            [ (x, y[0]) for x, y in cfg.nosrcFilter ],
+            cfg.mergeSources,
+        ))
+
+        return hashlib.sha1(key).hexdigest()
+
+    @staticmethod
+    def _isSamePackage(a, b):
+        """
+        Check if two packages from the same location have the same contents.
+        """
+
+        return (a.getNevra() == b.getNevra() and
+                a.checksumType == b.checksumType and
+                a.checksum == b.checksum)
+
+    def _dropLocation(self, location, pkg):
+        """
+        Remove a location from the locationMap if it refers to pkg.
+        """
+
+        other = self.locationMap.get(location)
+        if other is not None and other == pkg:
+            del self.locationMap[location]
+
+    def _updateRepoMap(self, pkg):
+        """
+        Recompute the architectures of the repositories a binary is
+        available from.
+        """
+
+        archs = set()
+        for repo in self._pkgRepos.get(pkg, ()):
+            archStr = self._cfg.repositoryArch.get(repo, None)
+            # 64bit packages are not allowed in a 32bit repository.
+            if archStr and not (pkg.arch == 'x86_64' and archStr == 'x86'):
+                archs.add(archStr)
+
+        if archs:
+            self._repoMap[pkg] = archs
+        else:
+            self._repoMap.pop(pkg, None)
+
+    def _removePackage(self, basePath, pkg, delta):
+        """
+        Remove a package that is no longer available from a repository.
+        """
+
+        self._dropLocation(pkg.location, pkg)
+
+        isSource = pkg.sourcerpm == '' or pkg.sourcerpm is None
+        if isSource and self._cfg.synthesizeSources:
+            self._dropLocation(os.path.basename(pkg.location), pkg)
+
+        # Still available from another repository, make sure that the maps
+        # refer to a location that still exists.
+        others = self._pkgRepos.get(pkg)
+        if others:
+            self._replacePackage(pkg, others.values()[0])
+            if not isSource:
+                self._updateRepoMap(pkg)
+            return
+
+        self._pkgRepos.pop(pkg, None)
+
+        if isSource:
+            self._removeSource(pkg, delta)
+        else:
+            self._removeBinary(pkg, delta)
+
+    def _replacePackage(self, pkg, other):
+        """
+        Replace a package in all maps with an equal package from another
+        location.
+        """
+
+        if pkg.sourcerpm == '' or pkg.sourcerpm is None:
+            names = self.srcNameMap.get(pkg.name)
+        else:
+            names = self.binNameMap.get(pkg.name)
+        if names is not None and pkg in names:
+            names.discard(pkg)
+            names.add(other)
+
+        if pkg in self._srcPkgs:
+            self._srcPkgs.discard(pkg)
+            self._srcPkgs.add(other)
+
+        srcPkg = self._srcMap.get(pkg.getNevra())
+        if srcPkg is not None and srcPkg == pkg:
+            self._srcMap[pkg.getNevra()] = other
+
+        for pkgMap in (self._repoMap, self.obsoletesMap):
+            if pkg in pkgMap:
+                pkgMap[other] = pkgMap.pop(pkg)
+
+        if pkg in self.srcPkgMap:
+            pkgs = self.srcPkgMap.pop(pkg)
+            if pkg in pkgs:
+                pkgs.discard(pkg)
+                pkgs.add(other)
+            self.srcPkgMap[other] = pkgs
+            # Assignment would keep the existing key.
+            self.binPkgMap.pop(pkg, None)
+            for binPkg in pkgs:
+                self.binPkgMap[binPkg] = other
+
+        elif pkg in self.binPkgMap:
+            srcPkg = self.binPkgMap.pop(pkg)
+            self.binPkgMap[other] = srcPkg
+            pkgs = self.srcPkgMap.get(srcPkg)
+            if pkgs is not None and pkg in pkgs:
+                pkgs.discard(pkg)
+                pkgs.add(other)
+
+    def _removeBinary(self, pkg, delta):
+        """
+        Remove a binary package from all maps.
+        """
+
+        names = self.binNameMap.get(pkg.name)
+        if names is None or pkg not in names:
+            # Binaries excluded by _procBin were never added.
+            return
+
+        names.discard(pkg)
+        if not names:
+            del self.binNameMap[pkg.name]
+
+        self.obsoletesMap.pop(pkg, None)
+        self._repoMap.pop(pkg, None)
+
+        srcPkg = self.binPkgMap.pop(pkg, None)
+        if srcPkg is not None and srcPkg in self.srcPkgMap:
+            self.srcPkgMap[srcPkg].discard(pkg)
+            delta.updatedSources.add(srcPkg)
+
+        delta.removedBinaries.add(pkg)
+
+    def _removeSource(self, pkg, delta):
+        """
+        Remove a source package from all maps. Binaries of the source that
+        are still available are mapped again like new binaries.
+        """
+
+        names = self.srcNameMap.get(pkg.name)
+        if names is not None:
+            names.discard(pkg)
+            if not names:
+                del self.srcNameMap[pkg.name]
+
+        self._srcPkgs.discard(pkg)
+
+        other = self._srcMap.get(pkg.getNevra())
+        if other is not None and other == pkg:
+            del self._srcMap[pkg.getNevra()]
+
+        self.binPkgMap.pop(pkg, None)
+        for binPkg in self.srcPkgMap.pop(pkg, ()):
+            srcPkg = self.binPkgMap.get(binPkg)
+            if (binPkg.arch in ('src', 'nosrc') or srcPkg is None or
+                srcPkg != pkg):
+                continue
+
+            del self.binPkgMap[binPkg]
+            srcName, srcVersion, srcRelease = self._parseSourceRpm(
+                binPkg.sourcerpm)
+            rpmMapKey = (srcName, binPkg.epoch, srcVersion, srcRelease, 'src')
+            self._rpmMap.setdefault(rpmMapKey, set()).add(binPkg)
+
+        delta.removedSources.add(pkg)
+
     @loaded
     def loadFromUrl(self, url, basePath='', archStr=None):
         """
@@ -93,7 +488,9 @@ class YumSource(BasePackageSource):
         """
 
         log.info('loading repository data %s/%s' % (url, basePath))
-        client = repomd.Client(url + '/' + basePath)
+        with profiling.phase('pkgsource.fetch'):
+            client = repomd.Client(url + '/' + basePath,
+                                   cacheDir=self._cfg.repositoryCacheDir)
         self.loadFromClient(client, basePath=basePath, archStr=archStr)
 
     @loaded
@@ -107,7 +504,33 @@ class YumSource(BasePackageSource):
         @type basePath: string
         """
 
-        for pkg in client.getPackageDetail():
+        self._repoChecksums[basePath] = client.getChecksum('primary')
+        packages = self._repoPackages.setdefault(basePath, dict())
+
+        for pkg in self._getPackages(client, basePath):
+            packages[pkg.location] = pkg
+            self._addPackage(pkg, basePath, archStr=archStr)
+
+    def _getPackages(self, client, basePath):
+        """
+        Get the packages from a repository that should be included in the
+        package source.
+        @param client: client object for extracting data from the repo metadata
+        @type client: repomd.Client
+        @param basePath: path to prefix location metadata with
+        @type basePath: string
+        @return [repomd.packagexml.PackageRecord, ...]
+        """
+
+        with profiling.phase('pkgsource.parse'):
+            packages = client.getPackageDetail()
+
+        # Names, versions and dependency names shared by the records of this
+        # repository, dropped once the records have been created.
+        strings = dict()
+
+        records = []
+        for pkg in packages:
             # ignore the 32-bit compatibility libs - we will
             # simply use the 32-bit components from the repository
             if self._cfg.ignore32bitPackages and '32bit' in pkg.name:
@@ -117,6 +540,10 @@ class YumSource(BasePackageSource):
             if pkg.arch in self._excludeArch:
                 continue
 
+            # Keep a compact copy rather than the parsed xml node.
+            pkg = repomd.packagexml.PackageRecord.fromPackage(pkg,
+                strings=strings)
+
             assert '-' not in pkg.version
             assert '-' not in pkg.release
 
@@ -125,12 +552,24 @@ class YumSource(BasePackageSource):
             if self._excludeLocation(pkg.location):
                 continue
 
-            # Source RPM is one without a "sourcerpm" element
-            if pkg.sourcerpm == '' or pkg.sourcerpm is None:
-                self._procSrc(pkg)
-            else:
-                self._procBin(pkg, archStr=archStr)
+            records.append(pkg)
 
+        return records
+
+    def _addPackage(self, pkg, basePath, archStr=None):
+        """
+        Add a package from a repository to the package source.
+        """
+
+        self._pkgRepos.setdefault(pkg, dict())[basePath] = pkg
+
+        # Source RPM is one without a "sourcerpm" element
+        if pkg.sourcerpm == '' or pkg.sourcerpm is None:
+            self._procSrc(pkg)
+        else:
+            self._procBin(pkg, archStr=archStr)
+
+    @profiling.profiled('pkgsource._procSrc', detail=False)
     def _procSrc(self, package):
         """
         Process source rpms.
@@ -160,6 +599,7 @@ class YumSource(BasePackageSource):
         self._srcMap[(package.name, package.epoch, package.version,
                       package.release, package.arch)] = package
 
+    @profiling.profiled('pkgsource._procBin', detail=False)
     def _procBin(self, package, archStr=None):
         """
         Process binary rpms.
@@ -173,15 +613,8 @@ class YumSource(BasePackageSource):
                      'repository' % package)
             return
 
-        # FIXME: There should be a better way to figure out the tuple that
-        #        represents the hash of the srcPkg.
-        srcParts = package.sourcerpm.split('-')
-        srcName = '-'.join(srcParts[:-2])
-        srcVersion = srcParts[-2]
-        if srcParts[-1].endswith('.src.rpm'):
-            srcRelease = srcParts[-1][:-8] # remove '.src.rpm'
-        elif srcParts[-1].endswith('.nosrc.rpm'):
-            srcRelease = srcParts[-1][:-10]
+        srcName, srcVersion, srcRelease = self._parseSourceRpm(
+            package.sourcerpm)
 
         # Change the source rpm for all -32bit packages to avoid having a binary
         # that only contains a build log.
@@ -227,6 +660,25 @@ class YumSource(BasePackageSource):
             else:
                 self._repoMap.setdefault(package, set()).add(archStr)
 
+    @staticmethod
+    def _parseSourceRpm(sourcerpm):
+        """
+        Split the source rpm file name of a binary into name, version and
+        release.
+        """
+
+        # FIXME: There should be a better way to figure out the tuple that
+        #        represents the hash of the srcPkg.
+        srcParts = sourcerpm.split('-')
+        srcName = '-'.join(srcParts[:-2])
+        srcVersion = srcParts[-2]
+        if srcParts[-1].endswith('.src.rpm'):
+            srcRelease = srcParts[-1][:-8] # remove '.src.rpm'
+        elif srcParts[-1].endswith('.nosrc.rpm'):
+            srcRelease = srcParts[-1][:-10]
+
+        return srcName, srcVersion, srcRelease
+
     def _excludeLocation(self, location):
         """
         Method for filtering packages based on location.
@@ -235,6 +687,7 @@ class YumSource(BasePackageSource):
         return False
 
     @loaded
+    @profiling.profiled('pkgsource.finalize')
     def finalize(self):
         """
         Make some final datastructures now that we are done populating object.
@@ -245,12 +698,25 @@ class YumSource(BasePackageSource):
         if self._cfg.synthesizeSources:
             self._createSrcMap()
 
+        self._matchSources(self._srcPkgs)
+        self._matchBinaries()
+        self._updateUseMap()
+        self._relocateNosrc(self.srcPkgMap.keys())
+        self._mergeSources()
+
+    def _matchSources(self, srcPkgs):
+        """
+        Map source packages to the binaries built from them.
+        @param srcPkgs: source packages that have not been mapped yet
+        @type srcPkgs: iterable of source packages
+        """
+
         # Now that we have processed all of the rpms, build some more data
         # structures.
         count = 0
         toDelete = set()
         srcToDelete = set()
-        for pkg in self._srcPkgs:
+        for pkg in srcPkgs:
             key = (pkg.name, pkg.epoch, pkg.version, pkg.release, pkg.arch)
             if pkg in self.srcPkgMap:
                 continue
@@ -303,6 +769,12 @@ class YumSource(BasePackageSource):
         for key in toDelete:
             del self._rpmMap[key]
 
+    def _matchBinaries(self):
+        """
+        Map binaries that were not matched to a source by name, epoch, version,
+        release and arch to a source with a different epoch.
+        """
+
         # Attempt to match up remaining binaries with srpms.
         for srcTup in self._rpmMap.keys():
             srcKey = list(srcTup)
@@ -350,6 +822,14 @@ class YumSource(BasePackageSource):
                 for loc in sorted(locs):
                     log.warn('\t%s' % loc)
 
+    def _buildUseMap(self):
+        """
+        Build a map of conary trove specs to the architectures they should be
+        built for based on the repositories that contain each binary.
+        @return {(name, version, flavor): set([archStr, ..])}
+        """
+
+        useMap = dict()
         if self._repoMap:
             sourceSet = set()
             for binPkg, archSet in self._repoMap.iteritems():
@@ -403,11 +883,11 @@ class YumSource(BasePackageSource):
                             useSet.update(archSet)
 
                         if useSet:
-                            self.useMap.setdefault(trvSpec, set()).update(useSet)
+                            useMap.setdefault(trvSpec, set()).update(useSet)
 
             for source in sourceSet:
-                if source not in self.useMap:
-                    self.useMap.setdefault(source, set()).add(source[-1])
+                if source not in useMap:
+                    useMap.setdefault(source, set()).add(source[-1])
 
             for n, v, a, repoArch in self._cfg.repositoryPackage:
                 specs = [
@@ -415,17 +895,47 @@ class YumSource(BasePackageSource):
                     (n, a),
                 ]
                 for spec in specs:
-                    self.useMap.setdefault(spec, set()).add(repoArch)
+                    useMap.setdefault(spec, set()).add(repoArch)
+
+        return useMap
+
+    def _updateUseMap(self):
+        """
+        Update the useMap in place.
+        @return set of keys that were added, removed or changed
+        """
+
+        useMap = self._buildUseMap()
+
+        changed = set()
+        for key in self.useMap.keys():
+            if key not in useMap:
+                del self.useMap[key]
+                changed.add(key)
+
+        for key, archs in useMap.iteritems():
+            if self.useMap.get(key) != archs:
+                self.useMap[key] = archs
+                changed.add(key)
+
+        return changed
+
+    def _relocateNosrc(self, srcPkgs):
+        """
+        Move the contents of nosrc packages to the matching source packages.
+        @param srcPkgs: source packages to consider
+        @type srcPkgs: iterable of source packages
+        """
 
         # In the case of SLES 10 we need to combine several source entries in
         # the srcPkgMap to create a single unified kernel source package.
         if self._cfg.nosrcFilter:
             # Find all nosrc rpms in the srcPKgMap, have to use basename of the
             # location since nosrc packages have an arch of 'src'.
-            nosrcMap = dict([ (x, y) for x, y in self.srcPkgMap.iteritems()
-                              if 'nosrc' in os.path.basename(x.location) ])
+            nosrcs = [ x for x in srcPkgs if x in self.srcPkgMap and
+                       'nosrc' in os.path.basename(x.location) ]
 
-            for nosrc in nosrcMap:
+            for nosrc in nosrcs:
                 for srcName, (fltrStr, fltr) in self._cfg.nosrcFilter:
                     if fltr.match(nosrc.name):
                         # We've got a filter match, but we don't know
@@ -473,6 +983,14 @@ class YumSource(BasePackageSource):
                         # Whether we found the source or synthesized it, break
                         break
 
+    def _mergeSources(self, required=True):
+        """
+        Merge the contents of sources as configured by mergeSources.
+        @param required: raise an exception if a configured source is not
+                         available, otherwise skip the merge.
+        @type required: boolean
+        """
+
         # One last thing ... those sources that we just synthesized
         # probably were wrong, so let's merge them into real sources
         for srcMerge in self._cfg.mergeSources:
@@ -480,12 +998,20 @@ class YumSource(BasePackageSource):
                             if x.name==srcMerge[0][0] and 
                                x.version==srcMerge[0][2] and 
                                x.release==srcMerge[0][3] and 
-                               x.arch==srcMerge[0][4] ][0]
+                               x.arch==srcMerge[0][4] ]
             mergeOrig = [ x for x in self.srcPkgMap.keys() 
                           if x.name==srcMerge[1][0] and 
                              x.version==srcMerge[1][2] and 
                              x.release==srcMerge[1][3] and 
-                             x.arch==srcMerge[1][4] ][0]
+                             x.arch==srcMerge[1][4] ]
+
+            # Sources merged by an earlier load are no longer in the
+            # srcPkgMap.
+            if not required and (not mergeTarget or not mergeOrig):
+                continue
+
+            mergeTarget = mergeTarget[0]
+            mergeOrig = mergeOrig[0]
             srcToMove = self.srcPkgMap.pop(mergeOrig)
             self.srcPkgMap[mergeTarget].update(srcToMove)
             for binPkg in srcToMove:
@@ -514,6 +1040,7 @@ class YumSource(BasePackageSource):
             pkg = self._srcMap[srcPkg.getNevra()]
             self.locationMap[srcPkg.location] = pkg
 
+    @profiling.profiled('pkgsource._createSrcMap')
     def _createSrcMap(self):
         """
         Create a source map from the binary map if no sources are available.
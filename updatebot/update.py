@@ -337,7 +337,7 @@ class Updater(object):
         """
 
         srpms = list(self._pkgSource.srcNameMap[name])
-        srpms.sort(util.packagevercmp)
+        srpms.sort(key=util.packageVersionKey)
         return srpms[-1]
 
     def _sanitizeTrove(self, nvf, srpm, expectedRemovals=None,
@@ -809,7 +809,7 @@ class Updater(object):
         """
 
         rpms = list(self._pkgSource.binNameMap[name])
-        rpms.sort(util.packagevercmp)
+        rpms.sort(key=util.packageVersionKey)
         return rpms[-1]
 
     def update(self, nvf, srcPkg):
@@ -822,6 +822,54 @@ class Updater(object):
         @return version of the updated source trove
         """
 
+        parentVersion = self._editSource(nvf, srcPkg)
+        if parentVersion:
+            return parentVersion
+
+        newVersion = self._conaryhelper.commit(nvf[0],
+                                    commitMessage=self._cfg.commitMessage)
+        return newVersion
+
+    def updateMany(self, toUpdate):
+        """
+        Update the rpm manifests of several source troves. All sources are
+        checked out in one changeset before being edited and the new versions
+        are looked up in one query after they have been committed.
+        @param toUpdate: list of source trove nvfs and source packages
+        @type toUpdate: list((nvf, repomd.packagexml._Package), ...)
+        @return list of versions of the updated source troves, in the same
+                order as toUpdate.
+        @rtype list(conary.versions.Version, ...)
+        """
+
+        self._conaryhelper.checkoutMany([ x[0][0] for x in toUpdate ])
+
+        versions = []
+        toCommit = []
+        for nvf, srcPkg in toUpdate:
+            parentVersion = self._editSource(nvf, srcPkg)
+            versions.append(parentVersion)
+            if not parentVersion:
+                toCommit.append(nvf[0])
+
+        newVersions = self._conaryhelper.commitMany(toCommit,
+            commitMessage=self._cfg.commitMessage)
+
+        return [ x or newVersions[y[0][0]]
+                 for x, y in itertools.izip(versions, toUpdate) ]
+
+    def _editSource(self, nvf, srcPkg):
+        """
+        Update the contents of the checkout of a source trove to match a given
+        source package without committing.
+        @param nvf: name, version, flavor tuple of source trove
+        @type nvf: tuple(name, versionObj, flavorObj)
+        @param srcPkg: package object for source rpm
+        @type srcPkg: repomd.packagexml._Package
+        @return version of the parent platform source trove if the parent
+                platform version should be used, otherwise None.
+        """
+
         # Try to use package from a parent platform if the manifests match,
         # unless there is already a version on the platform label.
         parentVersion = self._getUpstreamPackageVersion(nvf, srcPkg)
@@ -858,9 +906,7 @@ class Updater(object):
             buildrequires = self._getBuildRequiresFromPkgSource(srcPkg)
             self._conaryhelper.setBuildRequires(nvf[0], buildrequires)
 
-        newVersion = self._conaryhelper.commit(nvf[0],
-                                    commitMessage=self._cfg.commitMessage)
-        return newVersion
+        return None
 
     def _getUpstreamPackageVersion(self, nvf, srcPkg):
         """